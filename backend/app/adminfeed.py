@@ -0,0 +1,105 @@
+"""Server-Sent Events feed of room activity for admin dashboards.
+
+Polling /api/admin/connections rebuilds the state of every room on every
+call, once per open dashboard. A subscriber of AdminFeed instead gets one
+snapshot when it connects and then only what changes:
+
+* join   - a peer joined (or re-joined) a room
+* leave  - a peer left for good (`reason`: "left", "timeout" when its
+           resume window ran out, or "drain")
+* kick   - an admin disconnected a peer
+* expire - RoomStore.cleanup() removed rooms whose TTL had passed
+* drain  - the instance stopped accepting joins and is closing connections
+
+Every event is a JSON object with `type`, `seq` and `timestamp`, sent as an
+SSE `data:` line with the same `id:`. Events are upserts/removals keyed by
+(token, peerId), so one that raced the snapshot is harmless to apply again.
+
+publish() is synchronous and costs nothing while nobody is subscribed. An
+event is serialized once and queued to each subscriber; a subscriber that
+falls `queue_size` events behind gets a final "resync" event and its stream
+ends - EventSource reconnects on its own and starts from a fresh snapshot.
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Set
+
+from .codec import codec
+
+ADMIN_FEED_QUEUE_SIZE_DEFAULT = 1024
+KEEPALIVE_SECONDS_DEFAULT = 15.0
+RECONNECT_MS = 3000
+
+_KEEPALIVE = ": keepalive\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("queue",)
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(queue_size + 1)
+
+
+class AdminFeed:
+    def __init__(self, queue_size: int = ADMIN_FEED_QUEUE_SIZE_DEFAULT,
+                 keepalive: float = KEEPALIVE_SECONDS_DEFAULT):
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self._subscribers: Set[_Subscriber] = set()
+        self._seq = 0
+        self.published = 0
+        self.overflows = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def publish(self, event: str, **fields: Any) -> None:
+        if not self._subscribers:
+            return
+        frame = self._frame(event, fields)
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            queue = subscriber.queue
+            if queue.qsize() < self.queue_size:
+                queue.put_nowait(frame)
+                continue
+            # Too far behind: the one reserved slot carries the resync notice
+            self._subscribers.discard(subscriber)
+            self.overflows += 1
+            queue.put_nowait(self._frame("resync", {}))
+
+    async def stream(self, snapshot: Callable[[], Awaitable[Dict[str, Any]]]) -> AsyncIterator[str]:
+        """SSE body for one subscriber: the snapshot, then events until it disconnects."""
+        subscriber = _Subscriber(self.queue_size)
+        # Subscribe before building the snapshot, so nothing between the two is lost
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {RECONNECT_MS}\n" + self._frame("snapshot", await snapshot())
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield _KEEPALIVE
+                    continue
+                yield frame
+                if subscriber not in self._subscribers and subscriber.queue.empty():
+                    return
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def _frame(self, event: str, fields: Dict[str, Any]) -> str:
+        self._seq += 1
+        data = codec.dumps({"type": event, "seq": self._seq,
+                            "timestamp": datetime.utcnow().isoformat(), **fields})
+        return f"id: {self._seq}\ndata: {data}\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "overflows": self.overflows,
+        }
@@ -0,0 +1,430 @@
+"""Cross-worker signaling backplane.
+
+Each uvicorn worker owns the WebSockets it accepted. With several workers the
+two peers of a room may live in different processes, so broadcast() payloads
+have to be relayed between workers, and room capacity has to be checked
+against the membership of the whole deployment rather than one process.
+
+`Backplane` is the in-process default and does nothing. `UnixSocketBackplane`
+connects every worker to a small broker process over a Unix socket:
+
+    python -m app.backplane --socket /tmp/webcall-backplane.sock
+
+and is selected with BACKPLANE_URL=unix:///tmp/webcall-backplane.sock.
+The broker also keeps the metadata of every room (expiry, capacity): a
+worker publishes the rooms it creates and, before auto-creating a token it
+has never seen, looks it up, so a room has the same capacity whichever
+worker a client reaches. It lives only in the broker's memory - rooms
+created before a broker restart fall back to worker-local defaults.
+
+Frames are a 4-byte big-endian length followed by a JSON object. A payload
+with a `to` peer id is routed by the broker to the one worker holding that
+peer, not to every worker of the room.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import heapq
+import logging
+import os
+import struct
+from datetime import datetime
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from .codec import codec
+
+logger = logging.getLogger("webcall.backplane")
+
+# deliver(token, from_peer, payload): fan a remote payload out to local sockets
+DeliverFn = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+# (token, created_at, expires_at, max_participants)
+RoomRecord = Tuple[str, float, float, int]
+
+_HEADER = struct.Struct("!I")
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+REQUEST_TIMEOUT_SECONDS = 5.0
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    try:
+        (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        if size > MAX_FRAME_BYTES:
+            raise ValueError(f"frame too large: {size} bytes")
+        return codec.loads(await reader.readexactly(size))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def _encode_frame(message: Dict[str, Any]) -> bytes:
+    body = codec.dumps(message).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+class Backplane:
+    """Single-process backplane: every peer is local, nothing to relay."""
+
+    async def start(self, deliver: DeliverFn) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, token: str, from_peer: str, payload: Dict[str, Any]) -> None:
+        """Forward a broadcast payload to peers of `token` held by other workers (only to its `to` peer, if set)."""
+
+    async def claim(self, token: str, peer_id: str, max_participants: int) -> Optional[List[str]]:
+        """Register `peer_id` in the deployment-wide membership of `token`.
+
+        Returns the peers held by other workers, or None if the room is
+        already full across all workers.
+        """
+        return []
+
+    async def release(self, token: str, peer_id: str) -> None:
+        """Remove `peer_id` from the deployment-wide membership of `token`."""
+
+    def is_remote(self, token: str, peer_id: Optional[str] = None) -> bool:
+        """Whether another worker holds `peer_id` (or, without it, any peer) of `token`.
+
+        Only known for rooms this worker has peers in; used to avoid keeping
+        a message for later that another worker delivers right away.
+        """
+        return False
+
+    def participants(self, token: str, local: int) -> int:
+        """Deployment-wide participants of a room this worker holds `local` peers of."""
+        return local
+
+    async def publish_rooms(self, rooms: Sequence[RoomRecord]) -> None:
+        """Share rooms created (or recreated) on this worker with the other workers."""
+
+    async def lookup_room(self, token: str) -> Optional[Dict[str, Any]]:
+        """A room known deployment-wide: {"created_at", "expires_at", "max", "participants"}, or None."""
+        return None
+
+
+class UnixSocketBackplane(Backplane):
+    def __init__(self, path: str, reconnect_delay: float = 0.5, max_reconnect_delay: float = 10.0):
+        self._path = path
+        self._reconnect_delay = reconnect_delay
+        self._max_reconnect_delay = max_reconnect_delay
+        self._deliver: Optional[DeliverFn] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_request_id = 0
+        # Peers claimed by this worker, replayed to the broker after a reconnect
+        self._claims: Dict[str, Dict[str, int]] = {}
+        # Peers other workers hold in rooms we have peers in: from claim replies,
+        # then from what they publish (peer-joined, peer-left, signaling)
+        self._remote: Dict[str, Set[str]] = {}
+
+    async def start(self, deliver: DeliverFn) -> None:
+        self._deliver = deliver
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=REQUEST_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"Backplane broker at {self._path} is not reachable yet; running worker-local until it is")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        delay = self._reconnect_delay
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self._path)
+            except OSError as e:
+                logger.debug("Backplane connect to %s failed: %s", self._path, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_reconnect_delay)
+                continue
+
+            delay = self._reconnect_delay
+            # The broker may have restarted: re-register the peers we hold
+            for token, peers in self._claims.items():
+                for peer_id, max_participants in peers.items():
+                    writer.write(_encode_frame({"op": "claim", "token": token, "peer": peer_id,
+                                                "max": max_participants}))
+            self._writer = writer
+            self._connected.set()
+            logger.info(f"Backplane connected: {self._path}")
+            try:
+                while True:
+                    message = await _read_frame(reader)
+                    if message is None:
+                        break
+                    await self._dispatch(message)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Backplane connection error: {e}")
+            finally:
+                self._connected.clear()
+                self._writer = None
+                # Membership may change unseen while disconnected
+                self._remote.clear()
+                writer.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("backplane connection lost"))
+                self._pending.clear()
+            logger.warning(f"Backplane disconnected from {self._path}, reconnecting")
+
+    async def _dispatch(self, message: Dict[str, Any]) -> None:
+        op = message.get("op")
+        if op == "reply":
+            future = self._pending.pop(message.get("id"), None)
+            if future is not None and not future.done():
+                future.set_result(message)
+        elif op == "deliver" and self._deliver is not None:
+            self._track_remote(message.get("token"), message.get("from"), message.get("payload"))
+            try:
+                await self._deliver(message["token"], message["from"], message["payload"])
+            except Exception as e:
+                logger.warning(f"Backplane delivery to room {message.get('token')} failed: {e}")
+
+    def _track_remote(self, token: Optional[str], peer_id: Optional[str], payload: Any) -> None:
+        if token not in self._claims or peer_id is None:
+            return
+        if isinstance(payload, dict) and payload.get("type") == "peer-left":
+            peers = self._remote.get(token)
+            if peers is not None:
+                peers.discard(peer_id)
+        else:
+            self._remote.setdefault(token, set()).add(peer_id)
+
+    def is_remote(self, token: str, peer_id: Optional[str] = None) -> bool:
+        peers = self._remote.get(token)
+        if not peers:
+            return False
+        return peer_id is None or peer_id in peers
+
+    def participants(self, token: str, local: int) -> int:
+        return local + len(self._remote.get(token, ()))
+
+    async def publish_rooms(self, rooms: Sequence[RoomRecord]) -> None:
+        if rooms:
+            await self._send({"op": "rooms", "rooms": [list(room) for room in rooms]})
+
+    async def lookup_room(self, token: str) -> Optional[Dict[str, Any]]:
+        reply = await self._request({"op": "lookup", "token": token})
+        if reply is None or not reply.get("ok"):
+            return None
+        return reply.get("room")
+
+    async def _send(self, message: Dict[str, Any]) -> bool:
+        writer = self._writer
+        if writer is None:
+            return False
+        writer.write(_encode_frame(message))
+        await writer.drain()
+        return True
+
+    async def _request(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        self._next_request_id += 1
+        request_id = self._next_request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            if not await self._send({**message, "id": request_id}):
+                return None
+            return await asyncio.wait_for(future, timeout=REQUEST_TIMEOUT_SECONDS)
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            logger.warning(f"Backplane request {message.get('op')} failed: {e}")
+            return None
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def publish(self, token: str, from_peer: str, payload: Dict[str, Any]) -> None:
+        await self._send({"op": "publish", "token": token, "from": from_peer, "payload": payload})
+
+    async def claim(self, token: str, peer_id: str, max_participants: int) -> Optional[List[str]]:
+        reply = await self._request({"op": "claim", "token": token, "peer": peer_id, "max": max_participants})
+        if reply is None:
+            # Broker unavailable: fall back to this worker's own view of the room
+            self._claims.setdefault(token, {})[peer_id] = max_participants
+            return []
+        if not reply.get("ok"):
+            return None
+        self._claims.setdefault(token, {})[peer_id] = max_participants
+        remote = list(reply.get("peers", []))
+        self._remote[token] = set(remote)
+        return remote
+
+    async def release(self, token: str, peer_id: str) -> None:
+        peers = self._claims.get(token)
+        if peers is not None:
+            peers.pop(peer_id, None)
+            if not peers:
+                del self._claims[token]
+                # No more deliveries for this room: its remote view would go stale
+                self._remote.pop(token, None)
+        try:
+            await self._send({"op": "release", "token": token, "peer": peer_id})
+        except OSError as e:
+            logger.warning(f"Backplane release failed: {e}")
+
+
+def create_backplane(url: str) -> Backplane:
+    """Build a backplane from BACKPLANE_URL ("" or "local" -> in-process)."""
+    if not url or url == "local":
+        return Backplane()
+    if url.startswith("unix://"):
+        return UnixSocketBackplane(url[len("unix://"):])
+    raise ValueError(f"Unsupported BACKPLANE_URL: {url}")
+
+
+class Broker:
+    """Relays payloads between workers and owns deployment-wide room membership."""
+
+    def __init__(self) -> None:
+        self._workers: Dict[int, asyncio.StreamWriter] = {}
+        # token -> peer_id -> id of the worker holding that peer's socket
+        self._members: Dict[str, Dict[str, int]] = {}
+        # token -> (created_at, expires_at, max_participants), expired through a min-heap
+        self._rooms: Dict[str, Tuple[float, float, int]] = {}
+        self._room_expiry: List[Tuple[float, str]] = []
+        self._next_worker_id = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._next_worker_id += 1
+        worker_id = self._next_worker_id
+        self._workers[worker_id] = writer
+        logger.info(f"Backplane worker {worker_id} connected")
+        try:
+            while True:
+                message = await _read_frame(reader)
+                if message is None:
+                    break
+                self._handle(worker_id, message)
+                await writer.drain()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Backplane worker {worker_id} error: {e}")
+        finally:
+            del self._workers[worker_id]
+            self._drop_worker(worker_id)
+            writer.close()
+            logger.info(f"Backplane worker {worker_id} disconnected")
+
+    def _handle(self, worker_id: int, message: Dict[str, Any]) -> None:
+        op = message.get("op")
+        token = message.get("token")
+        if op == "publish":
+            payload = message.get("payload")
+            deliver = {"op": "deliver", "token": token, "from": message.get("from"), "payload": payload}
+            to = payload.get("to") if isinstance(payload, dict) else None
+            if to is None:
+                self._fanout(token, worker_id, deliver)
+            else:
+                self._route(token, to, worker_id, deliver)
+        elif op == "claim":
+            members = self._members.setdefault(token, {})
+            peer_id = message.get("peer")
+            ok = peer_id in members or len(members) < int(message.get("max", 2))
+            if ok:
+                # A reconnecting peer may move to another worker
+                members[peer_id] = worker_id
+            elif not members:
+                del self._members[token]
+            if "id" in message:
+                self._workers[worker_id].write(_encode_frame({
+                    "op": "reply", "id": message["id"], "ok": ok,
+                    "peers": [pid for pid, wid in members.items() if wid != worker_id],
+                }))
+        elif op == "rooms":
+            self._expire_rooms(time.time())
+            for room_token, created_at, expires_at, max_participants in message.get("rooms", []):
+                self._rooms[room_token] = (created_at, expires_at, int(max_participants))
+                heapq.heappush(self._room_expiry, (expires_at, room_token))
+        elif op == "lookup":
+            self._expire_rooms(time.time())
+            room = self._rooms.get(token)
+            self._workers[worker_id].write(_encode_frame({
+                "op": "reply", "id": message.get("id"), "ok": room is not None,
+                "room": {"created_at": room[0], "expires_at": room[1], "max": room[2],
+                         "participants": len(self._members.get(token, ()))} if room is not None else None,
+            }))
+        elif op == "release":
+            members = self._members.get(token)
+            peer_id = message.get("peer")
+            if members and members.get(peer_id) == worker_id:
+                del members[peer_id]
+                if not members:
+                    del self._members[token]
+
+    def _expire_rooms(self, now: float) -> None:
+        expiry = self._room_expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, token = heapq.heappop(expiry)
+            room = self._rooms.get(token)
+            # Stale entry of a room recreated with a later expiry
+            if room is not None and room[1] == expires_at:
+                del self._rooms[token]
+
+    def _fanout(self, token: Optional[str], origin: int, message: Dict[str, Any]) -> None:
+        members = self._members.get(token)
+        if not members:
+            return
+        frame = None
+        for worker_id in set(members.values()):
+            if worker_id == origin or worker_id not in self._workers:
+                continue
+            if frame is None:
+                frame = _encode_frame(message)
+            self._workers[worker_id].write(frame)
+
+    def _route(self, token: Optional[str], peer_id: str, origin: int, message: Dict[str, Any]) -> None:
+        worker_id = self._members.get(token, {}).get(peer_id)
+        if worker_id is not None and worker_id != origin and worker_id in self._workers:
+            self._workers[worker_id].write(_encode_frame(message))
+
+    def _drop_worker(self, worker_id: int) -> None:
+        # Peers of a crashed worker are gone: tell the rest of their rooms
+        for token, members in list(self._members.items()):
+            lost = [pid for pid, wid in members.items() if wid == worker_id]
+            for peer_id in lost:
+                del members[peer_id]
+                self._fanout(token, worker_id, {"op": "deliver", "token": token, "from": peer_id, "payload": {
+                    "type": "peer-left",
+                    "peerId": peer_id,
+                    "timestamp": datetime.utcnow().isoformat(),
+                }})
+            if not members:
+                del self._members[token]
+
+
+async def serve(path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
+    broker = Broker()
+    server = await asyncio.start_unix_server(broker.handle, path=path)
+    os.chmod(path, 0o600)
+    logger.info(f"Backplane broker listening on {path}")
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Web Call signaling backplane broker")
+    parser.add_argument("--socket", default="/tmp/webcall-backplane.sock")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Server-side coalescing of trickle-ICE candidates.
+
+During ICE gathering a browser emits dozens of candidates within a few
+milliseconds, each relayed as its own WebSocket frame. CandidateCoalescer
+holds candidates from one peer for up to `window` seconds and relays them as
+a single frame:
+
+    {"type": "candidates", "peerId": "...", "candidates": [{...}, {...}]}
+
+A batch is flushed early when it reaches `max_batch` candidates, when the
+peer signals end-of-candidates (an empty `candidate` string), or before any
+other message from the same peer is relayed, so ordering relative to
+offers/answers is preserved. A batch of one is relayed as a plain
+`candidate` message.
+
+Candidates addressed to one peer of a mesh room (`to`) are batched per
+recipient, and the relayed frame carries the same `to`.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+# send(token, from_peer, payload)
+SendFn = Callable[[str, str, Dict[str, Any]], Awaitable[None]]
+
+# (token, from_peer, to_peer); to_peer None for candidates meant for the whole room
+_Key = Tuple[str, str, Optional[str]]
+
+
+def is_end_of_candidates(candidate: Any) -> bool:
+    if candidate is None:
+        return True
+    if isinstance(candidate, dict):
+        return not candidate.get("candidate")
+    return False
+
+
+class _Batch:
+    __slots__ = ("candidates", "first_at", "timer")
+
+    def __init__(self, first_at: float) -> None:
+        self.candidates: List[Any] = []
+        self.first_at = first_at
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class CoalescerStats:
+    """Counters and hold-time samples for tuning the coalescing window."""
+
+    def __init__(self, samples: int = 1024) -> None:
+        self.candidates_in = 0
+        self.frames_out = 0
+        self.flushes: Counter = Counter()
+        self.batch_sizes: Counter = Counter()
+        self._hold_ms: Deque[float] = deque(maxlen=samples)
+
+    def record(self, size: int, hold_seconds: float, reason: str) -> None:
+        self.frames_out += 1
+        self.flushes[reason] += 1
+        self.batch_sizes[size] += 1
+        self._hold_ms.append(hold_seconds * 1000.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        held = sorted(self._hold_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not held:
+                return None
+            return round(held[min(len(held) - 1, int(p * (len(held) - 1)))], 3)
+
+        return {
+            "candidates_in": self.candidates_in,
+            "frames_out": self.frames_out,
+            "frames_saved": self.candidates_in - self.frames_out,
+            "avg_batch": round(self.candidates_in / self.frames_out, 2) if self.frames_out else None,
+            "flush_reasons": dict(self.flushes),
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "hold_ms": {"p50": pct(0.5), "p99": pct(0.99), "max": round(held[-1], 3) if held else None},
+        }
+
+
+class CandidateCoalescer:
+    def __init__(self, send: SendFn, window: float, max_batch: int = 32):
+        self._send = send
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.stats = CoalescerStats()
+        self._pending: Dict[_Key, _Batch] = {}
+        # (token, from_peer) -> recipients with a pending batch, for flush_peer()
+        self._targets: Dict[Tuple[str, str], Set[Optional[str]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def add(self, token: str, peer_id: str, candidate: Any, to: Optional[str] = None) -> None:
+        key = (token, peer_id, to)
+        self.stats.candidates_in += 1
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(time.monotonic())
+            batch.timer = asyncio.get_running_loop().call_later(self.window, self._on_timer, key)
+            self._targets.setdefault((token, peer_id), set()).add(to)
+        batch.candidates.append(candidate)
+        if is_end_of_candidates(candidate):
+            await self._flush(key, "end")
+        elif len(batch.candidates) >= self.max_batch:
+            await self._flush(key, "size")
+
+    async def flush_peer(self, token: str, peer_id: str) -> None:
+        """Relay whatever is held for this peer (before one of its other messages)."""
+        targets = self._targets.get((token, peer_id))
+        if targets:
+            for to in list(targets):
+                await self._flush((token, peer_id, to), "order")
+
+    def discard_peer(self, token: str, peer_id: str) -> None:
+        for to in self._targets.pop((token, peer_id), ()):
+            batch = self._pending.pop((token, peer_id, to), None)
+            if batch is not None and batch.timer is not None:
+                batch.timer.cancel()
+
+    def _on_timer(self, key: _Key) -> None:
+        task = asyncio.get_running_loop().create_task(self._flush(key, "window"))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, key: _Key, reason: str) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        token, peer_id, to = key
+        targets = self._targets.get((token, peer_id))
+        if targets is not None:
+            targets.discard(to)
+            if not targets:
+                del self._targets[(token, peer_id)]
+        candidates = batch.candidates
+        self.stats.record(len(candidates), time.monotonic() - batch.first_at, reason)
+        if len(candidates) == 1:
+            payload = {"type": "candidate", "peerId": peer_id, "candidate": candidates[0]}
+        else:
+            payload = {"type": "candidates", "peerId": peer_id, "candidates": candidates}
+        if to is not None:
+            payload["to"] = to
+        await self._send(token, peer_id, payload)
@@ -0,0 +1,176 @@
+"""JSON codec for the signaling path.
+
+The stdlib `json` module is always available; `orjson` is used when it is
+installed and JSON_CODEC is "auto" (the default) or "orjson". Both sides of
+the socket go through the same codec: `loads` for inbound frames, `dumps`
+for outbound ones (once per broadcast, not once per recipient).
+
+Decode errors are always `json.JSONDecodeError` (orjson's error subclasses it).
+Failures to encode a payload are raised as `EncodeError`.
+
+Clients may also negotiate a binary WebSocket subprotocol (BINARY_SUBPROTOCOL)
+carrying the same messages as MessagePack; that needs the optional `msgpack`
+package. Both formats have a "+zdict1" variant compressed with a preset SDP
+dictionary (compression.py). `EncodedMessage` holds a payload together with both wire forms, each
+built at most once, so a room mixing text and binary clients transcodes a
+message once rather than once per recipient. Frames relayed unchanged must
+be encodable in the other format too, so a MessagePack frame is only
+accepted if it holds what JSON can: no `bin`/ext values, string map keys.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+JSON_SUBPROTOCOL = "webcall.json"
+BINARY_SUBPROTOCOL = "webcall.msgpack"
+# Either of the above plus this suffix: frames deflated with the preset SDP
+# dictionary (see compression.py)
+DEFLATE_SUFFIX = "+zdict1"
+
+
+class BinaryDecodeError(ValueError):
+    pass
+
+
+class EncodeError(ValueError):
+    pass
+
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def _check_json_compatible(obj: Any) -> None:
+    """Raise BinaryDecodeError if a decoded MessagePack value has no JSON equivalent."""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, _JSON_SCALARS):
+            continue
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise BinaryDecodeError(f"map keys must be strings, got {type(key).__name__}")
+                stack.append(item)
+        elif isinstance(value, list):
+            stack.extend(value)
+        else:
+            raise BinaryDecodeError(f"unsupported value type: {type(value).__name__}")
+
+
+class JsonCodec:
+    name = "json"
+
+    @staticmethod
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    @staticmethod
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    @staticmethod
+    def loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    @staticmethod
+    def dumps(obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    @staticmethod
+    def loads(data: bytes) -> Any:
+        try:
+            obj = msgpack.unpackb(data, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise BinaryDecodeError(str(e)) from e
+        _check_json_compatible(obj)
+        return obj
+
+
+def get_codec(name: str = "auto"):
+    if name == "json":
+        return JsonCodec
+    if name == "orjson":
+        if orjson is None:
+            raise RuntimeError("JSON_CODEC=orjson but orjson is not installed")
+        return OrjsonCodec
+    if name == "auto":
+        return OrjsonCodec if orjson is not None else JsonCodec
+    raise ValueError(f"Unknown JSON codec: {name}")
+
+
+codec = get_codec(os.getenv("JSON_CODEC", "auto"))
+dumps = codec.dumps
+loads = codec.loads
+binary_codec = MsgpackCodec if msgpack is not None else None
+
+
+def select_subprotocol(offered, allow_deflate: bool = True) -> Optional[str]:
+    """Pick the subprotocol to answer with from the client's offer (None = plain text JSON)."""
+    preferred = []
+    for base in ((BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL) if binary_codec is not None else (JSON_SUBPROTOCOL,)):
+        if allow_deflate:
+            preferred.append(base + DEFLATE_SUFFIX)
+        preferred.append(base)
+    for name in preferred:
+        if name in offered:
+            return name
+    return None
+
+
+def subprotocol_options(name: Optional[str]) -> Tuple[bool, bool]:
+    """(binary, deflate) for a subprotocol returned by select_subprotocol()."""
+    name = name or ""
+    return name.startswith(BINARY_SUBPROTOCOL), name.endswith(DEFLATE_SUFFIX)
+
+
+class EncodedMessage:
+    """A payload and its text/binary frames, each encoded on first use."""
+
+    __slots__ = ("payload", "_text", "_binary")
+
+    def __init__(self, payload: Any, text: Optional[str] = None, binary: Optional[bytes] = None):
+        self.payload = payload
+        self._text = text
+        self._binary = binary
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            try:
+                self._text = codec.dumps(self.payload)
+            except (TypeError, ValueError, OverflowError) as e:
+                raise EncodeError(f"cannot encode {codec.name}: {e}") from e
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            try:
+                self._binary = binary_codec.dumps(self.payload)
+            except (TypeError, ValueError, OverflowError) as e:
+                raise EncodeError(f"cannot encode msgpack: {e}") from e
+        return self._binary
@@ -0,0 +1,290 @@
+"""Per-connection outbound queues for signaling WebSockets.
+
+Every accepted socket is wrapped in a PeerConnection whose own writer task
+drains a bounded queue. Handlers (and broadcast()) only enqueue, so a slow or
+half-dead receiver can no longer stall the receive loop of the peer that is
+sending to it.
+
+What happens when a receiver's queue is full is set by QueuePolicy:
+
+* drop       - evict the oldest queued ICE candidate (or the new one, if it is
+               a candidate itself); if nothing droppable is queued, disconnect
+* disconnect - close the slow receiver with code 1013 (try again later)
+* block      - the sender waits for space, as it effectively did before
+
+A connection that negotiated the binary subprotocol (`binary=True`) gets
+MessagePack frames from send_message(); text JSON otherwise. With a
+DeflateContext every frame is compressed by the writer task right before it
+is sent, so frames the drop policy evicts never enter the deflate stream.
+
+Resumable sessions: after begin_session() every frame the writer hands to the
+socket gets the next sequence number and is kept in a short history. When
+the socket dies the connection is only detached - the queue keeps filling -
+and attach() continues it on a new socket, first replaying the frames after
+the client's last received sequence number. A frame enters the history
+before it is sent, so one lost mid-send is replayed as well.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from itertools import islice
+from enum import Enum
+from typing import Any, Callable, Deque, Optional, Tuple, Union
+
+from starlette.websockets import WebSocket, WebSocketState
+
+from .codec import EncodedMessage
+from .compression import DeflateContext
+
+logger = logging.getLogger("webcall.connection")
+
+SEND_QUEUE_SIZE_DEFAULT = 256
+CLOSE_TIMEOUT_SECONDS = 5.0
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class QueuePolicy(str, Enum):
+    drop = "drop"
+    disconnect = "disconnect"
+    block = "block"
+
+
+class SendQueueOverflow(ConnectionError):
+    pass
+
+
+class PeerConnection:
+    """A WebSocket whose sends go through a bounded queue and a writer task.
+
+    Mirrors the part of the WebSocket API the handlers use (send_text, close,
+    client_state), so it can be passed wherever a WebSocket was.
+    """
+
+    def __init__(self, ws: WebSocket, max_queue: int = SEND_QUEUE_SIZE_DEFAULT,
+                 policy: QueuePolicy = QueuePolicy.drop,
+                 on_failure: Optional[Callable[["PeerConnection"], None]] = None,
+                 binary: bool = False, deflate: Optional[DeflateContext] = None):
+        self.ws: Optional[WebSocket] = ws
+        self.binary = binary
+        self.deflate = deflate
+        # Frames sent / frames received in the current session
+        self.seq = 0
+        self.received = 0
+        self.resume_token: Optional[str] = None
+        self._history: Optional[Deque[Union[str, bytes]]] = None
+        self.dropped = 0
+        self._max_queue = max(1, max_queue)
+        self._policy = policy
+        self._on_failure = on_failure
+        # (droppable, frame): str goes out as a text frame, bytes as a binary one
+        self._queue: Deque[Tuple[bool, Union[str, bytes]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._close_args: Optional[Tuple[int, Optional[str]]] = None
+        self._closed = False
+        self._writer = asyncio.create_task(self._run())
+        # Socket close after an overflow, referenced until done
+        self._closing: Optional[asyncio.Task] = None
+
+    @property
+    def client_state(self) -> WebSocketState:
+        if self.ws is None:
+            return WebSocketState.DISCONNECTED
+        return self.ws.client_state
+
+    @property
+    def detached(self) -> bool:
+        return self.ws is None
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or self._close_args is not None
+
+    async def send_message(self, message: Any, droppable: bool = False) -> None:
+        """Queue a payload (or EncodedMessage) in this connection's wire format."""
+        if not isinstance(message, EncodedMessage):
+            message = EncodedMessage(message)
+        await self._send_frame(message.binary if self.binary else message.text, droppable)
+
+    def send_nowait(self, message: Any) -> bool:
+        """Queue a payload without waiting or evicting anything; False if the queue is full or closed."""
+        if self.closed or len(self._queue) >= self._max_queue:
+            return False
+        if not isinstance(message, EncodedMessage):
+            message = EncodedMessage(message)
+        self._queue.append((False, message.binary if self.binary else message.text))
+        self._wakeup.set()
+        return True
+
+    async def send_text(self, text: str, droppable: bool = False) -> None:
+        """Queue `text` for delivery; `droppable` marks messages the drop policy may evict."""
+        await self._send_frame(text, droppable)
+
+    async def send_bytes(self, data: bytes, droppable: bool = False) -> None:
+        await self._send_frame(data, droppable)
+
+    async def _send_frame(self, frame: Union[str, bytes], droppable: bool) -> None:
+        if self.closed:
+            raise ConnectionError("connection is closed")
+        while len(self._queue) >= self._max_queue:
+            if self._policy is QueuePolicy.block:
+                self._space.clear()
+                await self._space.wait()
+                if self.closed:
+                    raise ConnectionError("connection is closed")
+                continue
+            if self._policy is QueuePolicy.drop:
+                if self._evict_droppable():
+                    break
+                if droppable:
+                    self.dropped += 1
+                    return
+            # Nothing we may drop (or policy=disconnect): give up on this receiver
+            self._abort(SendQueueOverflow(f"send queue overflow ({self._max_queue} messages)"))
+            raise SendQueueOverflow("send queue overflow")
+        self._queue.append((droppable, frame))
+        self._wakeup.set()
+
+    def begin_session(self, resume_token: str, history_size: int) -> None:
+        """Start numbering frames (from 1) and keep the last `history_size` for attach()."""
+        self.resume_token = resume_token
+        self.seq = 0
+        self.received = 0
+        self._history = deque(maxlen=history_size)
+
+    def detach(self, ws: WebSocket) -> None:
+        """The socket is gone but the session may be resumed: keep queueing."""
+        if self.ws is ws:
+            self.ws = None
+
+    async def attach(self, ws: WebSocket, last_seq: int, deflate: Optional[DeflateContext] = None) -> bool:
+        """Continue on `ws` after the client received frames up to `last_seq`.
+
+        False if those frames cannot be replayed (history too short, or the
+        connection is closed); the caller then falls back to a fresh join.
+        """
+        if self.closed or self._history is None:
+            return False
+        missing = self.seq - last_seq
+        if missing < 0 or missing > len(self._history):
+            return False
+        # The writer holds off while ws is None; replays go out first
+        self.ws = None
+        self.deflate = deflate
+        try:
+            for frame in islice(self._history, len(self._history) - missing, None):
+                await self._transmit(ws, frame)
+        except Exception as e:
+            logger.warning("Replay after resume failed: %s", e)
+            return False
+        self.ws = ws
+        self._wakeup.set()
+        return True
+
+    def abandon(self) -> None:
+        """Stop the writer without closing the socket (it now serves another connection)."""
+        self._closed = True
+        self._queue.clear()
+        self._writer.cancel()
+        # Senders blocked on a full queue must see the close instead of waiting forever
+        self._space.set()
+        self._wakeup.set()
+
+    def _evict_droppable(self) -> bool:
+        for index, (droppable, _) in enumerate(self._queue):
+            if droppable:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    async def close(self, code: int = 1000, reason: Optional[str] = None) -> None:
+        """Send what is already queued, then close the socket."""
+        if self._closed:
+            # Already failed or aborted; the writer task is gone
+            return
+        if self._close_args is None:
+            self._close_args = (code, reason)
+            self._wakeup.set()
+            self._space.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._writer), timeout=CLOSE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._writer.cancel()
+            await self._close_socket(code, reason)
+        except Exception:
+            pass
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                ws = self.ws
+                if not self._queue or ws is None:
+                    # Nothing to send, or detached until attach()/close()
+                    if self._close_args is not None:
+                        break
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                _, frame = self._queue.popleft()
+                self._space.set()
+                self.seq += 1
+                if self._history is not None:
+                    self._history.append(frame)
+                try:
+                    await self._transmit(ws, frame)
+                except Exception:
+                    if self.resume_token is None:
+                        raise
+                    # Already in the history: attach() replays it if the client missed it
+                    self.detach(ws)
+        except asyncio.CancelledError:
+            self._closed = True
+            raise
+        except Exception as e:
+            self._fail(e)
+            return
+        await self._close_socket(*self._close_args)
+
+    async def _transmit(self, ws: WebSocket, frame: Union[str, bytes]) -> None:
+        if self.deflate is not None:
+            if isinstance(frame, str):
+                frame = frame.encode("utf-8")
+            await ws.send_bytes(self.deflate.compress(frame))
+        elif isinstance(frame, bytes):
+            await ws.send_bytes(frame)
+        else:
+            await ws.send_text(frame)
+
+    async def _close_socket(self, code: int, reason: Optional[str]) -> None:
+        self._closed = True
+        self._queue.clear()
+        ws = self.ws
+        try:
+            if ws is not None and ws.client_state != WebSocketState.DISCONNECTED:
+                await asyncio.wait_for(ws.close(code=code, reason=reason), timeout=CLOSE_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.debug("WebSocket close failed: %s", e)
+
+    def _fail(self, error: Exception) -> None:
+        self._closed = True
+        self._queue.clear()
+        self._space.set()
+        logger.warning("Outbound WebSocket send failed: %s", error)
+        if self._on_failure is not None:
+            try:
+                self._on_failure(self)
+            except Exception as e:
+                logger.error("Connection failure callback failed: %s", e)
+
+    def _abort(self, error: Exception) -> None:
+        self._writer.cancel()
+        self._fail(error)
+        self._closing = asyncio.get_running_loop().create_task(
+            self._close_socket(SLOW_CONSUMER_CLOSE_CODE, "Receiver too slow"))
@@ -0,0 +1,118 @@
+"""Graceful drain of signaling connections before shutdown or a rolling deploy.
+
+Once Drainer.start() is called, the instance refuses new joins (main.py checks
+`draining`) and every connection gets a `reconnect` hint and is closed with
+1012 (service restart), so clients move to a sibling instance instead of
+waiting for the TCP connection to die.
+
+Closing a connection waits for its queued frames to go out, so closing
+thousands one after another does not fit in the server's graceful shutdown
+timeout. A fixed pool of `concurrency` worker tasks pulls connections from a
+shared queue instead: at most that many closes are in flight, and a drain
+costs `concurrency` tasks however many connections there are. Whatever is
+still open at `deadline` is left to the server's own shutdown.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional
+
+logger = logging.getLogger("webcall.drain")
+
+DRAIN_CONCURRENCY_DEFAULT = 200
+DRAIN_DEADLINE_SECONDS_DEFAULT = 25.0
+DRAIN_CLOSE_CODE = 1012
+
+
+class DrainState(str, Enum):
+    serving = "serving"
+    draining = "draining"
+    drained = "drained"
+
+
+class Drainer:
+    def __init__(self, close: Callable[[Any], Awaitable[None]],
+                 concurrency: int = DRAIN_CONCURRENCY_DEFAULT,
+                 deadline: float = DRAIN_DEADLINE_SECONDS_DEFAULT):
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self._close = close
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.state = DrainState.serving
+        self.reason: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.total = 0
+        self.closed = 0
+        self.failed = 0
+        self._pending: Deque[Any] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def draining(self) -> bool:
+        return self.state is not DrainState.serving
+
+    def start(self, targets: Iterable[Any], reason: str = "shutdown") -> bool:
+        """Begin draining `targets` in the background; False if a drain is already running or done."""
+        if self.draining:
+            return False
+        self.state = DrainState.draining
+        self.reason = reason
+        self.started_at = time.time()
+        self._pending.extend(targets)
+        self.total = len(self._pending)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Drain started ({reason}): {self.total} connections, concurrency {self.concurrency}")
+        return True
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _run(self) -> None:
+        workers = [asyncio.create_task(self._worker()) for _ in range(min(self.concurrency, max(1, self.total)))]
+        try:
+            _, pending = await asyncio.wait(workers, timeout=self.deadline)
+            if pending:
+                logger.warning(f"Drain deadline of {self.deadline}s reached with "
+                               f"{self.total - self.closed - self.failed} connections still open")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self._pending.clear()
+            self.state = DrainState.drained
+            self.finished_at = time.time()
+            logger.info(f"Drain finished: closed={self.closed}, failed={self.failed}, "
+                        f"took {self.finished_at - self.started_at:.2f}s")
+
+    async def _worker(self) -> None:
+        while self._pending:
+            target = self._pending.popleft()
+            try:
+                await self._close(target)
+                self.closed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.debug("Closing connection during drain failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        now = self.finished_at or time.time()
+        return {
+            "state": self.state.value,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "elapsed_seconds": round(now - self.started_at, 3) if self.started_at else 0.0,
+            "total": self.total,
+            "closed": self.closed,
+            "failed": self.failed,
+            "remaining": self.total - self.closed - self.failed,
+            "concurrency": self.concurrency,
+            "deadline_seconds": self.deadline,
+        }
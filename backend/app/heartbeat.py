@@ -0,0 +1,166 @@
+"""Application-level heartbeat for signaling sockets.
+
+A socket that has received nothing for `interval` seconds gets a ping
+message; if still nothing arrives within `timeout` seconds after it, the
+socket is considered dead and `on_dead` is called (main.py closes it, which
+ends its receive loop like any other abnormal close). Any incoming frame
+counts as a sign of life, so a client only has to answer pings when it has
+nothing else to say.
+
+Deadlines live in one TimerWheel advanced by a single task every `tick`
+seconds, instead of a sleeping task or TimerHandle per socket. Receiving a
+frame does not touch the wheel at all: Watch.seen() stores the wheel's coarse
+clock, and when the socket's slot comes due the deadline is recomputed from
+it and the watch goes back into the wheel if the socket was active. An idle
+socket therefore costs one wheel entry and one check per `interval`.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger("webcall.heartbeat")
+
+HEARTBEAT_TICK_SECONDS = 1.0
+
+
+class TimerWheel:
+    """Hashed timer wheel with `tick`-second slots covering delays up to `span` seconds.
+
+    schedule() and cancel() are O(1); advance() moves the cursor by one slot
+    and returns what was scheduled there. Longer delays are clamped to the
+    span - callers re-check their deadline when an item comes due.
+    """
+
+    def __init__(self, tick: float, span: float):
+        self.tick = tick
+        self._slots: List[Dict[object, None]] = [{} for _ in range(int(math.ceil(span / tick)) + 1)]
+        self._cursor = 0
+        # item -> index of the slot it is in
+        self._where: Dict[object, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, item: object, delay: float) -> None:
+        self.cancel(item)
+        ticks = min(max(1, math.ceil(delay / self.tick)), len(self._slots) - 1)
+        index = (self._cursor + ticks) % len(self._slots)
+        self._slots[index][item] = None
+        self._where[item] = index
+
+    def cancel(self, item: object) -> None:
+        index = self._where.pop(item, None)
+        if index is not None:
+            del self._slots[index][item]
+
+    def advance(self) -> List[object]:
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        due = self._slots[self._cursor]
+        if not due:
+            return []
+        self._slots[self._cursor] = {}
+        for item in due:
+            del self._where[item]
+        return list(due)
+
+
+class Watch:
+    """Liveness state of one socket."""
+
+    __slots__ = ("_heartbeat", "send_ping", "on_dead", "last_seen", "ping_sent")
+
+    def __init__(self, heartbeat: "Heartbeat", send_ping: Callable[[], None], on_dead: Callable[[], None]):
+        self._heartbeat = heartbeat
+        self.send_ping = send_ping
+        self.on_dead = on_dead
+        self.last_seen = heartbeat.now
+        self.ping_sent: Optional[float] = None
+
+    def seen(self) -> None:
+        """A frame arrived from the socket."""
+        self.last_seen = self._heartbeat.now
+
+
+class Heartbeat:
+    def __init__(self, interval: float, timeout: float, tick: float = HEARTBEAT_TICK_SECONDS):
+        self.interval = interval
+        self.timeout = timeout
+        self.tick = min(tick, interval, timeout)
+        self._wheel = TimerWheel(self.tick, max(interval, timeout))
+        # Coarse clock (loop.time() of the last tick) for Watch.seen()
+        self.now = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.pings = 0
+        self.timeouts = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            loop = asyncio.get_running_loop()
+            self.now = loop.time()
+            self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def watch(self, send_ping: Callable[[], None], on_dead: Callable[[], None]) -> Watch:
+        """Start watching a socket; send_ping() queues a ping to it, on_dead() is called once if it stops answering."""
+        watch = Watch(self, send_ping, on_dead)
+        self._wheel.schedule(watch, self.interval)
+        return watch
+
+    def unwatch(self, watch: Watch) -> None:
+        self._wheel.cancel(watch)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            # After a stalled loop the missed slots are processed back to back
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            next_tick += self.tick
+            self.advance(loop.time())
+
+    def advance(self, now: float) -> None:
+        """One tick: move the wheel by a slot and check the sockets that came due."""
+        self.now = now
+        for watch in self._wheel.advance():
+            try:
+                self._check(watch)
+            except Exception as e:
+                logger.error(f"Heartbeat check failed: {e}")
+
+    def _check(self, watch: Watch) -> None:
+        now = self.now
+        if watch.ping_sent is not None and watch.last_seen >= watch.ping_sent:
+            watch.ping_sent = None
+        if watch.ping_sent is None:
+            idle_until = watch.last_seen + self.interval
+            if now < idle_until:
+                self._wheel.schedule(watch, idle_until - now)
+                return
+            watch.ping_sent = now
+            self.pings += 1
+            self._wheel.schedule(watch, self.timeout)
+            watch.send_ping()
+            return
+        # Pinged `timeout` seconds ago and nothing came back
+        self.timeouts += 1
+        watch.on_dead()
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "timeout": self.timeout,
+            "watched": len(self._wheel),
+            "pings": self.pings,
+            "timeouts": self.timeouts,
+        }
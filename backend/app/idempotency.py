@@ -0,0 +1,117 @@
+"""Idempotency keys for POST requests that create things.
+
+A client sends `Idempotency-Key: <key>` and may retry the same request any
+number of times: the first one does the work and its result is kept, later
+ones get that result back instead of creating everything again.
+
+* the key is bound to a fingerprint of the request body: the same key with
+  a different body is a client error (the caller answers 422);
+* a key whose request is still running is `pending` (the caller answers 409);
+* results are kept `ttl` seconds and within a budget of `max_items` result
+  items in total (e.g. rooms); the oldest completed keys go first, pending
+  ones are never evicted. All keys get the same TTL, so insertion order is
+  expiry order and no timer is needed.
+
+Keys are local to the worker process.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+IDEMPOTENCY_TTL_SECONDS_DEFAULT = 24 * 3600
+IDEMPOTENCY_MAX_ITEMS_DEFAULT = 100_000
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class IdempotencyEntry:
+    __slots__ = ("fingerprint", "created_at", "result", "size")
+
+    def __init__(self, fingerprint: str, created_at: float):
+        self.fingerprint = fingerprint
+        self.created_at = created_at
+        # None while the first request is running
+        self.result: Optional[List[Any]] = None
+        self.size = 0
+
+    @property
+    def pending(self) -> bool:
+        return self.result is None
+
+
+class IdempotencyCache:
+    def __init__(self, ttl_seconds: float = IDEMPOTENCY_TTL_SECONDS_DEFAULT,
+                 max_items: int = IDEMPOTENCY_MAX_ITEMS_DEFAULT):
+        self.ttl_seconds = ttl_seconds
+        self.max_items = max_items
+        self._entries: "OrderedDict[str, IdempotencyEntry]" = OrderedDict()
+        self.items = 0
+        self.replays = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[IdempotencyEntry]:
+        self._expire(time.time())
+        return self._entries.get(key)
+
+    def begin(self, key: str, fingerprint: str) -> IdempotencyEntry:
+        """Reserve `key` for a request that is about to run (get() returned None)."""
+        entry = self._entries[key] = IdempotencyEntry(fingerprint, time.time())
+        return entry
+
+    def complete(self, key: str, result: List[Any]) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.result = result
+        entry.size = len(result)
+        self.items += entry.size
+        if self.items > self.max_items:
+            self._evict(keep=key)
+
+    def abort(self, key: str) -> None:
+        """The request failed: a retry should run it again."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.pending:
+            del self._entries[key]
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.created_at < self.ttl_seconds:
+                break
+            self._pop_oldest()
+
+    def _evict(self, keep: str) -> None:
+        # Pending keys hold no items yet, and dropping one would let a retry run twice
+        excess = self.items - self.max_items
+        victims = []
+        for key, entry in self._entries.items():
+            if excess <= 0:
+                break
+            if entry.pending or key == keep:
+                continue
+            victims.append(key)
+            excess -= entry.size
+        for key in victims:
+            self.items -= self._entries.pop(key).size
+
+    def _pop_oldest(self) -> None:
+        _, entry = self._entries.popitem(last=False)
+        self.items -= entry.size
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._entries),
+            "items": self.items,
+            "max_items": self.max_items,
+            "ttl_seconds": self.ttl_seconds,
+            "replays": self.replays,
+        }
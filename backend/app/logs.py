@@ -0,0 +1,175 @@
+"""Logging that keeps formatting and I/O off the event loop.
+
+setup_logging() replaces the root handlers with a single QueueHandler: a log
+call on the event loop only builds the LogRecord and puts it on a bounded
+queue. A QueueListener thread formats it and writes it to stderr (and to a
+file). When the queue is full the record is dropped and counted instead of
+blocking the loop.
+
+Records are formatted lazily: the listener thread calls getMessage(), so hot
+paths log with %-style arguments, never f-strings, and pass only values that
+are not mutated afterwards. Fields given as `extra` (token, peer, ...) become
+top-level keys of the JSON line:
+
+    logger.debug("ICE candidate forwarded: peer=%s", peer_id, extra={"token": token, "peer": peer_id})
+    {"ts": "...", "level": "DEBUG", "logger": "webcall", "msg": "ICE candidate forwarded: peer=B", "token": "...", "peer": "B"}
+
+Sampling: DEBUG/INFO records that carry a `token` are limited per room and
+per message template to `sample_per_second`; the rest are counted, and the
+next record of that kind that gets through carries `"suppressed": N`.
+Warnings and errors are never sampled.
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, TextIO, Tuple
+
+LOG_QUEUE_SIZE_DEFAULT = 10000
+LOG_SAMPLE_PER_SECOND_DEFAULT = 20
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, the `extra` fields, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RoomSampler(logging.Filter):
+    """Lets through at most `per_second` DEBUG/INFO records per (room, message template) each second."""
+
+    # Windows are pruned once there are this many (room, template) keys
+    MAX_KEYS = 10000
+
+    def __init__(self, per_second: int):
+        super().__init__()
+        self.per_second = per_second
+        # (token, template) -> [window start, records in window, suppressed]
+        self._windows: Dict[Tuple[str, str], List] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        token = getattr(record, "token", None)
+        if token is None or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        key = (token, record.msg)
+        window = self._windows.get(key)
+        if window is None:
+            if len(self._windows) >= self.MAX_KEYS:
+                self._prune(now)
+            self._windows[key] = [now, 1, 0]
+            return True
+        if now - window[0] >= 1.0:
+            if window[2]:
+                record.suppressed = window[2]
+            window[0], window[1], window[2] = now, 1, 0
+            return True
+        if window[1] < self.per_second:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+    def _prune(self, now: float) -> None:
+        self._windows = {key: window for key, window in self._windows.items() if now - window[0] < 1.0}
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock prepare() formats the message here, on the caller's thread; the listener does it instead
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Root QueueHandler plus the listener thread that owns the real handlers."""
+
+    def __init__(self, handler: _NonBlockingQueueHandler, listener: QueueListener,
+                 sampler: Optional[RoomSampler], fmt: str):
+        self._handler = handler
+        self._listener = listener
+        self._sampler = sampler
+        self.format = fmt
+
+    def stop(self) -> None:
+        """Flush what is queued and stop the listener thread."""
+        if self._listener._thread is not None:
+            self._listener.stop()
+
+    def stats(self) -> dict:
+        return {
+            "format": self.format,
+            "queued": self._handler.queue.qsize(),
+            "queue_size": self._handler.queue.maxsize,
+            "dropped": self._handler.dropped,
+            "sample_per_second": self._sampler.per_second if self._sampler is not None else None,
+            "suppressed": self._sampler.suppressed if self._sampler is not None else 0,
+        }
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", log_file: Optional[str] = None,
+                  queue_size: int = LOG_QUEUE_SIZE_DEFAULT,
+                  sample_per_second: int = LOG_SAMPLE_PER_SECOND_DEFAULT,
+                  stream: Optional[TextIO] = None) -> LogPipeline:
+    """Route all logging through a queue to a background thread; `fmt` is "json" or "text"."""
+    if fmt not in ("json", "text"):
+        raise ValueError(f"log format must be 'json' or 'text', got {fmt!r}")
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler(stream or sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    sampler = RoomSampler(sample_per_second) if sample_per_second > 0 else None
+    if sampler is not None:
+        queue_handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    pipeline = LogPipeline(queue_handler, listener, sampler, fmt)
+    atexit.register(pipeline.stop)
+    return pipeline
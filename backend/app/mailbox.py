@@ -0,0 +1,171 @@
+"""Store-and-forward for signaling sent while nobody else is in the room.
+
+The first peer of a room usually sends its offer, candidates and layout
+before the second one has connected; broadcast() finds no recipient and the
+messages used to be dropped. Mailbox keeps them per room and hands them to
+the next peer that joins, in the order they were sent.
+
+Bounds, so abandoned rooms cannot accumulate anything:
+
+* every letter expires `ttl` seconds after it was posted;
+* a room holds at most `max_messages` letters / `max_bytes` bytes. Once full,
+  new letters are refused - the oldest ones (the offer) matter most;
+* a new offer from a peer replaces that peer's earlier offer and candidates,
+  a new layout its earlier layout, and a peer's letters are discarded when
+  it leaves.
+
+A letter addressed to one peer (`to`, in mesh rooms) is handed only to that
+peer, and supersedes only earlier letters to the same recipient.
+
+Expiry needs no timer: letters are posted with the same TTL, so a single
+global FIFO of (expires_at, token) is ordered by expiry and every put()
+pops what is due from its head.
+"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .codec import EncodedMessage
+
+MAILBOX_TTL_SECONDS_DEFAULT = 30.0
+MAILBOX_MAX_MESSAGES_DEFAULT = 64
+MAILBOX_MAX_BYTES_DEFAULT = 256 * 1024
+
+# Relayed signaling worth keeping; peer-joined/peer-left/bye are state the
+# joiner gets from room-info instead
+MAILBOX_TYPES = frozenset({"offer", "answer", "candidate", "candidates", "orientation"})
+# Letters of these types from the same peer are obsolete once the key type is posted
+_SUPERSEDES = {
+    "offer": frozenset({"offer", "candidate", "candidates"}),
+    "orientation": frozenset({"orientation"}),
+}
+
+
+class Letter:
+    __slots__ = ("from_peer", "to_peer", "type", "message", "size", "expires_at")
+
+    def __init__(self, from_peer: str, type: str, message: EncodedMessage, size: int, expires_at: float,
+                 to_peer: Optional[str] = None):
+        self.from_peer = from_peer
+        self.to_peer = to_peer
+        self.type = type
+        self.message = message
+        self.size = size
+        self.expires_at = expires_at
+
+
+class _Box:
+    __slots__ = ("letters", "bytes")
+
+    def __init__(self) -> None:
+        self.letters: Deque[Letter] = deque()
+        self.bytes = 0
+
+
+class Mailbox:
+    def __init__(self, ttl: float = MAILBOX_TTL_SECONDS_DEFAULT, max_messages: int = MAILBOX_MAX_MESSAGES_DEFAULT,
+                 max_bytes: int = MAILBOX_MAX_BYTES_DEFAULT):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._boxes: Dict[str, _Box] = {}
+        self._expiry: Deque[Tuple[float, str]] = deque()
+        self.posted = 0
+        self.delivered = 0
+        self.expired = 0
+        self.refused = 0
+
+    def __len__(self) -> int:
+        return sum(len(box.letters) for box in self._boxes.values())
+
+    def put(self, token: str, from_peer: str, message: EncodedMessage) -> bool:
+        """Keep `message` for the next peer to join `token` (or for its `to` peer); False if it was not kept."""
+        now = time.monotonic()
+        self.purge(now)
+        kind = message.payload.get("type")
+        if kind not in MAILBOX_TYPES:
+            return False
+        to_peer = message.payload.get("to")
+        box = self._boxes.get(token)
+        superseded = _SUPERSEDES.get(kind)
+        if box is not None and superseded is not None:
+            self._remove(token, box, lambda letter: (letter.from_peer == from_peer and letter.to_peer == to_peer
+                                                     and letter.type in superseded))
+            box = self._boxes.get(token)
+        if box is None:
+            box = self._boxes[token] = _Box()
+        size = len(message.text)
+        if len(box.letters) >= self.max_messages or box.bytes + size > self.max_bytes:
+            self.refused += 1
+            if not box.letters:
+                del self._boxes[token]
+            return False
+        expires_at = now + self.ttl
+        box.letters.append(Letter(from_peer, kind, message, size, expires_at, to_peer))
+        box.bytes += size
+        self._expiry.append((expires_at, token))
+        self.posted += 1
+        return True
+
+    def take(self, token: str, to_peer: str) -> List[Letter]:
+        """Remove and return, oldest first, the letters for `to_peer` it has not sent itself."""
+        self.purge()
+        box = self._boxes.get(token)
+        if box is None:
+            return []
+
+        def for_peer(letter: Letter) -> bool:
+            return letter.from_peer != to_peer and (letter.to_peer is None or letter.to_peer == to_peer)
+
+        letters = [letter for letter in box.letters if for_peer(letter)]
+        if letters:
+            self._remove(token, box, for_peer)
+            self.delivered += len(letters)
+        return letters
+
+    def discard_peer(self, token: str, peer_id: str) -> None:
+        box = self._boxes.get(token)
+        if box is not None:
+            self._remove(token, box, lambda letter: letter.from_peer == peer_id or letter.to_peer == peer_id)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Drop letters whose TTL has passed; amortized O(1) per letter."""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            _, token = expiry.popleft()
+            box = self._boxes.get(token)
+            if box is None:
+                # Already taken or discarded
+                continue
+            letters = box.letters
+            while letters and letters[0].expires_at <= now:
+                box.bytes -= letters.popleft().size
+                removed += 1
+            if not letters:
+                del self._boxes[token]
+        self.expired += removed
+        return removed
+
+    def _remove(self, token: str, box: _Box, predicate) -> None:
+        kept = deque(letter for letter in box.letters if not predicate(letter))
+        box.letters = kept
+        box.bytes = sum(letter.size for letter in kept)
+        if not kept:
+            del self._boxes[token]
+
+    def stats(self) -> Dict[str, Any]:
+        self.purge()
+        return {
+            "ttl_seconds": self.ttl,
+            "rooms": len(self._boxes),
+            "letters": len(self),
+            "bytes": sum(box.bytes for box in self._boxes.values()),
+            "posted": self.posted,
+            "delivered": self.delivered,
+            "expired": self.expired,
+            "refused": self.refused,
+        }
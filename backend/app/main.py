@@ -5,31 +5,86 @@ import logging
 import os
 import time
 import asyncio
-from typing import Dict, Optional
+import secrets
+import random
+import signal
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 from contextlib import asynccontextmanager
+from urllib.parse import quote
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, status
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
-from starlette.websockets import WebSocketState
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
 import uvicorn
 
-from .models import CreateRoomResponse, RoomInfo, ErrorMessage, JoinMessage, SDPMessage, IceMessage, ByeMessage, OrientationMessage
-from .rooms import RoomStore, MAX_PARTICIPANTS_DEFAULT
-
-# Настройка логирования с детальной информацией
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('webcall.log') if os.getenv('LOG_TO_FILE', 'false').lower() == 'true' else logging.NullHandler()
-    ]
+from .models import CreateRoomResponse, BulkCreateRoomsRequest, ROOM_MAX_PARTICIPANTS_LIMIT, RoomInfo, ErrorMessage, JoinMessage, SDPMessage, IceMessage, ByeMessage, OrientationMessage, ResumeMessage, signal_message_adapter
+from .rooms import Room, RoomStore, RoomSpec, MAX_PARTICIPANTS_DEFAULT
+from .persistence import SQLiteRoomStore
+from .backplane import create_backplane
+from .connection import PeerConnection, QueuePolicy
+from .codec import codec, binary_codec, select_subprotocol, subprotocol_options, EncodedMessage, BinaryDecodeError, EncodeError, BINARY_SUBPROTOCOL
+from .compression import DeflateContext
+from .coalesce import CandidateCoalescer
+from .mailbox import Mailbox
+from .previews import PreviewCache
+from .adminfeed import AdminFeed
+from .metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .logs import setup_logging
+from .heartbeat import Heartbeat
+from .drain import Drainer, DRAIN_CLOSE_CODE
+from .idempotency import IdempotencyCache, fingerprint as idempotency_fingerprint, IDEMPOTENCY_TTL_SECONDS_DEFAULT, IDEMPOTENCY_MAX_ITEMS_DEFAULT, IDEMPOTENCY_KEY_MAX_LENGTH
+from .ratelimit import BucketSet, RateLimiter, RateLimitPolicy, parse_budgets, RATE_LIMITS_DEFAULT, RATE_LIMITS_ROOM_DEFAULT, RATE_LIMIT_CLOSE_CODE
+
+# Логирование: записи уходят через очередь в фоновый поток (форматирование и запись — не в event loop).
+# LOG_FORMAT=json|text, частые DEBUG/INFO записи комнаты прореживаются до LOG_SAMPLE_PER_ROOM в секунду
+log_pipeline = setup_logging(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    fmt=os.getenv('LOG_FORMAT', 'json').lower(),
+    log_file='webcall.log' if os.getenv('LOG_TO_FILE', 'false').lower() == 'true' else None,
+    queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+    sample_per_second=int(os.getenv('LOG_SAMPLE_PER_ROOM', '20')),
 )
 logger = logging.getLogger("webcall")
 
-store = RoomStore()
+_store_options = dict(
+    shards=int(os.getenv('ROOM_STORE_SHARDS', '64')),
+    cleanup_interval=float(os.getenv('ROOM_CLEANUP_INTERVAL_SECONDS', '30')),
+)
+# Комнаты больше чем на 2 участника (mesh, offer/answer/candidate адресуются полем "to").
+# Поддержка только на сервере: фронтенд пока двухсторонний, поэтому по умолчанию выключено
+MESH_ROOMS_ENABLED = os.getenv('MESH_ROOMS_ENABLED', 'false').lower() == 'true'
+ROOM_CAPACITY_MAX = ROOM_MAX_PARTICIPANTS_LIMIT if MESH_ROOMS_ENABLED else MAX_PARTICIPANTS_DEFAULT
+# Вместимость комнат по умолчанию
+ROOM_MAX_PARTICIPANTS = int(os.getenv('ROOM_MAX_PARTICIPANTS', str(MAX_PARTICIPANTS_DEFAULT)))
+if ROOM_MAX_PARTICIPANTS > ROOM_CAPACITY_MAX:
+    logger.warning("ROOM_MAX_PARTICIPANTS=%s needs MESH_ROOMS_ENABLED=true, using %s",
+                   ROOM_MAX_PARTICIPANTS, ROOM_CAPACITY_MAX)
+    ROOM_MAX_PARTICIPANTS = ROOM_CAPACITY_MAX
+# ROOM_STORE_PATH включает персистентное хранилище (SQLite) с тёплым рестартом
+ROOM_STORE_PATH = os.getenv('ROOM_STORE_PATH', '')
+if ROOM_STORE_PATH:
+    store: RoomStore = SQLiteRoomStore(
+        ROOM_STORE_PATH,
+        flush_interval=float(os.getenv('ROOM_STORE_FLUSH_INTERVAL_SECONDS', '0.05')),
+        **_store_options,
+    )
+else:
+    store = RoomStore(**_store_options)
+# Поток событий для админ-панелей (SSE): снимок при подключении, дальше join/leave/kick/expire
+admin_feed = AdminFeed(queue_size=int(os.getenv('ADMIN_FEED_QUEUE_SIZE', '1024')))
+
+def _on_rooms_expired(tokens: List[str]) -> None:
+    admin_feed.publish("expire", tokens=tokens)
+    for token in tokens:
+        rate_limiter.discard_room(token)
+
+store.on_expire = _on_rooms_expired
+# Межпроцессная шина сигнализации (для запуска с несколькими uvicorn workers)
+backplane = create_backplane(os.getenv('BACKPLANE_URL', ''))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -39,6 +94,13 @@ async def lifespan(app: FastAPI):
         logger.info("Lifespan: Starting Web Call Signaling Server")
         store.start_cleanup()
         logger.info("Lifespan: Room cleanup service started")
+        await backplane.start(broadcast_local)
+        logger.info(f"Lifespan: Backplane started ({type(backplane).__name__})")
+        if heartbeat is not None:
+            heartbeat.start()
+            logger.info(f"Lifespan: Heartbeat started (ping after {HEARTBEAT_INTERVAL_SECONDS}s idle, timeout {HEARTBEAT_TIMEOUT_SECONDS}s)")
+        if _install_sigterm_drain():
+            logger.info("Lifespan: SIGTERM drains connections before the server stops")
         
         yield
         
@@ -52,27 +114,30 @@ async def lifespan(app: FastAPI):
         # Shutdown logic
         logger.info("Lifespan: Shutting down Web Call Signaling Server")
         
+        _restore_sigterm()
+        # Drain по SIGTERM или через админку уже прошёл; здесь — запасной путь для остановки без сигнала
+        # (сокеты, которые закрыл сам uvicorn, подсказку reconnect уже не получат)
+        try:
+            _start_drain("shutdown")
+            await drainer.wait()
+            logger.info(f"Lifespan: Drained {drainer.closed} of {drainer.total} WebSocket connections")
+        except Exception as e:
+            logger.error(f"Lifespan: Error draining connections: {e}")
+        
         # Останавливаем сервис очистки
         try:
-            store.stop_cleanup()
+            await store.close()
             logger.info("Lifespan: Room cleanup service stopped")
         except Exception as e:
             logger.error(f"Lifespan: Error stopping cleanup: {e}")
         
-        # Закрываем все активные WebSocket соединения
-        closed_count = 0
-        for token, peers in list(connections.items()):
-            for peer_id, ws in list(peers.items()):
-                try:
-                    # Проверяем состояние соединения
-                    if ws.client_state != WebSocketState.DISCONNECTED:
-                        await ws.close(code=1001, reason="Server shutdown")
-                        closed_count += 1
-                except Exception as e:
-                    logger.warning(f"Lifespan: Error closing WebSocket for {token}/{peer_id}: {e}")
+        try:
+            await backplane.stop()
+        except Exception as e:
+            logger.error(f"Lifespan: Error stopping backplane: {e}")
         
-        if closed_count > 0:
-            logger.info(f"Lifespan: Closed {closed_count} active WebSocket connections")
+        if heartbeat is not None:
+            await heartbeat.stop()
         
         logger.info("Lifespan: Shutdown complete")
 
@@ -91,6 +156,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Нужны админ-панели для пакетной загрузки превью
+    expose_headers=["ETag", "X-Preview-Version", "X-Total-Rooms", "Idempotent-Replayed"],
 )
 
 # Упрощенный health check
@@ -99,14 +166,26 @@ async def health():
     """Простой health check"""
     try:
         # Проверяем доступность хранилища комнат
-        room_count = len(store.rooms) if hasattr(store, 'rooms') else 0
+        room_count = len(store)
+        
+        if drainer.draining:
+            # Балансировщик должен перестать направлять сюда новых клиентов
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={
+                    "status": "draining",
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "drain": drainer.stats()
+                }
+            )
         
         return {
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "version": "1.0",
             "rooms": {
-                "active": room_count,
+                # Комнаты в памяти; с ROOM_STORE_PATH комнаты только на диске не учитываются
+                "cached": room_count,
                 "store_available": True
             }
         }
@@ -121,6 +200,11 @@ async def health():
             }
         )
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики в формате Prometheus (не проксируется nginx: только для скрейпера)"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 # Дополнительный endpoint для диагностики
 @app.get("/api/debug")
 async def debug_info():
@@ -133,34 +217,93 @@ async def debug_info():
             },
             "environment": {
                 "public_base_url": os.getenv("PUBLIC_BASE_URL"),
-                "max_participants": MAX_PARTICIPANTS_DEFAULT,
-                "log_level": logger.level
+                "max_participants": ROOM_MAX_PARTICIPANTS,
+                "mesh_rooms_enabled": MESH_ROOMS_ENABLED,
+                "backplane": type(backplane).__name__,
+                "json_codec": codec.name,
+                "binary_subprotocol": BINARY_SUBPROTOCOL if binary_codec is not None else None,
+                "log_level": logging.getLevelName(logger.getEffectiveLevel())
+            },
+            "compression": _compression_stats(),
+            "sessions": {
+                "resume_window_seconds": RESUME_WINDOW_SECONDS,
+                "active": len(sessions),
+                "detached": sum(session.conn.detached for session in sessions.values())
             },
+            "previews": preview_cache.stats(),
+            "idempotency": idempotency.stats(),
+            "admin_feed": admin_feed.stats(),
+            "logging": log_pipeline.stats(),
+            "drain": drainer.stats(),
+            "heartbeat": heartbeat.stats() if heartbeat is not None else {"enabled": False},
+            "rate_limits": rate_limiter.stats() if rate_limiter.enabled else {"enabled": False},
+            "mailbox": mailbox.stats() if mailbox is not None else {"enabled": False},
+            "ice_coalescing": (
+                {"window_ms": ICE_COALESCE_WINDOW_MS, "max_batch": ICE_COALESCE_MAX_BATCH, **ice_coalescer.stats.snapshot()}
+                if ice_coalescer is not None else {"enabled": False}
+            ),
             "connections": {
                 "active_rooms": len(connections),
                 "total_peers": sum(len(peers) for peers in connections.values()),
-                "room_tokens": list(connections.keys())
+                "binary_peers": sum(conn.binary for peers in connections.values() for conn in peers.values()),
+                "compressed_peers": sum(conn.deflate is not None for peers in connections.values() for conn in peers.values())
             }
         }
     except Exception as e:
         logger.error(f"Debug info failed: {e}")
         raise HTTPException(status_code=500, detail=f"Debug info unavailable: {str(e)}")
 
+def _public_base_url(request: Request) -> str:
+    # Используем PUBLIC_BASE_URL или базовый URL из запроса
+    base_url = "https://talklink.space"
+    if not base_url:
+        # Если переменная окружения не задана, берем базовый URL из запроса
+        return str(request.base_url).rstrip("/")
+    return base_url.rstrip("/")
+
+async def _publish_rooms(rooms: List[Room]) -> None:
+    """Сообщаем другим воркерам о созданных комнатах: вместимость и срок жизни общие для всех"""
+    try:
+        await backplane.publish_rooms([
+            (room.token, room.created_at, room.expires_at, room.max_participants) for room in rooms
+        ])
+    except Exception as e:
+        logger.warning("Failed to publish %s rooms to backplane: %s", len(rooms), e)
+
+async def _room_or_create(token: str) -> Room:
+    """Комната по токену; неизвестная или истёкшая создаётся заново.
+    Комната, созданная на другом воркере, воссоздаётся с её вместимостью и сроком жизни
+    """
+    room = await store.get_room(token)
+    now = time.time()
+    if room and not (now >= room.expires_at and room.participants == 0):
+        return room
+    shared = await backplane.lookup_room(token)
+    if shared is not None and shared["expires_at"] > now:
+        return await store.create_room_with_token(token, shared["max"], max(1, int(shared["expires_at"] - now)))
+    room = await store.create_room_with_token(token, ROOM_MAX_PARTICIPANTS)
+    await _publish_rooms([room])
+    return room
+
+def _check_capacity(max_participants: int) -> None:
+    if max_participants > ROOM_CAPACITY_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Rooms for more than {ROOM_CAPACITY_MAX} participants need MESH_ROOMS_ENABLED=true"
+        )
+
 @app.post("/api/rooms", response_model=CreateRoomResponse)
-async def create_room(request: Request):
-    """Создание новой комнаты с улучшенной обработкой ошибок"""
+async def create_room(
+    request: Request,
+    maxParticipants: Optional[int] = Query(None, ge=1, le=ROOM_MAX_PARTICIPANTS_LIMIT),
+):
+    """Создание новой комнаты с улучшенной обработкой ошибок; maxParticipants > 2 — комната-mesh (MESH_ROOMS_ENABLED)"""
+    if maxParticipants is not None:
+        _check_capacity(maxParticipants)
     try:
-        room = await store.create_room(max_participants=MAX_PARTICIPANTS_DEFAULT)
-        # Используем PUBLIC_BASE_URL или базовый URL из запроса
-        base_url = "https://talklink.space"
-        if not base_url:
-            # Если переменная окружения не задана, берем базовый URL из запроса
-            base_url = str(request.base_url).rstrip("/")
-        else:
-            base_url = base_url.rstrip("/")
-        
-        url_path = f"/r/{room.token}"
-        url = f"{base_url}{url_path}"
+        room = await store.create_room(max_participants=maxParticipants or ROOM_MAX_PARTICIPANTS)
+        await _publish_rooms([room])
+        url = f"{_public_base_url(request)}/r/{room.token}"
         
         logger.info(f"Room created: {room.token}, max_participants: {room.max_participants}")
         
@@ -176,25 +319,129 @@ async def create_room(request: Request):
             detail=f"Failed to create room: {str(e)}"
         )
 
+# --- Пакетное создание комнат (POST /api/rooms/bulk) ---
+ROOMS_BULK_MAX = int(os.getenv('ROOMS_BULK_MAX', '10000'))
+# Ответы по Idempotency-Key: повтор запроса возвращает уже созданные комнаты
+idempotency = IdempotencyCache(
+    ttl_seconds=float(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(IDEMPOTENCY_TTL_SECONDS_DEFAULT))),
+    max_items=int(os.getenv('IDEMPOTENCY_MAX_ROOMS', str(IDEMPOTENCY_MAX_ITEMS_DEFAULT))),
+)
+# Сколько строк NDJSON отдавать одним куском потока
+ROOMS_BULK_CHUNK = 500
+
+def _bulk_specs(body: BulkCreateRoomsRequest) -> List[RoomSpec]:
+    ttl = body.ttlSeconds
+    max_participants = body.maxParticipants or ROOM_MAX_PARTICIPANTS
+    specs = [RoomSpec(None, max_participants, ttl) for _ in range(body.count)]
+    for room in body.rooms:
+        specs.append(RoomSpec(
+            room.token,
+            room.maxParticipants or max_participants,
+            room.ttlSeconds if room.ttlSeconds is not None else ttl,
+        ))
+    return specs
+
+async def _stream_lines(lines: List[bytes]):
+    for start in range(0, len(lines), ROOMS_BULK_CHUNK):
+        yield b"".join(lines[start:start + ROOMS_BULK_CHUNK])
+        # Большой ответ не должен держать event loop
+        await asyncio.sleep(0)
+
+@app.post("/api/rooms/bulk")
+async def create_rooms_bulk(request: Request):
+    """Пакетное создание комнат: count сгенерированных и/или rooms с заданными токенами.
+
+    Ответ — application/x-ndjson, по строке на комнату в порядке запроса:
+    {"token", "url", "ttlSeconds", "maxParticipants", "created"}; created=false означает,
+    что комната с таким токеном уже существовала и не перезаписана. С заголовком
+    Idempotency-Key повтор того же запроса возвращает тот же ответ без создания комнат.
+    """
+    raw = await request.body()
+    try:
+        body = BulkCreateRoomsRequest.model_validate_json(raw or b"{}")
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False, include_input=False))
+    total = body.count + len(body.rooms)
+    if total == 0 or total > ROOMS_BULK_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Between 1 and {ROOMS_BULK_MAX} rooms per request, got {total}"
+        )
+    specs = _bulk_specs(body)
+    _check_capacity(max(spec.max_participants for spec in specs))
+    
+    key = request.headers.get("idempotency-key")
+    if key is not None and not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Idempotency-Key")
+    headers = {"Cache-Control": "no-store"}
+    if key is not None:
+        body_fingerprint = idempotency_fingerprint(raw)
+        entry = idempotency.get(key)
+        if entry is not None:
+            if entry.fingerprint != body_fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="Idempotency-Key was already used with a different request body"
+                )
+            if entry.pending:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            idempotency.replays += 1
+            logger.info(f"Bulk room creation replayed: key={key}, rooms={entry.size}")
+            return StreamingResponse(_stream_lines(entry.result), media_type="application/x-ndjson",
+                                     headers={**headers, "Idempotent-Replayed": "true"})
+        idempotency.begin(key, body_fingerprint)
+    
+    try:
+        results = await store.create_rooms(specs)
+        base_url = _public_base_url(request)
+        now = time.time()
+        lines = [
+            (json.dumps({
+                "token": room.token,
+                "url": f"{base_url}/r/{room.token}",
+                "ttlSeconds": max(0, int(room.expires_at - now)),
+                "maxParticipants": room.max_participants,
+                "created": created,
+            }, separators=(",", ":")) + "\n").encode("utf-8")
+            for room, created in results
+        ]
+        if key is not None:
+            idempotency.complete(key, lines)
+    except Exception as e:
+        logger.error(f"Failed to create rooms in bulk: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create rooms: {str(e)}"
+        )
+    finally:
+        if key is not None:
+            # Ошибка или отмена запроса: ключ освобождается, повтор выполнится заново
+            idempotency.abort(key)
+    
+    await _publish_rooms([room for room, created in results if created])
+    created_count = sum(created for _, created in results)
+    logger.info(f"Rooms created in bulk: {created_count} of {len(results)}")
+    return StreamingResponse(_stream_lines(lines), media_type="application/x-ndjson", headers=headers)
+
 @app.get("/api/rooms/{token}", response_model=RoomInfo)
 async def get_room(token: str):
     """Получение информации о комнате с улучшенной обработкой ошибок"""
     try:
-        room = await store.get_room(token)
-        now = time.time()
-        
-        if (not room) or (now >= room.expires_at and room.participants == 0):
-            # Автоматическое создание/воссоздание комнаты
-            logger.info(f"Auto-creating room with token: {token}")
-            room = await store.create_room_with_token(token, MAX_PARTICIPANTS_DEFAULT)
+        room = await _room_or_create(token)
+        # Участники могут быть подключены и к другим воркерам
+        shared = await backplane.lookup_room(token)
+        participants = max(room.participants, shared["participants"]) if shared else room.participants
         
-        status = "active" if room.participants > 0 else "waiting"
+        status = "active" if participants > 0 else "waiting"
         
-        logger.debug(f"Room info requested: {token}, participants: {room.participants}, status: {status}")
+        logger.debug("Room info requested: %s, participants: %s, status: %s", token, participants, status)
         
         return RoomInfo(
             token=token, 
-            participants=room.participants, 
+            participants=participants, 
             maxParticipants=room.max_participants, 
             status=status
         )
@@ -207,14 +454,292 @@ async def get_room(token: str):
 
 # --- WebSocket signaling с улучшенной обработкой ошибок ---
 
-# Mapping: roomToken -> peerId -> WebSocket
-connections: Dict[str, Dict[str, WebSocket]] = {}
+# Mapping: roomToken -> peerId -> PeerConnection
+connections: Dict[str, Dict[str, PeerConnection]] = {}
+
+# --- Метрики (Prometheus, GET /metrics) ---
+# Метки только из фиксированных наборов: типы сообщений, причины; никаких token/peerId
+MESSAGE_TYPES = frozenset({"join", "offer", "answer", "candidate", "bye", "orientation", "resume"})
+metrics = Registry()
+messages_total = metrics.counter(
+    "webcall_messages_total", "Signaling messages handled, by type and result", ("type", "result"))
+# Сигнальные сообщения, которые сервер пересылает от клиента к клиенту; служебные (peer-joined и т.п.) не меряем
+RELAYED_TYPES = frozenset({"offer", "answer", "candidate", "candidates", "orientation", "bye"})
+relay_enqueue = metrics.histogram(
+    "webcall_relay_enqueue_seconds",
+    "From receiving a signaling frame to queueing it for the last local recipient, by type", ("type",))
+fanout_duration = metrics.histogram(
+    "webcall_fanout_seconds", "Time to queue one message to all local recipients of a room")
+send_failures = metrics.counter(
+    "webcall_send_failures_total", "Outbound failures: enqueue (broadcast), encode (payload), writer (socket/overflow), backplane", ("reason",))
+metrics.gauge("webcall_rooms", "Rooms cached in memory by the room store (not those only on disk)", lambda: len(store))
+metrics.gauge("webcall_active_rooms", "Rooms with at least one local connection",
+              lambda: sum(1 for peers in connections.values() if peers))
+metrics.gauge("webcall_peers", "Local signaling connections", lambda: sum(len(peers) for peers in connections.values()))
+metrics.gauge("webcall_detached_sessions", "Sessions waiting for resume",
+              lambda: sum(session.conn.detached for session in sessions.values()))
+metrics.gauge("webcall_preview_bytes", "Bytes of admin preview images stored", lambda: preview_cache.bytes)
+metrics.gauge("webcall_preview_entries", "Admin preview images stored", lambda: len(preview_cache))
+# perf_counter() приёма текущего кадра: broadcast() по нему меряет задержку пересылки.
+# Контекст копируется в таймеры склейки ICE, так что задержка включает и ожидание в пачке
+_frame_received_at: ContextVar[Optional[float]] = ContextVar("frame_received_at", default=None)
 
 # Retry конфигурация
 WS_RETRY_ATTEMPTS = int(os.getenv('WS_RETRY_ATTEMPTS', '3'))
 WS_RETRY_DELAY = float(os.getenv('WS_RETRY_DELAY', '1.0'))
 WS_MAX_RETRY_DELAY = float(os.getenv('WS_MAX_RETRY_DELAY', '30.0'))
 
+# Очередь исходящих сообщений на каждое соединение: размер и политика переполнения (drop | disconnect | block)
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '256'))
+WS_SEND_QUEUE_POLICY = QueuePolicy(os.getenv('WS_SEND_QUEUE_POLICY', 'drop'))
+
+# Лимиты входящих сообщений (token bucket): "тип=в_секунду/всплеск,...", "*" — остальные типы; пустая строка — без лимита.
+# RATE_LIMITS — на соединение, RATE_LIMITS_ROOM — на комнату целиком. Превышение: drop | delay | close
+rate_limiter = RateLimiter(
+    parse_budgets(os.getenv('RATE_LIMITS', RATE_LIMITS_DEFAULT)),
+    parse_budgets(os.getenv('RATE_LIMITS_ROOM', RATE_LIMITS_ROOM_DEFAULT)),
+    policy=RateLimitPolicy(os.getenv('RATE_LIMIT_POLICY', 'drop')),
+    max_delay=float(os.getenv('RATE_LIMIT_MAX_DELAY_MS', '1000')) / 1000.0,
+)
+
+# Валидация пересылаемых сообщений (offer/answer/candidate/bye/orientation):
+#   relay  — одна проверка через TypeAdapter, клиенту уходит исходный кадр без изменений
+#   strict — полная модель + model_dump(), кадр собирается заново
+SIGNAL_VALIDATION = os.getenv('SIGNAL_VALIDATION', 'relay').lower()
+if SIGNAL_VALIDATION not in ('relay', 'strict'):
+    raise ValueError(f"SIGNAL_VALIDATION must be 'relay' or 'strict', got {SIGNAL_VALIDATION!r}")
+
+# Сжатие сигнализации deflate со словарём SDP (подпротоколы *+zdict1) и уровень сжатия
+WS_SDP_DICTIONARY = os.getenv('WS_SDP_DICTIONARY', 'true').lower() == 'true'
+WS_DEFLATE_LEVEL = int(os.getenv('WS_DEFLATE_LEVEL', '6'))
+# Включён ли permessage-deflate у uvicorn: должно совпадать с --ws-per-message-deflate (по умолчанию у uvicorn true).
+# Поверх него *+zdict1 сжимал бы кадры дважды, поэтому клиенту, предложившему permessage-deflate, словарь не выдаётся
+WS_PER_MESSAGE_DEFLATE = os.getenv('WS_PER_MESSAGE_DEFLATE', 'true').lower() == 'true'
+
+def _transport_deflate(ws: WebSocket) -> bool:
+    """Согласует ли uvicorn с этим клиентом permessage-deflate"""
+    if not WS_PER_MESSAGE_DEFLATE:
+        return False
+    offered = ws.headers.get("sec-websocket-extensions", "")
+    return any(ext.split(";")[0].strip() == "permessage-deflate" for ext in offered.split(","))
+
+# Склейка trickle-ICE кандидатов одного пира в один кадр "candidates" (0 — выключено)
+ICE_COALESCE_WINDOW_MS = float(os.getenv('ICE_COALESCE_WINDOW_MS', '0'))
+ICE_COALESCE_MAX_BATCH = int(os.getenv('ICE_COALESCE_MAX_BATCH', '32'))
+ice_coalescer: Optional[CandidateCoalescer] = (
+    CandidateCoalescer(lambda t, p, payload: broadcast(t, p, payload),
+                       window=ICE_COALESCE_WINDOW_MS / 1000.0, max_batch=ICE_COALESCE_MAX_BATCH)
+    if ICE_COALESCE_WINDOW_MS > 0 else None
+)
+
+# Почтовый ящик комнаты: сообщения, отправленные, пока в комнате никого нет, доставляются вошедшему (0 — выключено)
+MAILBOX_TTL_SECONDS = float(os.getenv('MAILBOX_TTL_SECONDS', '30'))
+mailbox: Optional[Mailbox] = (
+    Mailbox(MAILBOX_TTL_SECONDS,
+            max_messages=int(os.getenv('MAILBOX_MAX_MESSAGES', '64')),
+            max_bytes=int(os.getenv('MAILBOX_MAX_BYTES', '262144')))
+    if MAILBOX_TTL_SECONDS > 0 else None
+)
+
+# Возобновление сессии после обрыва WS: сколько ждать resume и сколько последних кадров хранить для повтора (0 — выключено)
+RESUME_WINDOW_SECONDS = float(os.getenv('RESUME_WINDOW_SECONDS', '30'))
+RESUME_BUFFER_SIZE = int(os.getenv('RESUME_BUFFER_SIZE', '64'))
+# Клиент закрыл соединение сам (уход со страницы, выход; 1005 — close() без кода) — сессию не держим
+RESUME_FINAL_CLOSE_CODES = (1000, 1001, 1005)
+
+# Heartbeat: ping после HEARTBEAT_INTERVAL_SECONDS тишины от клиента; нет ответа за HEARTBEAT_TIMEOUT_SECONDS —
+# сокет закрывается с кодом 4408 как мёртвый (0 — выключено). Все сроки — в одном timer wheel.
+# По умолчанию выключено: клиенты без ответа на ping отключались бы каждые полминуты тишины
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv('HEARTBEAT_INTERVAL_SECONDS', '0'))
+HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv('HEARTBEAT_TIMEOUT_SECONDS', '10'))
+HEARTBEAT_CLOSE_CODE = 4408
+heartbeat: Optional[Heartbeat] = (
+    Heartbeat(HEARTBEAT_INTERVAL_SECONDS, HEARTBEAT_TIMEOUT_SECONDS) if HEARTBEAT_INTERVAL_SECONDS > 0 else None
+)
+PING_MESSAGE = EncodedMessage({"type": "ping"})
+heartbeat_timeouts = metrics.counter(
+    "webcall_heartbeat_timeouts_total", "Sockets closed because they did not answer a ping")
+_heartbeat_tasks = set()
+
+class _Session:
+    """Сессия участника, переживающая переподключения WS в пределах RESUME_WINDOW_SECONDS"""
+    __slots__ = ("token", "peer_id", "conn", "expiry")
+
+    def __init__(self, token: str, peer_id: str, conn: PeerConnection):
+        self.token = token
+        self.peer_id = peer_id
+        self.conn = conn
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+# Mapping: resume token -> сессия
+sessions: Dict[str, _Session] = {}
+_session_tasks = set()
+
+def _end_session(conn: PeerConnection) -> None:
+    """Забывает сессию соединения: resume по её токену больше невозможен"""
+    session = sessions.pop(conn.resume_token, None) if conn.resume_token else None
+    if session is not None and session.expiry is not None:
+        session.expiry.cancel()
+
+def _schedule_session_expiry(session: _Session) -> None:
+    if session.expiry is not None:
+        session.expiry.cancel()
+
+    def expire():
+        task = asyncio.get_running_loop().create_task(_expire_session(session))
+        _session_tasks.add(task)
+        task.add_done_callback(_session_tasks.discard)
+
+    session.expiry = asyncio.get_running_loop().call_later(RESUME_WINDOW_SECONDS, expire)
+
+async def _expire_session(session: _Session) -> None:
+    """Окно resume истекло: участник выходит окончательно"""
+    if sessions.get(session.conn.resume_token) is not session or not session.conn.detached:
+        return
+    logger.info("Resume window expired: token=%s, peer=%s", session.token, session.peer_id,
+                extra={"token": session.token, "peer": session.peer_id})
+    await release_peer(session.token, session.peer_id, session.conn, reason="timeout")
+    await session.conn.close()
+
+def _forget_connection(token: str, conn: PeerConnection) -> None:
+    """Убирает упавшее соединение из таблицы маршрутизации"""
+    peers = connections.get(token, {})
+    for pid, existing in list(peers.items()):
+        if existing is conn:
+            del peers[pid]
+            logger.info("Removed failed peer %s from room %s", pid, token, extra={"token": token, "peer": pid})
+    send_failures.inc("writer")
+
+# --- Drain (перед остановкой и при rolling deploy) ---
+# Новые join не принимаются, каждому соединению уходит {"type": "reconnect"}, и сокеты закрываются
+# с кодом 1012 параллельно, не больше DRAIN_CONCURRENCY одновременно; через DRAIN_DEADLINE_SECONDS
+# оставшиеся бросаются (должно быть меньше timeout_graceful_shutdown)
+DRAIN_RECONNECT_JITTER_MS = int(os.getenv('DRAIN_RECONNECT_JITTER_MS', '2000'))
+
+def _reconnect_hint() -> dict:
+    # Случайная задержка, чтобы клиенты не пришли на соседний инстанс все разом
+    return {
+        "type": "reconnect",
+        "reason": "draining",
+        "retryAfterMs": random.randint(0, DRAIN_RECONNECT_JITTER_MS),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+async def _drain_connection(target) -> None:
+    token, peer_id, conn = target
+    # Сессия не переживёт инстанс: клиент входит заново на другом, а не ждёт resume здесь
+    _end_session(conn)
+    if conn.detached:
+        # Цикл приёма этого соединения уже завершён — выход из комнаты за ним
+        await release_peer(token, peer_id, conn, reason="drain")
+    else:
+        # Выход из комнаты сделает цикл приёма, когда сокет закроется
+        try:
+            await conn.send_message(_reconnect_hint())
+        except Exception as e:
+            logger.debug("Reconnect hint to %s/%s failed: %s", token, peer_id, e)
+    await conn.close(DRAIN_CLOSE_CODE, "Server draining")
+
+def _start_drain(reason: str) -> bool:
+    """Запуск drain по текущим соединениям; False, если он уже идёт или завершён"""
+    targets = [(token, peer_id, conn) for token, peers in connections.items() for peer_id, conn in peers.items()]
+    if not drainer.start(targets, reason=reason):
+        return False
+    admin_feed.publish("drain", reason=reason, total=drainer.total)
+    return True
+
+# SIGTERM: сначала drain, затем обычная остановка uvicorn. Сам uvicorn при остановке
+# закрывает сокеты кодом 1012 до lifespan shutdown — drain оттуда опоздал бы
+_sigterm_previous = None
+_sigterm_received = False
+_sigterm_task: Optional[asyncio.Task] = None
+
+def _install_sigterm_drain() -> bool:
+    """Перехватывает SIGTERM, откладывая обработчик сервера до конца drain"""
+    global _sigterm_previous
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    previous = signal.getsignal(signal.SIGTERM)
+    if not callable(previous):
+        # Сервер сам SIGTERM не обрабатывает — откладывать нечего
+        return False
+    loop = asyncio.get_running_loop()
+
+    async def drain_then_exit(sig: int, frame) -> None:
+        try:
+            if _start_drain("sigterm"):
+                logger.info("SIGTERM: draining %s connections before shutdown", drainer.total)
+            await drainer.wait()
+        finally:
+            previous(sig, frame)
+
+    def start(sig: int, frame) -> None:
+        global _sigterm_task
+        _sigterm_task = loop.create_task(drain_then_exit(sig, frame))
+
+    def on_sigterm(sig: int, frame) -> None:
+        global _sigterm_received
+        if _sigterm_received:
+            # Повторный SIGTERM — останавливаемся, не дожидаясь drain
+            previous(sig, frame)
+            return
+        _sigterm_received = True
+        # Обработчик сигнала может прервать сам event loop: задачу создаём уже из цикла
+        loop.call_soon_threadsafe(start, sig, frame)
+
+    _sigterm_previous = previous
+    signal.signal(signal.SIGTERM, on_sigterm)
+    return True
+
+def _restore_sigterm() -> None:
+    global _sigterm_previous
+    if _sigterm_previous is not None:
+        signal.signal(signal.SIGTERM, _sigterm_previous)
+        _sigterm_previous = None
+
+drainer = Drainer(
+    _drain_connection,
+    concurrency=int(os.getenv('DRAIN_CONCURRENCY', '200')),
+    deadline=float(os.getenv('DRAIN_DEADLINE_SECONDS', '25')),
+)
+metrics.gauge("webcall_draining", "1 while the instance is draining or drained", lambda: int(drainer.draining))
+
+def _compression_stats() -> dict:
+    """Сжатие исходящих кадров по текущим соединениям с подпротоколом *+zdict1"""
+    raw = wire = 0
+    for peers in connections.values():
+        for conn in peers.values():
+            if conn.deflate is not None:
+                raw += conn.deflate.raw_bytes
+                wire += conn.deflate.wire_bytes
+    return {
+        "sdp_dictionary": WS_SDP_DICTIONARY,
+        "per_message_deflate": WS_PER_MESSAGE_DEFLATE,
+        "level": WS_DEFLATE_LEVEL,
+        "raw_bytes": raw,
+        "wire_bytes": wire,
+        "ratio": round(wire / raw, 3) if raw else None,
+    }
+
+def _decode_frame(conn: PeerConnection, message: dict):
+    """Разбор входящего кадра: (data, raw), где raw — исходный JSON (str) или MessagePack (bytes)"""
+    raw = message.get("text")
+    if raw is None:
+        raw = message.get("bytes") or b""
+        if conn.deflate is not None:
+            raw = conn.deflate.decompress(raw)
+            if not conn.binary:
+                # Внутри сжатого кадра — текстовый JSON
+                try:
+                    raw = raw.decode("utf-8")
+                except UnicodeDecodeError as e:
+                    raise BinaryDecodeError(f"invalid UTF-8 in JSON frame: {e}") from e
+    if isinstance(raw, str):
+        return codec.loads(raw), raw
+    if binary_codec is None:
+        raise BinaryDecodeError("binary frames are not supported")
+    return binary_codec.loads(raw), raw
+
 async def send_error(ws: WebSocket, code: str, message: str, details: Optional[str] = None):
     """Отправка структурированной ошибки клиенту"""
     error_data = {
@@ -227,8 +752,8 @@ async def send_error(ws: WebSocket, code: str, message: str, details: Optional[s
         error_data["details"] = details
     
     try:
-        await ws.send_text(json.dumps(error_data))
-        logger.warning(f"Sent error to client: {code} - {message}")
+        await ws.send_message(error_data)
+        logger.warning("Sent error to client: %s - %s", code, message)
     except Exception as e:
         logger.error(f"Failed to send error to client: {e}")
 
@@ -236,184 +761,416 @@ async def send_error(ws: WebSocket, code: str, message: str, details: Optional[s
 async def websocket_connection_manager(ws: WebSocket, token: str, peer_id: Optional[str] = None):
     """Контекстный менеджер для управления WebSocket соединениями"""
     try:
-        logger.info(f"WebSocket connection established: token={token}, peer={peer_id}")
+        logger.info("WebSocket connection established: token=%s, peer=%s", token, peer_id, extra={"token": token})
         yield ws
     except Exception as e:
-        logger.error(f"WebSocket connection error: token={token}, peer={peer_id}, error={e}")
+        logger.error("WebSocket connection error: token=%s, peer=%s, error=%s", token, peer_id, e, extra={"token": token})
         raise
     finally:
-        logger.info(f"WebSocket connection closed: token={token}, peer={peer_id}")
+        logger.info("WebSocket connection closed: token=%s, peer=%s", token, peer_id, extra={"token": token})
 
-async def handle_websocket_message(ws: WebSocket, token: str, peer_id: str, data: dict):
+async def handle_websocket_message(ws: WebSocket, token: str, peer_id: str, data: dict, raw: Optional[Union[str, bytes]] = None):
     """Обработка сообщений WebSocket с улучшенной валидацией"""
+    msg_type = data.get("type")
+    ok = False
     try:
-        msg_type = data.get("type")
-        
         if not msg_type:
             await send_error(ws, "missing_type", "Message type is required")
-            return False
         
         # JOIN
-        if msg_type == "join":
-            return await handle_join_message(ws, token, peer_id, data)
+        elif msg_type == "join":
+            ok = await handle_join_message(ws, token, peer_id, data)
         
         # OFFER/ANSWER
         elif msg_type in ("offer", "answer"):
-            return await handle_sdp_message(ws, token, peer_id, data)
+            ok = await handle_sdp_message(ws, token, peer_id, data, raw)
         
         # ICE
         elif msg_type == "candidate":
-            return await handle_ice_message(ws, token, peer_id, data)
+            ok = await handle_ice_message(ws, token, peer_id, data, raw)
         
         # BYE
         elif msg_type == "bye":
-            return await handle_bye_message(ws, token, peer_id, data)
+            ok = await handle_bye_message(ws, token, peer_id, data, raw)
         
         # ORIENTATION
         elif msg_type == "orientation":
-            return await handle_orientation_message(ws, token, peer_id, data)
+            ok = await handle_orientation_message(ws, token, peer_id, data, raw)
         
         else:
             await send_error(ws, "unknown_type", f"Unknown message type: {msg_type}")
-            return False
             
     except Exception as e:
-        logger.error(f"Error handling WebSocket message: {e}")
+        logger.error("Error handling WebSocket message: %s", e, extra={"token": token})
         await send_error(ws, "internal_error", "Internal server error", str(e))
-        return False
+        ok = False
+    messages_total.inc(msg_type if msg_type in MESSAGE_TYPES else "other", "ok" if ok else "error")
+    return ok
 
 async def handle_join_message(ws: WebSocket, token: str, peer_id: str, data: dict):
     """Обработка JOIN сообщения"""
     try:
         join = JoinMessage(**data)
+        if drainer.draining:
+            await ws.send_message(_reconnect_hint())
+            await ws.close(DRAIN_CLOSE_CODE, "Server draining")
+            return False
         room = await store.get_room(token)
         
         if not room:
             await send_error(ws, "room_not_found", "Room not found")
             return False
         
-        # Проверка емкости
-        if room.participants >= room.max_participants and join.peerId not in room.peers:
-            await send_error(ws, "room_full", f"Room is full (max {room.max_participants} participants)")
-            await ws.close(code=4403)
-            return False
+        # Проверка емкости и регистрация под локом комнаты
+        remote_peers = []
+        async with room.lock:
+            full_message = f"Room is full (max {room.max_participants} participants)"
+            ok = False
+            if room.participants < room.max_participants or join.peerId in room.peers:
+                # Емкость проверяется по всем воркерам, а не только по локальным сокетам
+                claimed = await backplane.claim(token, join.peerId, room.max_participants)
+                if claimed is not None:
+                    remote_peers = claimed
+                    ok = room.join(join.peerId)
+                    if not ok:
+                        full_message = "Room is full"
+                        await backplane.release(token, join.peerId)
+            
+            if ok:
+                previous = connections.get(token, {}).get(join.peerId)
+                if previous is not None and previous is not ws:
+                    # Вошёл заново вместо resume: прежняя сессия больше не нужна
+                    _end_session(previous)
+                    if previous.detached:
+                        previous.abandon()
+                if RESUME_WINDOW_SECONDS > 0:
+                    _end_session(ws)
+                    resume_token = secrets.token_urlsafe(16)
+                    ws.begin_session(resume_token, RESUME_BUFFER_SIZE)
+                    sessions[resume_token] = _Session(token, join.peerId, ws)
+                # Регистрируем соединение
+                connections.setdefault(token, {})[join.peerId] = ws
         
-        ok = room.join(join.peerId)
         if not ok:
-            await send_error(ws, "room_full", "Room is full")
+            await send_error(ws, "room_full", full_message)
             await ws.close(code=4403)
             return False
+        logger.info("Peer joined: token=%s, peer=%s, total_participants=%d", token, join.peerId, room.participants,
+                    extra={"token": token, "peer": join.peerId})
+        if admin_feed.active:
+            peer = room.peers.get(join.peerId)
+            admin_feed.publish("join", token=token, peerId=join.peerId,
+                               connectedAt=peer.connected_at if peer else None,
+                               participants=room.participants, maxParticipants=room.max_participants)
         
-        # Регистрируем соединение
-        connections.setdefault(token, {})[join.peerId] = ws
-        logger.info(f"Peer joined: token={token}, peer={join.peerId}, total_participants={room.participants}")
-        
-        # Отправляем информацию о комнате
+        # Отправляем информацию о комнате; resume — токен для продолжения сессии после обрыва
         try:
-            await ws.send_text(json.dumps({
+            room_info = {
                 "type": "room-info",
-                "peers": [p for p in room.peers.keys() if p != join.peerId],
+                "peers": [p for p in room.peers.keys() if p != join.peerId] + remote_peers,
                 "max": room.max_participants,
                 "timestamp": datetime.utcnow().isoformat()
-            }))
+            }
+            if ws.resume_token:
+                room_info["resume"] = ws.resume_token
+            await ws.send_message(room_info)
         except Exception as e:
-            logger.error(f"Failed to send room info: {e}")
+            logger.error("Failed to send room info: %s", e, extra={"token": token})
+        
+        # Доставляем сообщения, отправленные до подключения этого участника (в исходном порядке)
+        replayed: Dict[str, int] = {}
+        if mailbox is not None:
+            for letter in mailbox.take(token, join.peerId):
+                try:
+                    await ws.send_message(letter.message, droppable=letter.type == "candidate")
+                except Exception as e:
+                    logger.error("Failed to replay mailbox for %s/%s: %s", token, join.peerId, e, extra={"token": token, "peer": join.peerId})
+                    break
+                replayed[letter.type] = replayed.get(letter.type, 0) + 1
+            if replayed:
+                logger.info("Replayed mailbox to peer %s in room %s: %s", join.peerId, token, replayed,
+                            extra={"token": token, "peer": join.peerId})
         
-        # Уведомляем других участников
-        await broadcast(token, join.peerId, {
+        # Уведомляем других участников; replayed — что из их сообщений уже доставлено вошедшему
+        joined = {
             "type": "peer-joined", 
             "peerId": join.peerId,
             "timestamp": datetime.utcnow().isoformat()
-        })
+        }
+        if replayed:
+            joined["replayed"] = replayed
+        await broadcast(token, join.peerId, joined)
         
         return True
         
     except Exception as e:
-        logger.error(f"Join message handling failed: {e}")
+        logger.error("Join message handling failed: %s", e, extra={"token": token})
         await send_error(ws, "bad_join", f"Invalid join message: {str(e)}")
         return False
 
-async def handle_sdp_message(ws: WebSocket, token: str, peer_id: str, data: dict):
+async def handle_resume_message(conn: PeerConnection, token: str, data: dict) -> Optional[_Session]:
+    """Продолжение сессии на новом сокете: повтор пропущенных кадров, без peer-left/peer-joined"""
+    try:
+        resume = ResumeMessage(**data)
+    except Exception as e:
+        await send_error(conn, "bad_resume", f"Invalid resume message: {str(e)}")
+        return None
+    
+    session = sessions.get(resume.resume)
+    if (session is None or session.token != token or session.peer_id != resume.peerId
+            or session.conn.binary != conn.binary):
+        await send_error(conn, "resume_failed", "Session expired or unknown")
+        return None
+    
+    old_ws = session.conn.ws
+    if not await session.conn.attach(conn.ws, resume.lastSeq, deflate=conn.deflate):
+        await send_error(conn, "resume_failed", "Missed messages are no longer available")
+        return None
+    if session.expiry is not None:
+        session.expiry.cancel()
+        session.expiry = None
+    if old_ws is not None and old_ws is not conn.ws:
+        # Сервер ещё не заметил обрыв старого сокета — закрываем его сами
+        try:
+            await asyncio.wait_for(old_ws.close(code=4409, reason="Session resumed"), timeout=1.0)
+        except Exception as e:
+            logger.debug("Closing superseded socket failed: %s", e)
+    
+    await session.conn.send_message({
+        "type": "resumed",
+        "peerId": session.peer_id,
+        # Сколько кадров клиента сервер получил в этой сессии
+        "received": session.conn.received,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+    logger.info("Session resumed: token=%s, peer=%s, lastSeq=%d, seq=%d", token, session.peer_id, resume.lastSeq, session.conn.seq,
+                extra={"token": token, "peer": session.peer_id})
+    return session
+
+def validate_signal(model, data: dict):
+    """Проверка сигнального сообщения согласно SIGNAL_VALIDATION; возвращает (сообщение, payload)"""
+    if SIGNAL_VALIDATION == 'strict':
+        message = model(**data)
+        return message, message.model_dump()
+    # Дискриминатор по "type" сразу выбирает модель; sdp/candidate не копируются
+    return signal_message_adapter.validate_python(data), data
+
+async def relay_signal(token: str, model, data: dict, raw: Optional[Union[str, bytes]] = None):
+    """Валидация сигнального сообщения и пересылка остальным участникам комнаты (или только адресату "to")"""
+    message, payload = validate_signal(model, data)
+    if ice_coalescer is not None:
+        # Отложенные кандидаты пира уходят раньше его следующего сообщения
+        await ice_coalescer.flush_peer(token, message.peerId)
+    # Исходный кадр уходит получателям того же формата без перекодирования
+    original = raw if payload is data else None
+    await broadcast(token, message.peerId, payload,
+                    text=original if isinstance(original, str) else None,
+                    binary=original if isinstance(original, bytes) else None)
+    return message
+
+async def handle_sdp_message(ws: WebSocket, token: str, peer_id: str, data: dict, raw: Optional[Union[str, bytes]] = None):
     """Обработка SDP сообщений (offer/answer)"""
     try:
-        sdp = SDPMessage(**data)
-        await broadcast(token, sdp.peerId, sdp.model_dump())
-        logger.debug(f"SDP message forwarded: type={data.get('type')}, peer={sdp.peerId}")
+        sdp = await relay_signal(token, SDPMessage, data, raw)
+        logger.debug("SDP message forwarded: type=%s, peer=%s", sdp.type, sdp.peerId, extra={"token": token, "peer": sdp.peerId})
         return True
     except Exception as e:
-        logger.error(f"SDP message handling failed: {e}")
+        logger.error("SDP message handling failed: %s", e, extra={"token": token})
         await send_error(ws, "bad_sdp", f"Invalid SDP message: {str(e)}")
         return False
 
-async def handle_ice_message(ws: WebSocket, token: str, peer_id: str, data: dict):
+async def handle_ice_message(ws: WebSocket, token: str, peer_id: str, data: dict, raw: Optional[Union[str, bytes]] = None):
     """Обработка ICE кандидатов"""
     try:
-        ice = IceMessage(**data)
-        await broadcast(token, ice.peerId, ice.model_dump())
-        logger.debug(f"ICE candidate forwarded: peer={ice.peerId}")
+        if ice_coalescer is not None:
+            ice, payload = validate_signal(IceMessage, data)
+            await ice_coalescer.add(token, ice.peerId, payload["candidate"], ice.to)
+        else:
+            ice = await relay_signal(token, IceMessage, data, raw)
+        logger.debug("ICE candidate forwarded: peer=%s", ice.peerId, extra={"token": token, "peer": ice.peerId})
         return True
     except Exception as e:
-        logger.error(f"ICE message handling failed: {e}")
+        logger.error("ICE message handling failed: %s", e, extra={"token": token})
         await send_error(ws, "bad_candidate", f"Invalid ICE candidate: {str(e)}")
         return False
 
-async def handle_bye_message(ws: WebSocket, token: str, peer_id: str, data: dict):
+async def handle_bye_message(ws: WebSocket, token: str, peer_id: str, data: dict, raw: Optional[Union[str, bytes]] = None):
     """Обработка BYE сообщений"""
     try:
-        bye = ByeMessage(**data)
-        await broadcast(token, bye.peerId, bye.model_dump())
-        logger.info(f"Peer leaving: token={token}, peer={bye.peerId}")
+        bye = await relay_signal(token, ByeMessage, data, raw)
+        # Участник уходит сам — возобновлять нечего
+        _end_session(ws)
+        logger.info("Peer leaving: token=%s, peer=%s", token, bye.peerId, extra={"token": token, "peer": bye.peerId})
         return True
     except Exception as e:
-        logger.error(f"BYE message handling failed: {e}")
+        logger.error("BYE message handling failed: %s", e, extra={"token": token})
         await send_error(ws, "bad_bye", f"Invalid bye message: {str(e)}")
         return False
 
-async def handle_orientation_message(ws: WebSocket, token: str, peer_id: str, data: dict):
+async def handle_orientation_message(ws: WebSocket, token: str, peer_id: str, data: dict, raw: Optional[Union[str, bytes]] = None):
     """Обработка сообщений об ориентации"""
     try:
-        orient = OrientationMessage(**data)
-        await broadcast(token, orient.peerId, orient.model_dump())
-        logger.debug(f"Orientation message forwarded: peer={orient.peerId}, layout={orient.layout}")
+        orient = await relay_signal(token, OrientationMessage, data, raw)
+        logger.debug("Orientation message forwarded: peer=%s, layout=%s", orient.peerId, orient.layout,
+                     extra={"token": token, "peer": orient.peerId})
         return True
     except Exception as e:
-        logger.error(f"Orientation message handling failed: {e}")
+        logger.error("Orientation message handling failed: %s", e, extra={"token": token})
         await send_error(ws, "bad_orientation", f"Invalid orientation message: {str(e)}")
         return False
 
 @app.websocket("/ws/rooms/{token}")
 async def ws_room(ws: WebSocket, token: str):
     """WebSocket endpoint с улучшенной обработкой ошибок и retry логикой"""
-    await ws.accept()
+    # Клиент может запросить бинарный подпротокол (MessagePack); по умолчанию — текстовый JSON
+    subprotocol = select_subprotocol(ws.scope.get("subprotocols", []),
+                                     allow_deflate=WS_SDP_DICTIONARY and not _transport_deflate(ws))
+    await ws.accept(subprotocol=subprotocol)
+    binary, compressed = subprotocol_options(subprotocol)
+    # Все исходящие сообщения идут через очередь и отдельную задачу-писателя
+    conn = PeerConnection(ws, WS_SEND_QUEUE_SIZE, WS_SEND_QUEUE_POLICY,
+                          on_failure=lambda c: _forget_connection(token, c),
+                          binary=binary,
+                          deflate=DeflateContext(WS_DEFLATE_LEVEL) if compressed else None)
     
-    room = await store.get_room(token)
-    now = time.time()
-    if (not room) or (now >= room.expires_at and room.participants == 0):
-        # Автоматическое создание/воссоздание комнаты
-        room = await store.create_room_with_token(token, MAX_PARTICIPANTS_DEFAULT)
-        logger.info(f"Auto-created room for WebSocket: {token}")
+    if drainer.draining:
+        # Инстанс останавливается: отправляем клиента на соседний
+        await conn.send_message(_reconnect_hint())
+        await conn.close(DRAIN_CLOSE_CODE, "Server draining")
+        return
+    
+    await _room_or_create(token)
 
     peer_id: Optional[str] = None
     retry_count = 0
+    close_code: Optional[int] = None
+    # Бюджеты offer/answer/candidate растут с числом участников mesh, но вместимости комнаты
+    # верим только после входа: до него — бюджеты комнаты на двоих
+    limits = rate_limiter.for_connection()
+    # Об ограничении сообщаем один раз, пока клиент не вернётся в лимит
+    rate_limited = False
+    finished = False
+
+    async def finish(code: Optional[int]):
+        """Конец сокета (один раз): resume на новом сокете, detach в ожидании resume или выход из комнаты"""
+        nonlocal finished
+        if finished:
+            return
+        finished = True
+        if watch is not None:
+            heartbeat.unwatch(watch)
+        if conn.ws is not None and conn.ws is not ws:
+            # Сессию подхватил новый сокет (resume) — освобождать нечего
+            logger.info("Session of %s/%s continues on a new socket", token, peer_id, extra={"token": token, "peer": peer_id})
+        elif peer_id:
+            current = connections.get(token, {}).get(peer_id)
+            if current is not None and current is not conn:
+                # Участник уже вошёл заново с другого соединения
+                logger.info("Peer %s in room %s superseded by a newer connection", peer_id, token,
+                            extra={"token": token, "peer": peer_id})
+                _end_session(conn)
+                await conn.close()
+            elif (current is conn and conn.resume_token in sessions
+                  and code is not None and code not in RESUME_FINAL_CLOSE_CODES):
+                # Обрыв связи: ждём resume, исходящие сообщения копятся в очереди соединения
+                conn.detach(ws)
+                _schedule_session_expiry(sessions[conn.resume_token])
+                logger.info("Peer detached: token=%s, peer=%s, resume window %ss", token, peer_id, RESUME_WINDOW_SECONDS,
+                            extra={"token": token, "peer": peer_id})
+            else:
+                await release_peer(token, peer_id, conn)
+                await conn.close()
+        else:
+            await conn.close()
+
+    async def close_dead_socket():
+        # receive() мёртвого сокета вернётся только по таймауту закрытия — завершаем сессию сразу, как при обрыве
+        logger.warning("Heartbeat timeout: token=%s, peer=%s", token, peer_id, extra={"token": token, "peer": peer_id})
+        heartbeat_timeouts.inc()
+        await finish(HEARTBEAT_CLOSE_CODE)
+        try:
+            await ws.close(code=HEARTBEAT_CLOSE_CODE, reason="heartbeat timeout")
+        except Exception as e:
+            logger.debug("Closing dead socket failed: %s", e)
+
+    def on_dead():
+        task = asyncio.get_running_loop().create_task(close_dead_socket())
+        _heartbeat_tasks.add(task)
+        task.add_done_callback(_heartbeat_tasks.discard)
+
+    # Пинг уходит через текущее соединение: после resume это conn прежней сессии
+    watch = heartbeat.watch(lambda: conn.send_nowait(PING_MESSAGE), on_dead) if heartbeat is not None else None
     
     async with websocket_connection_manager(ws, token, peer_id):
         try:
             while True:
                 try:
-                    raw = await ws.receive_text()
-                    data = json.loads(raw)
+                    message = await ws.receive()
+                    received_at = time.perf_counter()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    if finished:
+                        # Сокет уже признан мёртвым (heartbeat)
+                        break
+                    if watch is not None:
+                        watch.seen()
+                    # Текстовый кадр — JSON, бинарный — MessagePack или сжатый кадр (*+zdict1)
+                    data, raw = _decode_frame(conn, message)
+                    
+                    # Лимит сообщений: до любой обработки, включая resume и join
+                    if rate_limiter.enabled:
+                        msg_type = data.get("type")
+                        if not isinstance(msg_type, str):
+                            msg_type = "*"
+                        wait = rate_limiter.check(limits, token, msg_type)
+                        if wait is None:
+                            messages_total.inc(msg_type if msg_type in MESSAGE_TYPES else "other", "limited")
+                            if rate_limiter.policy is RateLimitPolicy.close:
+                                logger.warning("Rate limit exceeded by %s/%s (%s), closing connection", token, peer_id, msg_type,
+                                               extra={"token": token, "peer": peer_id})
+                                await conn.close(RATE_LIMIT_CLOSE_CODE, "rate limit exceeded")
+                                break
+                            if not rate_limited:
+                                rate_limited = True
+                                await send_error(conn, "rate_limited", f"Too many {msg_type} messages, some are dropped")
+                            continue
+                        rate_limited = False
+                        if wait:
+                            await asyncio.sleep(wait)
+                    
+                    # Ответ на heartbeat: активность уже отмечена
+                    if data.get("type") == "pong":
+                        continue
+                    
+                    # Переподключение: продолжаем прежнюю сессию вместо нового join
+                    if data.get("type") == "resume" and not peer_id:
+                        session = await handle_resume_message(conn, token, data)
+                        messages_total.inc("resume", "ok" if session is not None else "error")
+                        if session is not None:
+                            conn.abandon()
+                            conn = session.conn
+                            peer_id = session.peer_id
+                            await _admit_limits(limits, token)
+                        continue
+                    conn.received += 1
                     
                     # Обрабатываем сообщение
-                    success = await handle_websocket_message(ws, token, peer_id, data)
+                    received = _frame_received_at.set(received_at)
+                    try:
+                        success = await handle_websocket_message(conn, token, peer_id, data, raw)
+                    finally:
+                        _frame_received_at.reset(received)
                     
                     # Фиксируем peer_id при успешном join
                     if success and data.get("type") == "join" and not peer_id:
                         peer_id = data.get("peerId")
+                        await _admit_limits(limits, token)
                     
                     if not success:
                         retry_count += 1
                         if retry_count >= WS_RETRY_ATTEMPTS:
-                            logger.error(f"Too many failed messages for {token}/{peer_id}, closing connection")
+                            logger.error("Too many failed messages for %s/%s, closing connection", token, peer_id,
+                                         extra={"token": token, "peer": peer_id})
                             break
                         continue
                     
@@ -421,128 +1178,213 @@ async def ws_room(ws: WebSocket, token: str):
                     retry_count = 0
                     
                 except json.JSONDecodeError as e:
-                    logger.warning(f"Invalid JSON from {token}/{peer_id}: {e}")
-                    await send_error(ws, "bad_json", "Invalid JSON format")
+                    logger.warning("Invalid JSON from %s/%s: %s", token, peer_id, e, extra={"token": token, "peer": peer_id})
+                    await send_error(conn, "bad_json", "Invalid JSON format")
                     retry_count += 1
                     if retry_count >= WS_RETRY_ATTEMPTS:
                         break
                     continue
                     
-                except WebSocketDisconnect:
-                    logger.info(f"WebSocket disconnect: token={token}, peer={peer_id}")
+                except BinaryDecodeError as e:
+                    logger.warning("Invalid binary frame from %s/%s: %s", token, peer_id, e, extra={"token": token, "peer": peer_id})
+                    await send_error(conn, "bad_frame", "Invalid binary frame")
+                    retry_count += 1
+                    if retry_count >= WS_RETRY_ATTEMPTS:
+                        break
+                    continue
+                    
+                except WebSocketDisconnect as e:
+                    close_code = e.code
+                    logger.info("WebSocket disconnect: token=%s, peer=%s, code=%s", token, peer_id, close_code,
+                                extra={"token": token, "peer": peer_id})
                     break
                     
                 except Exception as e:
-                    logger.error(f"Unexpected error in WebSocket loop: {e}")
+                    logger.error("Unexpected error in WebSocket loop: %s", e, extra={"token": token})
                     retry_count += 1
                     if retry_count >= WS_RETRY_ATTEMPTS:
                         break
                     await asyncio.sleep(min(WS_RETRY_DELAY * (2 ** retry_count), WS_MAX_RETRY_DELAY))
                     
         except Exception as e:
-            logger.error(f"Critical WebSocket error: {e}")
+            logger.error("Critical WebSocket error: %s", e, extra={"token": token})
         finally:
-            # Очистка при отключении
-            if peer_id:
-                try:
-                    room = await store.get_room(token)
-                    if room:
-                        room.leave(peer_id)
-                    
-                    if token in connections and peer_id in connections[token]:
-                        del connections[token][peer_id]
-                    
-                    await broadcast(token, peer_id, {
-                        "type": "peer-left", 
-                        "peerId": peer_id,
-                        "timestamp": datetime.utcnow().isoformat()
-                    })
-                    
-                    logger.info(f"Peer cleanup completed: token={token}, peer={peer_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error during peer cleanup: {e}")
+            await finish(close_code)
+
+async def _admit_limits(limits: BucketSet, token: str) -> None:
+    """Бюджеты по вместимости комнаты, в которую участник уже принят (claim прошёл)"""
+    if not rate_limiter.enabled:
+        return
+    room = await store.get_room(token)
+    if room is not None:
+        rate_limiter.admit(limits, token, room.max_participants)
 
-async def broadcast(token: str, from_peer: str, payload: dict):
-    """Улучшенная функция broadcast с обработкой ошибок"""
+async def release_peer(token: str, peer_id: str, conn: PeerConnection, reason: str = "left"):
+    """Окончательный выход участника: комната, маршрутизация, backplane и peer-left остальным"""
+    try:
+        room = await store.get_room(token)
+        if room:
+            async with room.lock:
+                room.leave(peer_id)
+        admin_feed.publish("leave", token=token, peerId=peer_id, reason=reason,
+                           participants=room.participants if room else 0)
+        
+        if connections.get(token, {}).get(peer_id) is conn:
+            del connections[token][peer_id]
+        _end_session(conn)
+        if ice_coalescer is not None:
+            ice_coalescer.discard_peer(token, peer_id)
+        if mailbox is not None:
+            mailbox.discard_peer(token, peer_id)
+        await backplane.release(token, peer_id)
+        
+        await broadcast(token, peer_id, {
+            "type": "peer-left", 
+            "peerId": peer_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+        logger.info("Peer cleanup completed: token=%s, peer=%s", token, peer_id, extra={"token": token, "peer": peer_id})
+        
+    except Exception as e:
+        logger.error("Error during peer cleanup: %s", e, extra={"token": token})
+
+async def broadcast(token: str, from_peer: str, payload: dict, text: Optional[str] = None,
+                    binary: Optional[bytes] = None):
+    """Рассылка участникам комнаты на этом и на остальных воркерах.
+    text/binary — уже сериализованный payload (например, исходный кадр клиента)
+    """
+    delivered = await broadcast_local(token, from_peer, payload, text, binary)
+    received_at = _frame_received_at.get()
+    if received_at is not None and delivered and payload.get("type") in RELAYED_TYPES:
+        # Время до постановки в очередь, не до отправки в сокет
+        relay_enqueue.observe(time.perf_counter() - received_at, payload["type"])
+    if not delivered and mailbox is not None and not backplane.is_remote(token, payload.get("to")):
+        # Получателей нет ни здесь, ни на других воркерах — сохраняем для следующего вошедшего.
+        # Получатель на другом воркере получит сообщение через backplane сразу, повтор из ящика был бы устаревшим
+        mailbox.put(token, from_peer, EncodedMessage(payload, text, binary))
+    if delivered and payload.get("to") is not None:
+        # Адресат на этом воркере — другим воркерам сообщение не нужно
+        return
+    try:
+        await backplane.publish(token, from_peer, payload)
+    except Exception as e:
+        send_failures.inc("backplane")
+        logger.warning("Failed to publish message for room %s to backplane: %s", token, e, extra={"token": token})
+
+async def broadcast_local(token: str, from_peer: str, payload: dict, text: Optional[str] = None,
+                          binary: Optional[bytes] = None):
+    """Рассылка локальным соединениям комнаты: только постановка в очереди, без ожидания сокетов.
+    Сообщение с полем "to" уходит только этому участнику (mesh-комнаты): O(1) вместо O(N).
+    Возвращает число получателей, которым сообщение поставлено в очередь
+    """
     peers = connections.get(token, {})
     failed_peers = []
+    to = payload.get("to")
+    if to is not None:
+        conn = peers.get(to)
+        if conn is None or to == from_peer:
+            return 0
+        recipients = ((to, conn),)
+    elif not peers or (len(peers) == 1 and from_peer in peers):
+        return 0
+    else:
+        recipients = list(peers.items())
+    delivered = 0
+    started = time.perf_counter()
+    # Кандидаты ICE можно отбросить при переполнении очереди получателя
+    droppable = payload.get("type") == "candidate"
+    # Сериализуем один раз на формат (JSON / MessagePack), а не на каждого получателя
+    message = EncodedMessage(payload, text, binary)
+    # Уровень проверяем один раз, а не на каждого получателя
+    debug = logger.isEnabledFor(logging.DEBUG)
     
-    for pid, socket in list(peers.items()):
+    for pid, conn in recipients:
         if pid == from_peer:
             continue
         
         try:
-            await socket.send_text(json.dumps(payload))
-            logger.debug(f"Message sent to peer {pid} in room {token}")
+            await conn.send_message(message, droppable=droppable)
+            delivered += 1
+            if debug:
+                logger.debug("Message queued for peer %s in room %s", pid, token, extra={"token": token, "peer": pid})
+        except EncodeError as e:
+            # Ошибка в самом сообщении, а не у получателя: соединение не трогаем
+            logger.error("Failed to encode message from %s in room %s: %s", from_peer, token, e, extra={"token": token, "peer": from_peer})
+            send_failures.inc("encode")
         except Exception as e:
-            logger.warning(f"Failed to send message to peer {pid} in room {token}: {e}")
+            logger.warning("Failed to send message to peer %s in room %s: %s", pid, token, e, extra={"token": token, "peer": pid})
+            send_failures.inc("enqueue")
             failed_peers.append(pid)
+    fanout_duration.observe(time.perf_counter() - started)
     
     # Удаляем неработающие соединения
     for pid in failed_peers:
-        try:
-            peers[pid].close()
-        except Exception:
-            pass
-        del peers[pid]
-        logger.info(f"Removed failed peer {pid} from room {token}")
+        conn = peers.pop(pid, None)
+        if conn is not None:
+            await conn.close()
+            logger.info("Removed failed peer %s from room %s", pid, token, extra={"token": token, "peer": pid})
+    return delivered
 
 # --- Admin endpoints с улучшенной диагностикой ---
-@app.get("/api/admin/connections")
-async def admin_connections():
-    """Улучшенный endpoint для мониторинга соединений"""
-    try:
-        rooms = []
-        # Снимок текущих соединений
-        for token, peers_map in list(connections.items()):
-            try:
-                room = await store.get_room(token)
-            except Exception as e:
-                logger.error(f"Failed to get room {token}: {e}")
-                room = None
-            
-            peers_list = []
-            if room is not None:
-                for pid in list(peers_map.keys()):
+async def _admin_snapshot() -> dict:
+    """Снимок всех локальных комнат и соединений"""
+    rooms = []
+    for token, peers_map in list(connections.items()):
+        try:
+            room = await store.get_room(token)
+        except Exception as e:
+            logger.error(f"Failed to get room {token}: {e}")
+            room = None
+        
+        peers_list = []
+        if room is not None:
+            for pid in list(peers_map.keys()):
+                connected_at = None
+                try:
+                    if pid in room.peers:
+                        connected_at = room.peers[pid].connected_at
+                except Exception:
                     connected_at = None
-                    try:
-                        if pid in room.peers:
-                            connected_at = room.peers[pid].connected_at
-                    except Exception:
-                        connected_at = None
-                    
-                    peers_list.append({
-                        "peerId": pid,
-                        "connectedAt": connected_at,
-                        "connectionDuration": time.time() - connected_at if connected_at else None
-                    })
                 
-                participants = room.participants
-                maxp = room.max_participants
-                status = "active" if participants > 0 else "waiting"
-            else:
-                for pid in list(peers_map.keys()):
-                    peers_list.append({"peerId": pid, "connectedAt": None, "connectionDuration": None})
-                participants = len(peers_map)
-                maxp = None
-                status = "unknown"
+                peers_list.append({
+                    "peerId": pid,
+                    "connectedAt": connected_at,
+                    "connectionDuration": time.time() - connected_at if connected_at else None
+                })
             
-            rooms.append({
-                "token": token,
-                "participants": participants,
-                "maxParticipants": maxp,
-                "status": status,
-                "peers": peers_list,
-                "lastUpdated": datetime.utcnow().isoformat()
-            })
+            # Вместе с участниками на других воркерах
+            participants = backplane.participants(token, room.participants)
+            maxp = room.max_participants
+            status = "active" if participants > 0 else "waiting"
+        else:
+            for pid in list(peers_map.keys()):
+                peers_list.append({"peerId": pid, "connectedAt": None, "connectionDuration": None})
+            participants = len(peers_map)
+            maxp = None
+            status = "unknown"
         
-        return {
-            "rooms": rooms,
-            "total_rooms": len(rooms),
-            "total_peers": sum(len(room["peers"]) for room in rooms),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        rooms.append({
+            "token": token,
+            "participants": participants,
+            "maxParticipants": maxp,
+            "status": status,
+            "peers": peers_list,
+            "lastUpdated": datetime.utcnow().isoformat()
+        })
+    
+    return {
+        "rooms": rooms,
+        "total_rooms": len(rooms),
+        "total_peers": sum(len(room["peers"]) for room in rooms),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/api/admin/connections")
+async def admin_connections():
+    """Улучшенный endpoint для мониторинга соединений"""
+    try:
+        return await _admin_snapshot()
         
     except Exception as e:
         logger.error(f"Admin connections endpoint failed: {e}")
@@ -551,6 +1393,30 @@ async def admin_connections():
             detail=f"Failed to get connections info: {str(e)}"
         )
 
+@app.get("/api/admin/events")
+async def admin_events():
+    """Поток событий для админ-панели (text/event-stream): snapshot, затем join/leave/kick/expire"""
+    return StreamingResponse(
+        admin_feed.stream(_admin_snapshot),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # nginx не должен буферизовать поток
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.get("/api/admin/drain")
+async def admin_drain_status():
+    """Состояние drain: serving | draining | drained, сколько соединений закрыто и осталось"""
+    return drainer.stats()
+
+@app.post("/api/admin/drain", status_code=status.HTTP_202_ACCEPTED)
+async def admin_drain_start():
+    """Перевод инстанса в drain перед остановкой или rolling deploy; прогресс — GET /api/admin/drain"""
+    _start_drain("admin")
+    return drainer.stats()
+
 @app.delete("/api/admin/connections/{token}/{peer_id}")
 async def admin_disconnect(token: str, peer_id: str):
     """Принудительное отключение участника администратором"""
@@ -561,15 +1427,17 @@ async def admin_disconnect(token: str, peer_id: str):
         
         # Информируем клиента и закрываем соединение
         try:
-            await ws.send_text(json.dumps({
+            await ws.send_message({
                 "type": "error",
                 "code": "kicked",
                 "message": "Disconnected by admin",
                 "timestamp": datetime.utcnow().isoformat()
-            }))
+            })
         except Exception as e:
             logger.warning(f"Failed to send kick message: {e}")
         
+        # Сессию завершаем до закрытия: отключённый админом участник не должен ждать resume
+        _end_session(ws)
         await ws.close(code=4401)
         
         # Очистка
@@ -578,7 +1446,13 @@ async def admin_disconnect(token: str, peer_id: str):
         
         room = await store.get_room(token)
         if room:
-            room.leave(peer_id)
+            async with room.lock:
+                room.leave(peer_id)
+        if mailbox is not None:
+            mailbox.discard_peer(token, peer_id)
+        await backplane.release(token, peer_id)
+        admin_feed.publish("kick", token=token, peerId=peer_id,
+                           participants=room.participants if room else 0)
         
         logger.info(f"Admin disconnected peer {peer_id} from room {token}")
         
@@ -597,30 +1471,11 @@ async def admin_disconnect(token: str, peer_id: str):
 PREVIEW_MAX_BYTES = int(os.getenv('PREVIEW_MAX_BYTES', '300000'))
 PREVIEW_TTL_SECONDS = int(os.getenv('PREVIEW_TTL_SECONDS', '120'))
 
-# Структура: previews[token][peer_id] = { 'bytes': bytes, 'type': str, 'ts': float }
-previews: Dict[str, Dict[str, dict]] = {}
-
-def _cleanup_previews():
-    """Очистка устаревших превью"""
-    now = time.time()
-    cleaned_count = 0
-    
-    for token, peers in list(previews.items()):
-        for pid, meta in list(peers.items()):
-            try:
-                ts = float(meta.get('ts', 0))
-            except Exception:
-                ts = 0
-            
-            if now - ts > PREVIEW_TTL_SECONDS:
-                del peers[pid]
-                cleaned_count += 1
-        
-        if not peers:
-            del previews[token]
-    
-    if cleaned_count > 0:
-        logger.debug(f"Cleaned up {cleaned_count} expired previews")
+# Последнее превью каждого участника; общий бюджет памяти, вытеснение самых давно обновлённых
+preview_cache = PreviewCache(
+    max_bytes=int(os.getenv('PREVIEW_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl_seconds=PREVIEW_TTL_SECONDS,
+)
 
 @app.post("/api/admin/preview/{token}/{peer_id}")
 async def admin_upload_preview(token: str, peer_id: str, request: Request):
@@ -646,23 +1501,14 @@ async def admin_upload_preview(token: str, peer_id: str, request: Request):
                 detail=f"Preview too large (max {PREVIEW_MAX_BYTES} bytes)"
             )
         
-        _cleanup_previews()
+        preview = preview_cache.put(token, peer_id, body, "image/jpeg" if "jpeg" in ctype else "image/png")
         
-        if token not in previews:
-            previews[token] = {}
-        
-        previews[token][peer_id] = {
-            "bytes": body, 
-            "type": ("image/jpeg" if "jpeg" in ctype else "image/png"), 
-            "ts": time.time(),
-            "size": len(body)
-        }
-        
-        logger.debug(f"Preview uploaded: token={token}, peer={peer_id}, size={len(body)} bytes")
+        logger.debug("Preview uploaded: token=%s, peer=%s, size=%s bytes", token, peer_id, len(body))
         
         return JSONResponse({
             "ok": True, 
             "size": len(body),
+            "etag": preview.etag,
             "timestamp": datetime.utcnow().isoformat()
         })
         
@@ -675,29 +1521,44 @@ async def admin_upload_preview(token: str, peer_id: str, request: Request):
             detail=f"Failed to upload preview: {str(e)}"
         )
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match: список ETag через запятую, слабые W/ сравниваются как сильные, * совпадает с любым"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag or candidate == "*":
+            return True
+    return False
+
+# Превью можно хранить в кэше браузера, но перед показом всегда перепроверять по ETag
+PREVIEW_CACHE_HEADERS = {"Cache-Control": "no-cache"}
+
 @app.get("/api/admin/preview/{token}/{peer_id}")
-async def admin_get_preview(token: str, peer_id: str):
-    """Получение превью с улучшенной обработкой ошибок"""
+async def admin_get_preview(token: str, peer_id: str, request: Request):
+    """Получение превью; If-None-Match с ETag текущего кадра → 304 без тела"""
     try:
-        _cleanup_previews()
-        meta = previews.get(token, {}).get(peer_id)
+        preview = preview_cache.get(token, peer_id)
         
-        if not meta:
+        if not preview:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, 
                 detail="Preview not found or expired"
             )
         
-        logger.debug(f"Preview retrieved: token={token}, peer={peer_id}")
+        headers = {**PREVIEW_CACHE_HEADERS, "ETag": preview.etag}
+        if _etag_matches(request, preview.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        logger.debug("Preview retrieved: token=%s, peer=%s", token, peer_id)
         
         return Response(
-            content=meta["bytes"], 
-            media_type=meta["type"],
-            headers={
-                "Cache-Control": "no-cache, no-store, must-revalidate",
-                "Pragma": "no-cache",
-                "Expires": "0"
-            }
+            content=preview.data, 
+            media_type=preview.media_type,
+            headers=headers
         )
         
     except HTTPException:
@@ -709,6 +1570,71 @@ async def admin_get_preview(token: str, peer_id: str):
             detail=f"Failed to retrieve preview: {str(e)}"
         )
 
+PREVIEW_BATCH_MAX_ROOMS = 200
+
+@app.get("/api/admin/previews")
+async def admin_get_previews(
+    request: Request,
+    token: Optional[List[str]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=PREVIEW_BATCH_MAX_ROOMS),
+    since: int = Query(0, ge=0),
+):
+    """Все актуальные превью комнат (token=... или страница offset/limit) одним ответом multipart/mixed.
+
+    Каждая часть — одно изображение с заголовками Content-Type, Content-Length, ETag и
+    Content-Location (URL одиночного превью). С since=<X-Preview-Version прошлого ответа>
+    приходят только кадры, изменившиеся после него. ETag ответа — версия кэша: пока превью
+    не менялись, If-None-Match даёт 304.
+    """
+    try:
+        # Истечение TTL тоже меняет версию: применяем его до сравнения ETag
+        preview_cache.expire()
+        etag = f'"v{preview_cache.version}"'
+        headers = {
+            **PREVIEW_CACHE_HEADERS,
+            "ETag": etag,
+            "X-Preview-Version": str(preview_cache.version),
+            "X-Total-Rooms": str(preview_cache.room_count),
+        }
+        if _etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        tokens = token[:PREVIEW_BATCH_MAX_ROOMS] if token else preview_cache.tokens(offset, limit)
+        boundary = secrets.token_hex(16)
+        delimiter = f"--{boundary}\r\n".encode("ascii")
+        chunks = []
+        count = 0
+        for room_token in tokens:
+            for peer_id, preview in preview_cache.room(room_token, since):
+                location = f"/api/admin/preview/{quote(room_token, safe='')}/{quote(peer_id, safe='')}"
+                chunks.append(delimiter)
+                chunks.append((
+                    f"Content-Type: {preview.media_type}\r\n"
+                    f"Content-Length: {preview.size}\r\n"
+                    f"ETag: {preview.etag}\r\n"
+                    f"Content-Location: {location}\r\n\r\n"
+                ).encode("ascii"))
+                chunks.append(preview.data)
+                chunks.append(b"\r\n")
+                count += 1
+        chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+        
+        logger.debug("Preview batch: rooms=%s, parts=%s, since=%s", len(tokens), count, since)
+        
+        return Response(
+            content=b"".join(chunks),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers=headers
+        )
+        
+    except Exception as e:
+        logger.error(f"Preview batch retrieval failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve previews: {str(e)}"
+        )
+
 # Запуск сервера с улучшенной конфигурацией
 if __name__ == "__main__":
     uvicorn.run(
@@ -719,5 +1645,7 @@ if __name__ == "__main__":
         log_level="info",
         access_log=True,
         timeout_keep_alive=30,
+        # Стандартный permessage-deflate (без словаря) для клиентов, которые его предлагают
+        ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE,
         timeout_graceful_shutdown=30
     )
\ No newline at end of file
@@ -0,0 +1,158 @@
+"""Prometheus metrics for the signaling server, without a client library.
+
+Only what the hot path needs, built to stay on at full load:
+
+* Counter.inc() and Histogram.observe() are a dict lookup on a label tuple
+  plus an addition (and a bisect over ~15 bounds for histograms); no locks,
+  since everything runs on the event loop thread;
+* label values must come from small fixed sets (message types, reasons) -
+  never tokens or peer ids;
+* gauges are callbacks evaluated only when /metrics is scraped, so live
+  room/peer counts cost nothing between scrapes.
+
+render() produces the text exposition format (version 0.0.4).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 50 µs .. 2.5 s: relaying is normally sub-millisecond, a stalled loop is not
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_Labels = Tuple[str, ...]
+GaugeValue = Union[float, Dict[_Labels, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: _Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def collect(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[_Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, buckets: int):
+        # One slot per bucket plus +Inf; cumulated only when rendered
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[_Labels, _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets))
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def collect(self) -> Iterable[str]:
+        bounds = ['le="' + _number(bound) + '"' for bound in self.buckets] + ['le="+Inf"']
+        for labels, series in self._series.items():
+            cumulative = 0
+            for le, count in zip(bounds, series.counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            suffix = _labels(self.labelnames, labels)
+            yield f"{self.name}_sum{suffix} {_number(series.sum)}"
+            yield f"{self.name}_count{suffix} {cumulative}"
+
+
+class Gauge(_Metric):
+    """Value read from `fn` at scrape time: a number, or {label tuple: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._fn = fn
+
+    def collect(self) -> Iterable[str]:
+        value = self._fn()
+        if isinstance(value, dict):
+            for labels, number in value.items():
+                yield f"{self.name}{_labels(self.labelnames, labels)} {_number(number)}"
+        else:
+            yield f"{self.name} {_number(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], GaugeValue], labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
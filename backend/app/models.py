@@ -1,9 +1,9 @@
 from __future__ import annotations
 
 from enum import Enum
-from typing import Any, Literal, Optional
+from typing import Annotated, Any, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class Role(str, Enum):
@@ -17,10 +17,16 @@ class JoinMessage(BaseModel):
     role: Role
 
 
+# Optional recipient of a signaling message: with it the server relays the
+# message to that one peer of the room instead of all of them (N-party mesh)
+PeerTarget = Optional[Annotated[str, Field(min_length=1, max_length=128)]]
+
+
 class SDPMessage(BaseModel):
     type: Literal["offer", "answer"]
     peerId: str
     sdp: Any
+    to: PeerTarget = None
 
 
 class IceCandidate(BaseModel):
@@ -33,20 +39,38 @@ class IceMessage(BaseModel):
     type: Literal["candidate"] = "candidate"
     peerId: str
     candidate: IceCandidate
+    to: PeerTarget = None
 
 
 class ByeMessage(BaseModel):
     type: Literal["bye"] = "bye"
     peerId: str
+    to: PeerTarget = None
 
 
 class OrientationMessage(BaseModel):
     type: Literal["orientation"] = "orientation"
     peerId: str
     layout: Literal["portrait", "landscape"]
+    to: PeerTarget = None
+
+
+class ResumeMessage(BaseModel):
+    """Reattach to a session after a reconnect instead of joining again."""
+    type: Literal["resume"] = "resume"
+    peerId: str = Field(..., min_length=1, max_length=128)
+    resume: str = Field(..., min_length=1, max_length=128)
+    # Number of server frames the client received since its join
+    lastSeq: int = Field(..., ge=0)
+
 
+SignalMessage = Annotated[
+    Union[JoinMessage, SDPMessage, IceMessage, ByeMessage, OrientationMessage],
+    Field(discriminator="type"),
+]
 
-SignalMessage = JoinMessage | SDPMessage | IceMessage | ByeMessage | OrientationMessage
+# Built once: validation dispatches on "type" straight to the matching model
+signal_message_adapter: TypeAdapter[SignalMessage] = TypeAdapter(SignalMessage)
 
 
 class CreateRoomResponse(BaseModel):
@@ -55,6 +79,27 @@ class CreateRoomResponse(BaseModel):
     ttlSeconds: int
 
 
+# Bulk provisioning (POST /api/rooms/bulk)
+ROOM_TOKEN_PATTERN = r"^[A-Za-z0-9_-]{8,64}$"
+ROOM_TTL_SECONDS_MAX = 30 * 24 * 3600
+ROOM_MAX_PARTICIPANTS_LIMIT = 16
+
+
+class BulkRoomSpec(BaseModel):
+    """One room; unset fields fall back to the batch defaults."""
+    token: Optional[str] = Field(None, pattern=ROOM_TOKEN_PATTERN)
+    ttlSeconds: Optional[int] = Field(None, ge=60, le=ROOM_TTL_SECONDS_MAX)
+    maxParticipants: Optional[int] = Field(None, ge=1, le=ROOM_MAX_PARTICIPANTS_LIMIT)
+
+
+class BulkCreateRoomsRequest(BaseModel):
+    """`count` rooms with generated tokens plus the rooms listed in `rooms`."""
+    count: int = Field(0, ge=0)
+    rooms: List[BulkRoomSpec] = Field(default_factory=list)
+    ttlSeconds: Optional[int] = Field(None, ge=60, le=ROOM_TTL_SECONDS_MAX)
+    maxParticipants: Optional[int] = Field(None, ge=1, le=ROOM_MAX_PARTICIPANTS_LIMIT)
+
+
 class RoomInfo(BaseModel):
     token: str
     participants: int
@@ -0,0 +1,235 @@
+"""SQLite-backed RoomStore that survives restarts.
+
+The in-memory shards stay the source of truth for everything that is hot.
+SQLite (WAL mode) only keeps room metadata - token, created_at, expires_at,
+max_participants - so a restarted server still knows every generated link
+and its original TTL.
+
+* Writes are queued and committed in batches from a worker thread, so
+  create_room never waits for disk.
+* Startup does not load the table: a get_room miss falls through to a
+  primary-key lookup (in a worker thread) and caches the room in memory.
+  Warm restart is therefore O(1) in the number of stored rooms, and
+  len(store) counts cached rooms only.
+* Expired rows are deleted with one indexed DELETE per cleanup sweep.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .rooms import MAX_PARTICIPANTS_DEFAULT, Room, RoomSpec, RoomStore
+
+logger = logging.getLogger("webcall.persistence")
+
+FLUSH_INTERVAL_SECONDS_DEFAULT = 0.05
+FLUSH_BATCH_SIZE_DEFAULT = 5000
+# Tokens per "WHERE token IN (...)" lookup, under SQLite's host parameter limit
+LOAD_BATCH_SIZE = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rooms ("
+    " token TEXT PRIMARY KEY,"
+    " created_at REAL NOT NULL,"
+    " expires_at REAL NOT NULL,"
+    " max_participants INTEGER NOT NULL"
+    ") WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS rooms_expires_at ON rooms (expires_at)",
+)
+
+# Queued operations: ("put", token, created_at, expires_at, max_participants),
+# ("delete", token) and ("expire", now)
+_Op = Tuple
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # fsync on checkpoint only: a crash may lose the last flush interval,
+    # never corrupt the database
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteRoomStore(RoomStore):
+    def __init__(self, path: str, *args, flush_interval: float = FLUSH_INTERVAL_SECONDS_DEFAULT,
+                 flush_batch_size: int = FLUSH_BATCH_SIZE_DEFAULT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._path = path
+        self._writer = _connect(path)
+        for statement in _SCHEMA:
+            self._writer.execute(statement)
+        self._reader = _connect(path)
+        self._flush_interval = flush_interval
+        self._flush_batch_size = flush_batch_size
+        self._pending: List[_Op] = []
+        # Tokens deleted in memory but not yet in SQLite: a get_room miss must
+        # not resurrect them from disk
+        self._pending_deletes: Counter = Counter()
+        self._flush_wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Flushes started by a full batch, referenced until done
+        self._batch_flushes: Set[asyncio.Task] = set()
+
+    def start_cleanup(self) -> None:
+        super().start_cleanup()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._batch_flushes:
+            await asyncio.gather(*self._batch_flushes, return_exceptions=True)
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await super().close()
+        await self.flush()
+        self._reader.close()
+        self._writer.close()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(self._flush_interval)
+                if not self._pending:
+                    await self._flush_wakeup.wait()
+                    continue
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                # keep the queue; the next round retries
+                logger.error("Room store flush failed: %s", e)
+
+    def _enqueue(self, op: _Op) -> None:
+        self._pending.append(op)
+        if len(self._pending) == 1:
+            self._flush_wakeup.set()
+        if len(self._pending) == self._flush_batch_size:
+            # Full batch: don't wait for the flush interval
+            task = asyncio.get_running_loop().create_task(self.flush())
+            self._batch_flushes.add(task)
+            task.add_done_callback(self._batch_flush_done)
+
+    def _batch_flush_done(self, task: asyncio.Task) -> None:
+        self._batch_flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # The batch is back in the queue; the flush loop retries it
+            logger.error("Room store flush failed: %s", task.exception())
+
+    async def flush(self) -> int:
+        """Commit every queued write in a single transaction."""
+        async with self._flush_lock:
+            self._flush_wakeup.clear()
+            ops, self._pending = self._pending, []
+            if not ops:
+                return 0
+            try:
+                await asyncio.to_thread(self._apply, ops)
+            except Exception:
+                # put the batch back in front so ordering is preserved
+                self._pending[:0] = ops
+                raise
+            for op in ops:
+                if op[0] == "delete":
+                    self._pending_deletes[op[1]] -= 1
+                    if self._pending_deletes[op[1]] <= 0:
+                        del self._pending_deletes[op[1]]
+            return len(ops)
+
+    def _apply(self, ops: List[_Op]) -> None:
+        conn = self._writer
+        conn.execute("BEGIN")
+        try:
+            puts = []
+            for op in ops:
+                if op[0] == "put":
+                    puts.append(op[1:])
+                    continue
+                if puts:
+                    conn.executemany("INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?)", puts)
+                    puts = []
+                if op[0] == "delete":
+                    conn.execute("DELETE FROM rooms WHERE token = ?", (op[1],))
+                elif op[0] == "expire":
+                    conn.execute("DELETE FROM rooms WHERE expires_at <= ?", (op[1],))
+            if puts:
+                conn.executemany("INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?)", puts)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _persist(self, room: Room) -> Room:
+        self._pending_deletes.pop(room.token, None)
+        self._enqueue(("put", room.token, room.created_at, room.expires_at, room.max_participants))
+        return room
+
+    async def create_room(self, max_participants: int = MAX_PARTICIPANTS_DEFAULT,
+                          ttl_seconds: Optional[int] = None) -> Room:
+        return self._persist(await super().create_room(max_participants, ttl_seconds))
+
+    async def create_room_with_token(self, token: str, max_participants: int = MAX_PARTICIPANTS_DEFAULT,
+                                     ttl_seconds: Optional[int] = None) -> Room:
+        return self._persist(await super().create_room_with_token(token, max_participants, ttl_seconds))
+
+    async def create_rooms(self, specs: Sequence[RoomSpec]) -> List[Tuple[Room, bool]]:
+        # Rooms known only on disk must count as existing, so load the given tokens first
+        missing = {spec.token for spec in specs if spec.token and spec.token not in self._shard(spec.token).rooms}
+        if missing:
+            self._cache(await asyncio.to_thread(self._load, missing))
+        results = await super().create_rooms(specs)
+        for room, created in results:
+            if created:
+                self._persist(room)
+        return results
+
+    async def get_room(self, token: str) -> Optional[Room]:
+        room = await super().get_room(token)
+        if room is not None or token in self._pending_deletes:
+            return room
+        rows = await asyncio.to_thread(self._load, (token,))
+        self._cache(rows)
+        return self._shard(token).rooms.get(token)
+
+    def _load(self, tokens: Iterable[str]) -> Dict[str, Tuple[float, float, int]]:
+        """token -> (created_at, expires_at, max_participants) of the stored rooms; runs in a worker thread."""
+        tokens = list(tokens)
+        rows: Dict[str, Tuple[float, float, int]] = {}
+        for start in range(0, len(tokens), LOAD_BATCH_SIZE):
+            batch = tokens[start:start + LOAD_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            for token, created_at, expires_at, max_participants in self._reader.execute(
+                f"SELECT token, created_at, expires_at, max_participants FROM rooms WHERE token IN ({placeholders})",
+                batch,
+            ):
+                rows[token] = (created_at, expires_at, max_participants)
+        return rows
+
+    def _cache(self, rows: Dict[str, Tuple[float, float, int]]) -> None:
+        # The lookup awaited: a room created, cached or deleted meanwhile wins over the disk copy
+        for token, (created_at, expires_at, max_participants) in rows.items():
+            shard = self._shard(token)
+            if token in shard.rooms or token in self._pending_deletes:
+                continue
+            shard.put(Room(token=token, created_at=created_at, expires_at=expires_at,
+                           max_participants=max_participants))
+
+    async def delete_room(self, token: str) -> None:
+        await super().delete_room(token)
+        self._pending_deletes[token] += 1
+        self._enqueue(("delete", token))
+
+    async def cleanup(self) -> int:
+        removed = await super().cleanup()
+        self._enqueue(("expire", time.time()))
+        return removed
@@ -0,0 +1,158 @@
+"""Byte-budgeted cache for admin preview thumbnails.
+
+Each peer uploads a JPEG/PNG thumbnail about once per second and the admin
+dashboard polls them. PreviewCache keeps the latest image per (room, peer):
+
+* one OrderedDict ordered by upload time: an upload moves its key to the
+  end, so the head is always both the least recently updated and the first
+  to expire. TTL expiry and budget eviction are O(1) pops from the head,
+  and no request scans the whole cache;
+* reads do not reorder - a preview nobody refreshes is stale, however often
+  the dashboard looks at it;
+* the sum of stored image sizes never exceeds `max_bytes`;
+* every preview carries a content hash (`etag`) and the cache `version` at
+  which its content last changed. Re-uploading an identical frame (camera
+  off, static scene) only refreshes the timestamp, so conditional and
+  `since=` reads see nothing new;
+* a per-room index serves all previews of a room without a scan.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+PREVIEW_CACHE_MAX_BYTES_DEFAULT = 64 * 1024 * 1024
+PREVIEW_TTL_SECONDS_DEFAULT = 120.0
+
+_Key = Tuple[str, str]
+
+
+def content_etag(data: bytes) -> str:
+    """Strong ETag (quoted) derived from the image bytes."""
+    return '"' + hashlib.blake2b(data, digest_size=12).hexdigest() + '"'
+
+
+class Preview:
+    __slots__ = ("data", "media_type", "ts", "size", "etag", "version")
+
+    def __init__(self, data: bytes, media_type: str, ts: float, etag: str, version: int):
+        self.data = data
+        self.media_type = media_type
+        self.ts = ts
+        self.size = len(data)
+        self.etag = etag
+        self.version = version
+
+
+class PreviewCache:
+    def __init__(self, max_bytes: int = PREVIEW_CACHE_MAX_BYTES_DEFAULT,
+                 ttl_seconds: float = PREVIEW_TTL_SECONDS_DEFAULT):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bytes = 0
+        self._entries: "OrderedDict[_Key, Preview]" = OrderedDict()
+        self._rooms: Dict[str, Dict[str, Preview]] = {}
+        # Bumped by every change a reader can observe: new content, expiry, eviction
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, token: str, peer_id: str, data: bytes, media_type: str) -> Preview:
+        now = time.time()
+        key = (token, peer_id)
+        etag = content_etag(data)
+        old = self._entries.pop(key, None)
+        if old is not None and old.etag == etag and old.media_type == media_type:
+            # Same frame again: keep the stored copy and its version
+            old.ts = now
+            self._entries[key] = old
+            self.duplicates += 1
+            self.expire(now)
+            return old
+        if old is not None:
+            self.bytes -= old.size
+        self.version += 1
+        preview = self._entries[key] = Preview(data, media_type, now, etag, self.version)
+        self._rooms.setdefault(token, {})[peer_id] = preview
+        self.bytes += preview.size
+        self.expire(now)
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            self._pop_oldest()
+            self.evictions += 1
+        return preview
+
+    def get(self, token: str, peer_id: str) -> Optional[Preview]:
+        preview = self._entries.get((token, peer_id))
+        if preview is not None and time.time() - preview.ts > self.ttl_seconds:
+            self.expire()
+            preview = None
+        if preview is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return preview
+
+    def room(self, token: str, since: int = 0) -> List[Tuple[str, Preview]]:
+        """Live previews of one room whose content changed after version `since`."""
+        self.expire()
+        peers = self._rooms.get(token)
+        if not peers:
+            return []
+        return [(peer_id, preview) for peer_id, preview in peers.items() if preview.version > since]
+
+    def tokens(self, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        """A page of the rooms that have previews, oldest room first."""
+        self.expire()
+        stop = None if limit is None else offset + limit
+        return list(itertools.islice(self._rooms, offset, stop))
+
+    @property
+    def room_count(self) -> int:
+        return len(self._rooms)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop previews older than the TTL; they are all at the head."""
+        deadline = (time.time() if now is None else now) - self.ttl_seconds
+        removed = 0
+        entries = self._entries
+        while entries and next(iter(entries.values())).ts < deadline:
+            self._pop_oldest()
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    def _pop_oldest(self) -> None:
+        (token, peer_id), preview = self._entries.popitem(last=False)
+        self.bytes -= preview.size
+        self.version += 1
+        peers = self._rooms.get(token)
+        if peers is not None:
+            peers.pop(peer_id, None)
+            if not peers:
+                del self._rooms[token]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "rooms": len(self._rooms),
+            "version": self.version,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "duplicates": self.duplicates,
+        }
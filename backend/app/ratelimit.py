@@ -0,0 +1,212 @@
+"""Token-bucket rate limits for incoming signaling messages.
+
+Every message type has its own budget - a refill rate per second and a burst
+size - so a client flooding `candidate` or `orientation` cannot starve its own
+offer/answer, and types without a budget of their own share the "*" one.
+Budgets apply twice: to each connection, and to each room as a whole (all
+local connections of the room together), which bounds a room whatever number
+of sockets a client opens into it.
+
+What happens to a message over the limit is set by RateLimitPolicy:
+
+* drop  - the message is ignored (the client gets one `rate_limited` error)
+* delay - the receive loop sleeps until a token is available, up to
+          `max_delay`, so the client is slowed down by TCP backpressure;
+          beyond that the message is dropped
+* close - the connection is closed with RATE_LIMIT_CLOSE_CODE
+
+Budgets of the per-peer negotiation types (offer, answer, candidate) are
+sized for a two-party room. In a mesh of N participants every peer
+negotiates with N-1 others, so for rooms with a larger `max_participants`
+those budgets are multiplied by N-1 per connection and by N(N-1)/2 per room.
+The capacity is only trusted once the room has admitted the peer, so buckets
+start at two-party size and are resized (keeping their tokens) after a join.
+
+A check is a dict lookup and a little arithmetic per bucket: buckets refill
+lazily from the time of the previous check, no timers. Bucket sets are
+created on first use; unknown message types map to the "*" bucket, so a
+client cannot grow them.
+"""
+from __future__ import annotations
+
+from enum import Enum
+from time import monotonic
+from typing import Dict, NamedTuple, Optional, Tuple
+
+RATE_LIMIT_CLOSE_CODE = 4429
+RATE_LIMIT_MAX_DELAY_DEFAULT = 1.0
+
+# rate/burst per message type; "*" covers the other types
+RATE_LIMITS_DEFAULT = "candidate=50/200,orientation=10/30,offer=5/20,answer=5/20,join=2/10,resume=2/10,*=20/50"
+RATE_LIMITS_ROOM_DEFAULT = "candidate=100/400,orientation=20/60,offer=10/40,answer=10/40,join=5/20,resume=5/20,*=40/100"
+# Sent once per remote peer: their budgets grow with the room
+MESH_SCALED_TYPES = frozenset({"offer", "answer", "candidate"})
+
+
+class RateLimitPolicy(str, Enum):
+    drop = "drop"
+    delay = "delay"
+    close = "close"
+
+
+class Budget(NamedTuple):
+    rate: float
+    burst: float
+
+
+def parse_budgets(spec: str) -> Dict[str, Budget]:
+    """"candidate=50/200,*=20/50" -> {type: Budget(rate, burst)}; an empty spec means no limits."""
+    budgets: Dict[str, Budget] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            msg_type, values = item.split("=", 1)
+            rate, _, burst = values.partition("/")
+            budget = Budget(float(rate), float(burst or rate))
+        except ValueError:
+            raise ValueError(f"invalid rate limit {item!r}, expected type=rate/burst") from None
+        if budget.rate <= 0 or budget.burst < 1:
+            raise ValueError(f"invalid rate limit {item!r}: rate must be > 0 and burst >= 1")
+        budgets[msg_type.strip()] = budget
+    return budgets
+
+
+def scale_budgets(budgets: Dict[str, Budget], factor: int) -> Dict[str, Budget]:
+    """Budgets for a room `factor` times as busy as a two-party one (see MESH_SCALED_TYPES)."""
+    if factor <= 1:
+        return budgets
+    return {
+        msg_type: Budget(budget.rate * factor, budget.burst * factor) if msg_type in MESH_SCALED_TYPES else budget
+        for msg_type, budget in budgets.items()
+    }
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, budget: Budget, now: float):
+        self.rate = budget.rate
+        self.burst = budget.burst
+        self.tokens = budget.burst
+        self.updated = now
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is now."""
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        # May go negative: a delayed message reserves a token it waits for
+        self.tokens -= 1
+
+
+class BucketSet:
+    """The buckets of one connection or room, one per budgeted message type."""
+
+    __slots__ = ("_budgets", "_buckets")
+
+    def __init__(self, budgets: Dict[str, Budget]):
+        self._budgets = budgets
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, msg_type: str, now: float) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(msg_type)
+        if bucket is None:
+            key = msg_type if msg_type in self._budgets else "*"
+            budget = self._budgets.get(key)
+            if budget is None:
+                return None
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(budget, now)
+        return bucket
+
+    def resize(self, budgets: Dict[str, Budget]) -> None:
+        """Switch to `budgets`; buckets already in use keep their tokens."""
+        self._budgets = budgets
+        for msg_type, bucket in self._buckets.items():
+            budget = budgets.get(msg_type if msg_type in budgets else "*")
+            if budget is not None:
+                bucket.rate, bucket.burst = budget
+
+
+class RateLimiter:
+    def __init__(self, connection: Dict[str, Budget], room: Dict[str, Budget],
+                 policy: RateLimitPolicy = RateLimitPolicy.drop,
+                 max_delay: float = RATE_LIMIT_MAX_DELAY_DEFAULT):
+        self.connection_budgets = connection
+        self.room_budgets = room
+        self.policy = policy
+        self.max_delay = max_delay
+        self._rooms: Dict[str, BucketSet] = {}
+        # (scope, factor) -> scaled budgets, shared by all rooms of the same size
+        self._scaled: Dict[Tuple[str, int], Dict[str, Budget]] = {}
+        self.limited = {"connection": 0, "room": 0}
+        self.delayed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.connection_budgets or self.room_budgets)
+
+    def _budgets(self, scope: str, factor: int) -> Dict[str, Budget]:
+        budgets = self.connection_budgets if scope == "connection" else self.room_budgets
+        if factor <= 1:
+            return budgets
+        scaled = self._scaled.get((scope, factor))
+        if scaled is None:
+            scaled = self._scaled[(scope, factor)] = scale_budgets(budgets, factor)
+        return scaled
+
+    def for_connection(self, max_participants: int = 2) -> BucketSet:
+        return BucketSet(self._budgets("connection", max_participants - 1))
+
+    def admit(self, buckets: BucketSet, token: str, max_participants: int) -> None:
+        """Size a connection's and its room's budgets for the capacity the peer was admitted with."""
+        buckets.resize(self._budgets("connection", max_participants - 1))
+        room_budgets = self._budgets("room", max_participants * (max_participants - 1) // 2)
+        room_buckets = self._rooms.get(token)
+        if room_buckets is None:
+            self._rooms[token] = BucketSet(room_budgets)
+        else:
+            room_buckets.resize(room_budgets)
+
+    def discard_room(self, token: str) -> None:
+        self._rooms.pop(token, None)
+
+    def check(self, buckets: BucketSet, token: str, msg_type: str) -> Optional[float]:
+        """None if the message is over the limit, else the seconds to wait before handling it.
+
+        The wait is always 0 unless the policy is delay.
+        """
+        now = monotonic()
+        room_buckets = self._rooms.get(token)
+        if room_buckets is None:
+            room_buckets = self._rooms[token] = BucketSet(self.room_budgets)
+        own = buckets.bucket(msg_type, now)
+        shared = room_buckets.bucket(msg_type, now)
+        own_wait = own.wait(now) if own is not None else 0.0
+        shared_wait = shared.wait(now) if shared is not None else 0.0
+        wait = max(own_wait, shared_wait)
+        if wait > 0 and (self.policy is not RateLimitPolicy.delay or wait > self.max_delay):
+            self.limited["connection" if own_wait >= shared_wait else "room"] += 1
+            return None
+        if own is not None:
+            own.take()
+        if shared is not None:
+            shared.take()
+        if wait > 0:
+            self.delayed += 1
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy.value,
+            "max_delay": self.max_delay,
+            "rooms": len(self._rooms),
+            "limited": dict(self.limited),
+            "delayed": self.delayed,
+        }
@@ -1,57 +1,163 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
 import secrets
 import time
 from dataclasses import dataclass, field
-from typing import Dict, Optional, Set
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 DEFAULT_ROOM_TTL_SECONDS = 1 * 24 * 3600  # 7 days
 EMPTY_ROOM_IDLE_CLOSE_SECONDS = 50 * 60  # 5 minutes
 MAX_PARTICIPANTS_DEFAULT = 2
+ROOM_STORE_SHARDS_DEFAULT = 64
+CLEANUP_INTERVAL_SECONDS_DEFAULT = 30.0
 
 
-@dataclass
+@dataclass(slots=True)
 class Peer:
     peer_id: str
     connected_at: float = field(default_factory=lambda: time.time())
 
 
-@dataclass
+# Shared read-only view returned for rooms nobody has joined yet
+_NO_PEERS: Mapping[str, Peer] = MappingProxyType({})
+
+
+@dataclass(slots=True)
 class Room:
     token: str
     created_at: float
     expires_at: float
     max_participants: int = MAX_PARTICIPANTS_DEFAULT
-    peers: Dict[str, Peer] = field(default_factory=dict)
     last_empty_since: Optional[float] = None
+    # Idle rooms (the vast majority: links kept alive for the full TTL) carry
+    # neither a peers dict nor a lock; both are materialized on first join.
+    _peers: Optional[Dict[str, Peer]] = field(default=None, init=False, repr=False, compare=False)
+    _lock: Optional[asyncio.Lock] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def peers(self) -> Mapping[str, Peer]:
+        return self._peers if self._peers is not None else _NO_PEERS
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        # Created lazily: most rooms are never joined concurrently
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
 
     def join(self, peer_id: str) -> bool:
-        if peer_id in self.peers:
+        peers = self._peers
+        if peers is None:
+            if self.max_participants < 1:
+                return False
+            peers = self._peers = {}
+        elif peer_id in peers:
             return True
-        if len(self.peers) >= self.max_participants:
+        elif len(peers) >= self.max_participants:
             return False
-        self.peers[peer_id] = Peer(peer_id)
+        peers[peer_id] = Peer(peer_id)
         self.last_empty_since = None
         return True
 
     def leave(self, peer_id: str) -> None:
-        if peer_id in self.peers:
-            del self.peers[peer_id]
-        if not self.peers:
-            self.last_empty_since = time.time()
+        peers = self._peers
+        if peers is not None:
+            peers.pop(peer_id, None)
+            if peers:
+                return
+            # Drop back to the compact idle form
+            self._peers = None
+        self.last_empty_since = time.time()
 
     @property
     def participants(self) -> int:
-        return len(self.peers)
+        return len(self._peers) if self._peers is not None else 0
+
+
+@dataclass(slots=True)
+class RoomSpec:
+    """One room of a create_rooms() batch; no token means a generated one."""
+    token: Optional[str] = None
+    max_participants: int = MAX_PARTICIPANTS_DEFAULT
+    ttl_seconds: Optional[int] = None
+
+
+class _Shard:
+    __slots__ = ("rooms", "lock", "resolution", "buckets", "due")
+
+    def __init__(self, resolution: float) -> None:
+        self.rooms: Dict[str, Room] = {}
+        self.lock = asyncio.Lock()
+        # Expiry index: tokens bucketed by floor(expires_at / resolution), plus a
+        # min-heap of bucket ids. One list slot per room instead of a heap tuple.
+        # Entries are never removed eagerly: a token that was deleted or
+        # re-created with a later expiry is simply skipped when its bucket is due.
+        self.resolution = resolution
+        self.buckets: Dict[int, List[str]] = {}
+        self.due: List[int] = []
+
+    def put(self, room: Room) -> None:
+        self.rooms[room.token] = room
+        bucket_id = int(room.expires_at // self.resolution)
+        bucket = self.buckets.get(bucket_id)
+        if bucket is None:
+            self.buckets[bucket_id] = [room.token]
+            heapq.heappush(self.due, bucket_id)
+        else:
+            bucket.append(room.token)
+
+    def next_due(self) -> Optional[float]:
+        return self.due[0] * self.resolution if self.due else None
+
+    def pop_expired(self, now: float, expired: Optional[List[str]] = None) -> int:
+        removed = 0
+        rooms = self.rooms
+        while self.due and self.due[0] * self.resolution <= now:
+            bucket_id = self.due[0]
+            pending: List[str] = []
+            for token in self.buckets[bucket_id]:
+                room = rooms.get(token)
+                if room is None:
+                    continue
+                if now >= room.expires_at:
+                    # Keep empty rooms until TTL to allow reconnection by previously generated link
+                    del rooms[token]
+                    removed += 1
+                    if expired is not None:
+                        expired.append(token)
+                elif int(room.expires_at // self.resolution) == bucket_id:
+                    pending.append(token)
+            if pending:
+                # Partially elapsed bucket: keep the rest for the next sweep
+                self.buckets[bucket_id] = pending
+                break
+            heapq.heappop(self.due)
+            del self.buckets[bucket_id]
+        return removed
 
 
 class RoomStore:
-    def __init__(self, ttl_seconds: int = DEFAULT_ROOM_TTL_SECONDS):
-        self._rooms: Dict[str, Room] = {}
+    def __init__(self, ttl_seconds: int = DEFAULT_ROOM_TTL_SECONDS, shards: int = ROOM_STORE_SHARDS_DEFAULT,
+                 cleanup_interval: float = CLEANUP_INTERVAL_SECONDS_DEFAULT):
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        if cleanup_interval <= 0:
+            raise ValueError("cleanup_interval must be > 0")
+        self._shards = [_Shard(cleanup_interval) for _ in range(shards)]
         self._ttl_seconds = ttl_seconds
-        self._lock = asyncio.Lock()
+        self._cleanup_interval = cleanup_interval
         self._cleanup_task: Optional[asyncio.Task] = None
+        # Called with the tokens removed by each cleanup() sweep (e.g. to notify admin dashboards)
+        self.on_expire: Optional[Callable[[List[str]], None]] = None
+
+    def _shard(self, token: str) -> _Shard:
+        return self._shards[hash(token) % len(self._shards)]
+
+    def __len__(self) -> int:
+        return sum(len(shard.rooms) for shard in self._shards)
 
     def start_cleanup(self) -> None:
         if self._cleanup_task is None:
@@ -62,10 +168,13 @@ class RoomStore:
             self._cleanup_task.cancel()
             self._cleanup_task = None
 
+    async def close(self) -> None:
+        self.stop_cleanup()
+
     async def _cleanup_loop(self):
         while True:
             try:
-                await asyncio.sleep(30)
+                await asyncio.sleep(self._cleanup_interval)
                 await self.cleanup()
             except asyncio.CancelledError:
                 break
@@ -73,45 +182,82 @@ class RoomStore:
                 # best-effort cleanup; avoid crashing
                 pass
 
-    async def cleanup(self):
+    async def cleanup(self) -> int:
+        """Remove expired rooms; cost is proportional to the number of expired entries."""
         now = time.time()
-        async with self._lock:
-            tokens_to_delete: Set[str] = set()
-            for token, room in self._rooms.items():
-                if now >= room.expires_at:
-                    tokens_to_delete.add(token)
-                    continue
-                # Keep empty rooms until TTL to allow reconnection by previously generated link
-            for token in tokens_to_delete:
-                self._rooms.pop(token, None)
+        removed = 0
+        expired: Optional[List[str]] = [] if self.on_expire is not None else None
+        for shard in self._shards:
+            due = shard.next_due()
+            if due is None or due > now:
+                continue
+            async with shard.lock:
+                removed += shard.pop_expired(now, expired)
+            # Yield between shards so lookups are not stalled behind a long sweep
+            await asyncio.sleep(0)
+        if expired:
+            self.on_expire(expired)
+        return removed
 
-    async def create_room(self, max_participants: int = MAX_PARTICIPANTS_DEFAULT) -> Room:
-        token = self._generate_token()
+    def _new_room(self, token: str, max_participants: int, ttl_seconds: Optional[int]) -> Room:
         now = time.time()
-        room = Room(token=token, created_at=now, expires_at=now + self._ttl_seconds,
+        ttl = self._ttl_seconds if ttl_seconds is None else ttl_seconds
+        return Room(token=token, created_at=now, expires_at=now + ttl,
                     max_participants=max_participants)
-        async with self._lock:
-            self._rooms[token] = room
+
+    async def create_room(self, max_participants: int = MAX_PARTICIPANTS_DEFAULT,
+                          ttl_seconds: Optional[int] = None) -> Room:
+        room = self._new_room(self._generate_token(), max_participants, ttl_seconds)
+        shard = self._shard(room.token)
+        async with shard.lock:
+            shard.put(room)
         return room
 
-    async def create_room_with_token(self, token: str, max_participants: int = MAX_PARTICIPANTS_DEFAULT) -> Room:
+    async def create_room_with_token(self, token: str, max_participants: int = MAX_PARTICIPANTS_DEFAULT,
+                                     ttl_seconds: Optional[int] = None) -> Room:
         """Create (or recreate) a room with a specific token.
-        Overwrites any existing room with the same token.
+        Overwrites any existing room with the same token; the old room's
+        expiry entry is invalidated lazily.
         """
-        now = time.time()
-        room = Room(token=token, created_at=now, expires_at=now + self._ttl_seconds,
-                    max_participants=max_participants)
-        async with self._lock:
-            self._rooms[token] = room
+        room = self._new_room(token, max_participants, ttl_seconds)
+        shard = self._shard(token)
+        async with shard.lock:
+            shard.put(room)
         return room
 
+    async def create_rooms(self, specs: Sequence[RoomSpec]) -> List[Tuple[Room, bool]]:
+        """Create many rooms, taking each shard lock once rather than once per room.
+
+        Returns (room, created) in the order of `specs`. A token that belongs to
+        a live room is not overwritten: that room is returned with created=False.
+        """
+        now = time.time()
+        results: List[Optional[Tuple[Room, bool]]] = [None] * len(specs)
+        by_shard: Dict[int, List[Tuple[int, Room]]] = {}
+        for index, spec in enumerate(specs):
+            room = self._new_room(spec.token or self._generate_token(), spec.max_participants, spec.ttl_seconds)
+            by_shard.setdefault(hash(room.token) % len(self._shards), []).append((index, room))
+        for shard_index, items in by_shard.items():
+            shard = self._shards[shard_index]
+            async with shard.lock:
+                for index, room in items:
+                    existing = shard.rooms.get(room.token)
+                    if existing is not None and now < existing.expires_at:
+                        results[index] = (existing, False)
+                    else:
+                        shard.put(room)
+                        results[index] = (room, True)
+        return results
+
     async def get_room(self, token: str) -> Optional[Room]:
-        async with self._lock:
-            return self._rooms.get(token)
+        # Lock-free read: a dict lookup never awaits, so it cannot observe a
+        # half-applied mutation from another coroutine.
+        return self._shard(token).rooms.get(token)
 
     async def delete_room(self, token: str) -> None:
-        async with self._lock:
-            self._rooms.pop(token, None)
+        shard = self._shard(token)
+        async with shard.lock:
+            shard.rooms.pop(token, None)
 
     @staticmethod
     def _generate_token() -> str:
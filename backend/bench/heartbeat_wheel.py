@@ -0,0 +1,85 @@
+"""Cost of watching many idle sockets with app.heartbeat.
+
+For N watched sockets: memory per watch, the CPU the wheel's ticks take over
+one heartbeat interval (every watch comes due once, nothing is sent), and the
+cost of Watch.seen() on the receive path. For comparison, the same deadlines
+as one loop.call_later() TimerHandle per socket, rescheduled on every frame.
+Run from the backend directory:
+
+    python -m bench.heartbeat_wheel --sockets 10000 50000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app.heartbeat import Heartbeat
+
+
+def _noop() -> None:
+    pass
+
+
+async def measure(sockets: int, interval: float) -> dict:
+    loop = asyncio.get_running_loop()
+    heartbeat = Heartbeat(interval, timeout=interval, tick=interval / 20)
+    heartbeat.now = loop.time()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    watches = [heartbeat.watch(_noop, _noop) for _ in range(sockets)]
+    wheel_bytes = (tracemalloc.get_traced_memory()[0] - before) / sockets
+    tracemalloc.stop()
+
+    # Every watch was active just now: each comes due once and is put back
+    started = time.perf_counter()
+    for watch in watches:
+        watch.seen()
+    seen_ns = (time.perf_counter() - started) / sockets * 1e9
+    started = time.perf_counter()
+    for _ in range(20):
+        heartbeat.advance(heartbeat.now)
+    tick_ms = (time.perf_counter() - started) * 1e3
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    handles = [loop.call_later(interval, _noop) for _ in range(sockets)]
+    handle_bytes = (tracemalloc.get_traced_memory()[0] - before) / sockets
+    tracemalloc.stop()
+    started = time.perf_counter()
+    for index, handle in enumerate(handles):
+        handle.cancel()
+        handles[index] = loop.call_later(interval, _noop)
+    reschedule_ns = (time.perf_counter() - started) / sockets * 1e9
+    for handle in handles:
+        handle.cancel()
+
+    return {
+        "wheel_bytes_per_socket": wheel_bytes,
+        "wheel_ms_per_interval": tick_ms,
+        "seen_ns": seen_ns,
+        "timer_bytes_per_socket": handle_bytes,
+        "timer_reschedule_ns": reschedule_ns,
+    }
+
+
+async def run(args) -> None:
+    print(f"{'sockets':>8} {'wheel B/sock':>13} {'wheel ms/intv':>14} {'seen() ns':>10} "
+          f"{'timer B/sock':>13} {'resched. ns':>12}")
+    for sockets in args.sockets:
+        r = await measure(sockets, args.interval)
+        print(f"{sockets:>8} {r['wheel_bytes_per_socket']:>13.0f} {r['wheel_ms_per_interval']:>14.1f} "
+              f"{r['seen_ns']:>10.0f} {r['timer_bytes_per_socket']:>13.0f} {r['timer_reschedule_ns']:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, nargs="*", default=[10_000, 50_000])
+    parser.add_argument("--interval", type=float, default=25.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
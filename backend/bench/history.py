@@ -0,0 +1,38 @@
+"""Benchmark results saved per git commit, for comparing runs across changes.
+
+Files go to bench/results/<name>-<commit>-<timestamp>.json (gitignored) and
+hold {"name", "commit", "timestamp", "params", "results"}.
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+from datetime import datetime
+from typing import Any, Dict
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def save_result(name: str, params: Dict[str, Any], results: Dict[str, Any]) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    commit = git_commit()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(RESULTS_DIR, f"{name}-{commit}-{stamp}.json")
+    with open(path, "w") as f:
+        json.dump({"name": name, "commit": commit, "timestamp": stamp, "params": params, "results": results},
+                  f, indent=2)
+    return path
+
+
+def load_result(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,507 @@
+"""End-to-end signaling load: simulated calls against the whole app.
+
+Every simulated call does what two browsers do:
+
+1. POST /api/rooms;
+2. the offerer and the answerer open /ws/rooms/{token} and join;
+3. on peer-joined the offerer sends an offer and a burst of ICE candidates,
+   the answerer answers the offer with its own answer and candidates;
+4. each side uploads admin preview thumbnails;
+5. both stay connected for --hold seconds, then send bye and close.
+
+Relay latency is measured client side, from handing a frame to the socket to
+receiving it on the other peer (offers, answers and every candidate, also
+inside coalesced "candidates" batches).
+
+Targets:
+
+* in-process (default): the ASGI app is called directly - websocket and
+  lifespan events go through in-memory queues, HTTP through
+  httpx.ASGITransport - so thousands of clients run on one event loop
+  without sockets. Server settings come from the usual env variables.
+* --url http://127.0.0.1:8000: a running uvicorn, over real sockets. Pass
+  --server-pid to report its RSS.
+
+Run from the backend directory:
+
+    python -m bench.loadgen --calls 2000 --concurrency 500 --save
+    python -m bench.loadgen --url http://127.0.0.1:8000 --server-pid 1234 --calls 500
+    python -m bench.loadgen --compare bench/results/loadgen-*.json
+
+--save writes the parameters and results, tagged with the current git
+commit, to bench/results/ so runs can be compared across commits.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from bench.history import RESULTS_DIR, load_result, save_result
+from bench.payloads import candidate_message, make_sdp
+from bench.rooms_contention import percentile
+
+CLOSE_TIMEOUT_SECONDS = 5.0
+
+Frame = Union[str, bytes]
+
+
+# --- Transports ---
+
+class _AsgiWebSocket:
+    """One websocket connection to an ASGI app, without a server or sockets."""
+
+    def __init__(self, app, path: str, subprotocols: List[str]):
+        self._to_app: asyncio.Queue = asyncio.Queue()
+        self._from_app: asyncio.Queue = asyncio.Queue()
+        self._opened = asyncio.Event()
+        self.subprotocol: Optional[str] = None
+        self.rejected = False
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+            "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("127.0.0.1", 0),
+            "subprotocols": subprotocols,
+        }
+        self._task = asyncio.create_task(app(scope, self._to_app.get, self._send))
+        self._to_app.put_nowait({"type": "websocket.connect"})
+
+    async def _send(self, message: dict) -> None:
+        kind = message["type"]
+        if kind == "websocket.accept":
+            self.subprotocol = message.get("subprotocol")
+            self._opened.set()
+        elif kind == "websocket.send":
+            text = message.get("text")
+            self._from_app.put_nowait(text if text is not None else message.get("bytes"))
+        elif kind == "websocket.close":
+            self.rejected = not self._opened.is_set()
+            self._opened.set()
+            self._from_app.put_nowait(None)
+
+    async def wait_open(self) -> None:
+        await self._opened.wait()
+        if self.rejected:
+            raise ConnectionError("websocket rejected")
+
+    async def send(self, frame: Frame) -> None:
+        key = "text" if isinstance(frame, str) else "bytes"
+        self._to_app.put_nowait({"type": "websocket.receive", key: frame})
+
+    async def recv(self) -> Optional[Frame]:
+        """Next frame from the server, None once it closed the connection."""
+        return await self._from_app.get()
+
+    async def close(self, code: int = 1000) -> None:
+        self._to_app.put_nowait({"type": "websocket.disconnect", "code": code})
+        try:
+            await asyncio.wait_for(self._task, CLOSE_TIMEOUT_SECONDS)
+        except Exception:
+            self._task.cancel()
+        self._from_app.put_nowait(None)
+
+
+class InProcessTarget:
+    name = "in-process"
+
+    def __init__(self) -> None:
+        from app.main import app
+        self.app = app
+        self.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        self._lifespan_in: asyncio.Queue = asyncio.Queue()
+        self._lifespan_task: Optional[asyncio.Task] = None
+        self._lifespan_done: Dict[str, asyncio.Event] = {}
+
+    async def start(self) -> None:
+        self._lifespan_done = {"startup": asyncio.Event(), "shutdown": asyncio.Event()}
+
+        async def send(message: dict) -> None:
+            phase, _, outcome = message["type"].partition(".")[2].partition(".")
+            if outcome == "failed":
+                raise RuntimeError(f"lifespan {phase} failed: {message.get('message')}")
+            self._lifespan_done[phase].set()
+
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._lifespan_task = asyncio.create_task(self.app(scope, self._lifespan_in.get, send))
+        self._lifespan_in.put_nowait({"type": "lifespan.startup"})
+        await self._lifespan_done["startup"].wait()
+
+    async def connect(self, path: str, subprotocols: List[str]) -> _AsgiWebSocket:
+        ws = _AsgiWebSocket(self.app, path, subprotocols)
+        await ws.wait_open()
+        return ws
+
+    async def stop(self) -> None:
+        await self.http.aclose()
+        self._lifespan_in.put_nowait({"type": "lifespan.shutdown"})
+        await asyncio.wait_for(self._lifespan_done["shutdown"].wait(), 30)
+
+    def rss_bytes(self) -> Optional[int]:
+        return _rss_bytes(os.getpid())
+
+
+class _RemoteWebSocket:
+    def __init__(self, ws):
+        self._ws = ws
+        self.subprotocol = ws.subprotocol
+
+    async def send(self, frame: Frame) -> None:
+        await self._ws.send(frame)
+
+    async def recv(self) -> Optional[Frame]:
+        try:
+            return await self._ws.recv()
+        except Exception:
+            return None
+
+    async def close(self, code: int = 1000) -> None:
+        await self._ws.close(code)
+
+
+class RemoteTarget:
+    name = "remote"
+
+    def __init__(self, url: str, server_pid: Optional[int]):
+        self.url = url.rstrip("/")
+        self.server_pid = server_pid
+        limits = httpx.Limits(max_connections=256, max_keepalive_connections=256)
+        self.http = httpx.AsyncClient(base_url=self.url, limits=limits, timeout=30)
+
+    async def start(self) -> None:
+        (await self.http.get("/api/health")).raise_for_status()
+
+    async def connect(self, path: str, subprotocols: List[str]) -> _RemoteWebSocket:
+        import websockets
+        ws_url = "ws" + self.url[len("http"):] + path
+        return _RemoteWebSocket(await websockets.connect(
+            ws_url, subprotocols=subprotocols or None, max_size=None, open_timeout=30))
+
+    async def stop(self) -> None:
+        await self.http.aclose()
+
+    def rss_bytes(self) -> Optional[int]:
+        return _rss_bytes(self.server_pid) if self.server_pid else None
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        # Peak rather than current, where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+# --- Wire format ---
+
+class Codec:
+    """Client side of the negotiated subprotocol (webcall.json / webcall.msgpack, optionally +zdict1)."""
+
+    def __init__(self, subprotocol: Optional[str]):
+        from app.codec import MsgpackCodec, subprotocol_options
+        from app.compression import DeflateContext
+        self.binary, deflate = subprotocol_options(subprotocol)
+        self._deflate = DeflateContext() if deflate else None
+        self._msgpack = MsgpackCodec
+
+    def encode(self, payload: dict) -> Frame:
+        frame: Frame = self._msgpack.dumps(payload) if self.binary else json.dumps(payload, separators=(",", ":"))
+        if self._deflate is not None:
+            return self._deflate.compress(frame if isinstance(frame, bytes) else frame.encode("utf-8"))
+        return frame
+
+    def decode(self, frame: Frame) -> dict:
+        if self._deflate is not None:
+            frame = self._deflate.decompress(frame)
+        if self.binary:
+            return self._msgpack.loads(frame)
+        return json.loads(frame)
+
+
+# --- Simulated calls ---
+
+class Stats:
+    def __init__(self) -> None:
+        self.sent_at: Dict[Tuple[str, str, str], float] = {}
+        self.latencies: List[float] = []
+        self.setup_times: List[float] = []
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.rooms_created = 0
+        self.previews_uploaded = 0
+        self.calls_completed = 0
+        self.active_calls = 0
+        self.peak_calls = 0
+        self.errors: Counter = Counter()
+
+
+class Peer:
+    def __init__(self, target, stats: Stats, token: str, peer_id: str, role: str, subprotocols: List[str]):
+        self.target = target
+        self.stats = stats
+        self.token = token
+        self.peer_id = peer_id
+        self.role = role
+        self.subprotocols = subprotocols
+        self.ws = None
+        self.codec: Optional[Codec] = None
+        self.remote_id: Optional[str] = None
+        self.events: Dict[str, asyncio.Event] = {name: asyncio.Event() for name in ("peer-joined", "offer", "answer", "candidates-done")}
+        self.expected_candidates = 0
+        self.candidates = 0
+        self._reader: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        self.ws = await self.target.connect(f"/ws/rooms/{self.token}", self.subprotocols)
+        self.codec = Codec(self.ws.subprotocol)
+        self._reader = asyncio.create_task(self._read())
+
+    async def send(self, payload: dict, key: Optional[str] = None) -> None:
+        if key is not None:
+            self.stats.sent_at[(self.token, self.remote_id, key)] = time.perf_counter()
+        await self.ws.send(self.codec.encode(payload))
+        self.stats.frames_sent += 1
+
+    def _received(self, key: str, now: float) -> None:
+        sent = self.stats.sent_at.pop((self.token, self.peer_id, key), None)
+        if sent is not None:
+            self.stats.latencies.append(now - sent)
+
+    def _candidate(self, candidate: Any, now: float) -> None:
+        self._received(candidate.get("candidate", "") if isinstance(candidate, dict) else str(candidate), now)
+        self.candidates += 1
+        if self.expected_candidates and self.candidates >= self.expected_candidates:
+            self.events["candidates-done"].set()
+
+    async def _read(self) -> None:
+        while True:
+            frame = await self.ws.recv()
+            if frame is None:
+                return
+            now = time.perf_counter()
+            self.stats.frames_received += 1
+            message = self.codec.decode(frame)
+            kind = message.get("type")
+            if kind in ("offer", "answer"):
+                self._received(kind, now)
+                self.events[kind].set()
+            elif kind == "candidate":
+                self._candidate(message.get("candidate"), now)
+            elif kind == "candidates":
+                for candidate in message.get("candidates", []):
+                    self._candidate(candidate, now)
+            elif kind == "peer-joined":
+                self.events["peer-joined"].set()
+            elif kind == "ping":
+                await self.send({"type": "pong"})
+            elif kind == "error":
+                self.stats.errors[f"ws:{message.get('code')}"] += 1
+
+    async def upload_preview(self, image: bytes) -> None:
+        response = await self.target.http.post(
+            f"/api/admin/preview/{self.token}/{self.peer_id}", content=image,
+            headers={"content-type": "image/jpeg"})
+        if response.status_code == 200:
+            self.stats.previews_uploaded += 1
+        else:
+            self.stats.errors[f"preview:{response.status_code}"] += 1
+
+    async def close(self) -> None:
+        if self.ws is None:
+            return
+        try:
+            await self.send({"type": "bye", "peerId": self.peer_id})
+        except Exception:
+            pass
+        await self.ws.close(1000)
+        if self._reader is not None:
+            try:
+                await asyncio.wait_for(self._reader, CLOSE_TIMEOUT_SECONDS)
+            except Exception:
+                self._reader.cancel()
+
+
+async def run_call(index: int, target, stats: Stats, args, sdps: Dict[str, List[str]], image: bytes) -> None:
+    started = time.perf_counter()
+    response = await target.http.post("/api/rooms")
+    if response.status_code != 200:
+        stats.errors[f"create:{response.status_code}"] += 1
+        return
+    stats.rooms_created += 1
+    token = response.json()["token"]
+
+    offerer = Peer(target, stats, token, f"o{index}", "offerer", args.subprotocol)
+    answerer = Peer(target, stats, token, f"a{index}", "answerer", args.subprotocol)
+    offerer.remote_id, answerer.remote_id = answerer.peer_id, offerer.peer_id
+    offerer.expected_candidates = answerer.expected_candidates = args.candidates
+    stats.active_calls += 1
+    stats.peak_calls = max(stats.peak_calls, stats.active_calls)
+
+    async def burst(peer: Peer) -> None:
+        for i in range(args.candidates):
+            message = candidate_message(peer.peer_id, i)
+            await peer.send(message, key=message["candidate"]["candidate"])
+
+    try:
+        await offerer.open()
+        await offerer.send({"type": "join", "peerId": offerer.peer_id, "role": "offerer"})
+        await answerer.open()
+        await answerer.send({"type": "join", "peerId": answerer.peer_id, "role": "answerer"})
+
+        await asyncio.wait_for(offerer.events["peer-joined"].wait(), args.timeout)
+        await offerer.send({"type": "offer", "peerId": offerer.peer_id,
+                            "sdp": {"type": "offer", "sdp": random.choice(sdps["offer"])}}, key="offer")
+        await burst(offerer)
+
+        await asyncio.wait_for(answerer.events["offer"].wait(), args.timeout)
+        await answerer.send({"type": "answer", "peerId": answerer.peer_id,
+                             "sdp": {"type": "answer", "sdp": random.choice(sdps["answer"])}}, key="answer")
+        await burst(answerer)
+
+        waits = [offerer.events["answer"].wait()]
+        if args.candidates:
+            waits += [offerer.events["candidates-done"].wait(), answerer.events["candidates-done"].wait()]
+        await asyncio.wait_for(asyncio.gather(*waits), args.timeout)
+        stats.setup_times.append(time.perf_counter() - started)
+
+        for _ in range(args.previews):
+            await asyncio.gather(offerer.upload_preview(image), answerer.upload_preview(image))
+        if args.hold:
+            await asyncio.sleep(args.hold)
+        stats.calls_completed += 1
+    except asyncio.TimeoutError:
+        stats.errors["timeout"] += 1
+    except Exception as e:
+        stats.errors[type(e).__name__] += 1
+    finally:
+        stats.active_calls -= 1
+        await asyncio.gather(offerer.close(), answerer.close(), return_exceptions=True)
+
+
+async def run(args) -> Dict[str, Any]:
+    target = RemoteTarget(args.url, args.server_pid) if args.url else InProcessTarget()
+    await target.start()
+    rng = random.Random(1)
+    sdps = {kind: [make_sdp(kind, seed) for seed in range(8)] for kind in ("offer", "answer")}
+    # A JPEG-shaped blob of --preview-bytes: only the size matters to the server
+    image = b"\xff\xd8" + bytes(rng.randrange(256) for _ in range(max(0, args.preview_bytes - 4))) + b"\xff\xd9"
+
+    stats = Stats()
+    rss_before = target.rss_bytes()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    rss_peak = rss_before or 0
+
+    async def limited(index: int) -> None:
+        nonlocal rss_peak
+        async with semaphore:
+            await run_call(index, target, stats, args, sdps, image)
+            if index % 100 == 0:
+                rss_peak = max(rss_peak, target.rss_bytes() or 0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.calls)))
+    elapsed = time.perf_counter() - started
+    rss_after = target.rss_bytes()
+    await target.stop()
+
+    def ms(samples: List[float], pct: float) -> Optional[float]:
+        return round(percentile(samples, pct) * 1000, 3) if samples else None
+
+    frames = stats.frames_sent + stats.frames_received
+    return {
+        "target": target.name,
+        "elapsed_s": round(elapsed, 3),
+        "calls": args.calls,
+        "calls_completed": stats.calls_completed,
+        "peak_concurrent_calls": stats.peak_calls,
+        "rooms_per_s": round(stats.rooms_created / elapsed, 1),
+        "messages_per_s": round(frames / elapsed, 1),
+        "frames_sent": stats.frames_sent,
+        "frames_received": stats.frames_received,
+        "previews_per_s": round(stats.previews_uploaded / elapsed, 1),
+        "relay_p50_ms": ms(stats.latencies, 50),
+        "relay_p99_ms": ms(stats.latencies, 99),
+        "relay_samples": len(stats.latencies),
+        "setup_p50_ms": ms(stats.setup_times, 50),
+        "setup_p99_ms": ms(stats.setup_times, 99),
+        "rss_before_mb": _mb(rss_before),
+        "rss_peak_mb": _mb(max(rss_peak, rss_after or 0)) if rss_before is not None else None,
+        "rss_after_mb": _mb(rss_after),
+        "errors": dict(stats.errors),
+    }
+
+
+def _mb(value: Optional[int]) -> Optional[float]:
+    return round(value / 2**20, 1) if value is not None else None
+
+
+COMPARE_KEYS = ("calls_completed", "rooms_per_s", "messages_per_s", "previews_per_s", "relay_p50_ms",
+                "relay_p99_ms", "setup_p50_ms", "setup_p99_ms", "rss_peak_mb")
+
+
+def compare(paths: List[str]) -> None:
+    runs = [load_result(path) for path in paths]
+    labels = [f"{run['commit']} {run['timestamp'][-6:]}" for run in runs]
+    print(f"{'':<16}" + "".join(f"{label:>20}" for label in labels))
+    for key in COMPARE_KEYS:
+        values = [run["results"].get(key) for run in runs]
+        cells = []
+        for index, value in enumerate(values):
+            cell = "-" if value is None else f"{value:g}"
+            if index and value is not None and values[0]:
+                cell += f" ({(value - values[0]) / values[0] * 100:+.0f}%)"
+            cells.append(f"{cell:>20}")
+        print(f"{key:<16}" + "".join(cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--server-pid", type=int, help="pid of the server behind --url, for its RSS")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="calls in progress at once")
+    parser.add_argument("--candidates", type=int, default=12, help="ICE candidates per peer")
+    parser.add_argument("--previews", type=int, default=2, help="preview uploads per peer")
+    parser.add_argument("--preview-bytes", type=int, default=20_000)
+    parser.add_argument("--hold", type=float, default=0.0, help="seconds each call stays up after setup")
+    parser.add_argument("--subprotocol", nargs="*", default=[],
+                        help="offered subprotocols, e.g. webcall.msgpack+zdict1 webcall.msgpack")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-step timeout of a call")
+    parser.add_argument("--log-level", default="WARNING", help="server log level for in-process runs")
+    parser.add_argument("--save", action="store_true", help=f"write results to {RESULTS_DIR}")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT", help="print saved results side by side and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if not args.url:
+        # Per-join INFO lines would dominate an in-process profile
+        logging.getLogger("webcall").setLevel(args.log_level)
+        logging.getLogger("webcall.connection").setLevel(args.log_level)
+
+    results = asyncio.run(run(args))
+    for key, value in results.items():
+        print(f"{key:<22} {value}")
+    if args.save:
+        params = {key: value for key, value in vars(args).items() if key not in ("save", "compare")}
+        print(f"\nsaved to {save_result('loadgen', params, results)}")
+
+
+if __name__ == "__main__":
+    main()
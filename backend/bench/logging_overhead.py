@@ -0,0 +1,83 @@
+"""Cost of a log call on the event loop thread.
+
+Compares, per call: a disabled DEBUG line with an f-string vs %-style
+arguments, and an enabled INFO line written synchronously by a
+StreamHandler vs handed to the app.logs queue pipeline. Formatting still
+takes CPU (and the GIL) on the listener thread, so with a fast sink the two
+cost about the same; the difference is a slow sink - a stderr pipe nobody
+drains fast enough, a busy disk - which stalls the caller only when the
+handler is synchronous. Run from the backend directory:
+
+    python -m bench.logging_overhead
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import logging
+import os
+import time
+
+from app.logs import TEXT_FORMAT, JsonFormatter, setup_logging
+
+
+def per_call_ns(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+class SlowSink(io.StringIO):
+    """A stream whose every write blocks for `delay` seconds."""
+
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return len(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200_000)
+    parser.add_argument("--sink-delay-us", type=float, default=100, help="per-write delay of the slow sink")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("webcall.bench")
+    token, peer = "q8KpW3xYb1cN5mT0vZrA2g", "peer-1"
+    extra = {"token": token, "peer": peer}
+    results = []
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    results.append(("debug off, f-string", per_call_ns(
+        lambda: logger.debug(f"Message queued for peer {peer} in room {token}"), args.n)))
+    results.append(("debug off, lazy", per_call_ns(
+        lambda: logger.debug("Message queued for peer %s in room %s", peer, token, extra=extra), args.n)))
+
+    def info():
+        logger.info("Peer joined: token=%s, peer=%s", token, peer, extra=extra)
+
+    slow_n = max(1, args.n // 50)
+    with open(os.devnull, "w") as devnull:
+        for label, stream, n in (("devnull", devnull, args.n), ("slow sink", SlowSink(args.sink_delay_us / 1e6), slow_n)):
+            for fmt, formatter in (("text", logging.Formatter(TEXT_FORMAT)), ("json", JsonFormatter())):
+                handler = logging.StreamHandler(stream)
+                handler.setFormatter(formatter)
+                root.handlers[:] = [handler]
+                results.append((f"info sync {fmt}, {label}", per_call_ns(info, n)))
+
+            pipeline = setup_logging("INFO", "json", queue_size=n + 1, sample_per_second=0, stream=stream)
+            results.append((f"info queued json, {label}", per_call_ns(info, n)))
+            pipeline.stop()
+
+    print(f"{'call':<32} {'ns/call':>8}")
+    for label, ns in results:
+        print(f"{label:<32} {ns:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
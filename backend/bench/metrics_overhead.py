@@ -0,0 +1,68 @@
+"""Hot-path cost of the metrics subsystem.
+
+What one relayed message adds with metrics on: a perf_counter() at receive,
+a histogram observation after the fan-out, another for the relay latency and
+a counter increment. Also reports how long a scrape takes. Run from the
+backend directory:
+
+    python -m bench.metrics_overhead
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.metrics import Registry
+
+TYPES = ("offer", "answer", "candidate", "bye", "orientation")
+
+
+def per_call_ns(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter("messages_total", "", ("type", "result"))
+    histogram = registry.histogram("relay_enqueue_seconds", "", ("type",))
+    fanout = registry.histogram("fanout_seconds", "")
+    registry.gauge("peers", "", lambda: 20_000)
+
+    perf_counter = time.perf_counter
+
+    def per_message():
+        received_at = perf_counter()
+        started = perf_counter()
+        fanout.observe(perf_counter() - started)
+        histogram.observe(perf_counter() - received_at, "candidate")
+        counter.inc("candidate", "ok")
+
+    baseline = per_call_ns(lambda: None, args.n)
+    results = [
+        ("Counter.inc", per_call_ns(lambda: counter.inc("offer", "ok"), args.n)),
+        ("Histogram.observe", per_call_ns(lambda: histogram.observe(0.0004, "offer"), args.n)),
+        ("perf_counter()", per_call_ns(perf_counter, args.n)),
+        ("all per message", per_call_ns(per_message, args.n)),
+    ]
+    print(f"{'operation':<20} {'ns/call':>8}   (empty call: {baseline:.0f} ns, subtracted)")
+    for label, ns in results:
+        print(f"{label:<20} {ns - baseline:>8.0f}")
+
+    for kind in TYPES:
+        counter.inc(kind, "error")
+        histogram.observe(0.002, kind)
+    started = time.perf_counter()
+    text = registry.render()
+    print(f"\nrender: {(time.perf_counter() - started) * 1e6:.0f} µs, {len(text)} bytes, "
+          f"{text.count(chr(10))} lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Realistic signaling payloads shared by the benchmarks."""
+from __future__ import annotations
+
+import random
+
+_AUDIO_CODECS = [
+    (111, "opus/48000/2", "minptime=10;useinbandfec=1"),
+    (63, "red/48000/2", "111/111"),
+    (9, "G722/8000", None),
+    (0, "PCMU/8000", None),
+    (8, "PCMA/8000", None),
+    (13, "CN/8000", None),
+    (110, "telephone-event/48000", None),
+    (126, "telephone-event/8000", None),
+]
+_VIDEO_CODECS = [
+    (96, "VP8/90000"), (98, "VP9/90000"), (100, "VP9/90000"), (102, "H264/90000"),
+    (104, "H264/90000"), (106, "H264/90000"), (108, "H264/90000"), (112, "H264/90000"),
+    (35, "AV1/90000"), (45, "AV1/90000"), (127, "H264/90000"), (39, "H264/90000"),
+]
+_EXTMAPS = [
+    "urn:ietf:params:rtp-hdrext:toffset",
+    "http://www.webrtc.org/experiments/rtp-hdrext/abs-send-time",
+    "urn:3gpp:video-orientation",
+    "http://www.ietf.org/id/draft-holmer-rmcat-transport-wide-cc-extensions-01",
+    "http://www.webrtc.org/experiments/rtp-hdrext/playout-delay",
+    "http://www.webrtc.org/experiments/rtp-hdrext/video-content-type",
+    "http://www.webrtc.org/experiments/rtp-hdrext/video-timing",
+    "http://www.webrtc.org/experiments/rtp-hdrext/color-space",
+    "urn:ietf:params:rtp-hdrext:sdes:mid",
+    "urn:ietf:params:rtp-hdrext:sdes:rtp-stream-id",
+    "urn:ietf:params:rtp-hdrext:sdes:repaired-rtp-stream-id",
+]
+
+
+def _rand_token(rng: random.Random, length: int) -> str:
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+/"
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+def make_sdp(kind: str = "offer", seed: int = 0) -> str:
+    """A Chrome-like audio+video SDP, about 6 KB."""
+    rng = random.Random(seed)
+    session = rng.randrange(10**18)
+    ufrag, pwd = _rand_token(rng, 4), _rand_token(rng, 24)
+    fingerprint = ":".join(f"{rng.randrange(256):02X}" for _ in range(32))
+    setup = "actpass" if kind == "offer" else "active"
+    lines = [
+        "v=0", f"o=- {session} 2 IN IP4 127.0.0.1", "s=-", "t=0 0",
+        "a=group:BUNDLE 0 1", "a=extmap-allow-mixed", "a=msid-semantic: WMS stream",
+    ]
+    for mid, media in enumerate(("audio", "video")):
+        pts = [c[0] for c in (_AUDIO_CODECS if media == "audio" else _VIDEO_CODECS)]
+        lines += [
+            f"m={media} 9 UDP/TLS/RTP/SAVPF {' '.join(map(str, pts))}",
+            "c=IN IP4 0.0.0.0", "a=rtcp:9 IN IP4 0.0.0.0",
+            f"a=ice-ufrag:{ufrag}", f"a=ice-pwd:{pwd}", "a=ice-options:trickle",
+            f"a=fingerprint:sha-256 {fingerprint}", f"a=setup:{setup}", f"a=mid:{mid}",
+        ]
+        for ext_id, uri in enumerate(_EXTMAPS, start=1):
+            lines.append(f"a=extmap:{ext_id} {uri}")
+        lines += ["a=sendrecv", f"a=msid:stream {_rand_token(rng, 36)}", "a=rtcp-mux"]
+        if media == "audio":
+            for pt, name, fmtp in _AUDIO_CODECS:
+                lines.append(f"a=rtpmap:{pt} {name}")
+                if pt == 111:
+                    lines.append(f"a=rtcp-fb:{pt} transport-cc")
+                if fmtp:
+                    lines.append(f"a=fmtp:{pt} {fmtp}")
+        else:
+            lines.append("a=rtcp-rsize")
+            for pt, name in _VIDEO_CODECS:
+                lines.append(f"a=rtpmap:{pt} {name}")
+                for fb in ("goog-remb", "transport-cc", "ccm fir", "nack", "nack pli"):
+                    lines.append(f"a=rtcp-fb:{pt} {fb}")
+                if name.startswith("H264"):
+                    lines.append(f"a=fmtp:{pt} level-asymmetry-allowed=1;packetization-mode=1;"
+                                 f"profile-level-id=42e01f")
+                lines += [f"a=rtpmap:{pt + 1} rtx/90000", f"a=fmtp:{pt + 1} apt={pt}"]
+        ssrc = rng.randrange(2**32)
+        lines += [f"a=ssrc:{ssrc} cname:{_rand_token(rng, 16)}", f"a=ssrc:{ssrc} msid:stream track{mid}"]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def sdp_message(kind: str = "offer", peer_id: str = "peer-a", seed: int = 0) -> dict:
+    return {"type": kind, "peerId": peer_id, "sdp": {"type": kind, "sdp": make_sdp(kind, seed)}}
+
+
+def candidate_message(peer_id: str = "peer-a", index: int = 0) -> dict:
+    port = 50000 + index
+    return {
+        "type": "candidate",
+        "peerId": peer_id,
+        "candidate": {
+            "candidate": f"candidate:{1000 + index} 1 udp 2122260223 192.168.1.{index % 250 + 2} {port} "
+                         f"typ host generation 0 ufrag abcd network-id 1",
+            "sdpMid": str(index % 2),
+            "sdpMLineIndex": index % 2,
+        },
+    }
@@ -0,0 +1,77 @@
+"""Per-upload cost of the admin preview store: full-scan cleanup vs PreviewCache.
+
+Every peer uploads one thumbnail per round, as the frontend does once per
+second. Run from the backend directory:
+
+    python -m bench.preview_cache --peers 1000 10000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from app.previews import PreviewCache
+
+TTL_SECONDS = 120
+
+
+class ScanStore:
+    """The previous dict-of-dicts store with _cleanup_previews() on every request."""
+
+    def __init__(self) -> None:
+        self.previews = {}
+
+    def cleanup(self) -> None:
+        now = time.time()
+        for token, peers in list(self.previews.items()):
+            for pid, meta in list(peers.items()):
+                if now - float(meta.get("ts", 0)) > TTL_SECONDS:
+                    del peers[pid]
+            if not peers:
+                del self.previews[token]
+
+    def put(self, token: str, peer_id: str, data: bytes, media_type: str) -> None:
+        self.cleanup()
+        self.previews.setdefault(token, {})[peer_id] = {
+            "bytes": data, "type": media_type, "ts": time.time(), "size": len(data)}
+
+    def get(self, token: str, peer_id: str):
+        self.cleanup()
+        return self.previews.get(token, {}).get(peer_id)
+
+
+def run(store, peers: int, rounds: int, data: bytes) -> float:
+    keys = [(f"room{i // 2}", f"peer{i}") for i in range(peers)]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for token, peer_id in keys:
+            store.put(token, peer_id, data, "image/jpeg")
+            store.get(token, peer_id)
+    return (time.perf_counter() - started) / (rounds * peers) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--peers", type=int, nargs="*", default=[1000, 10000])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--image-bytes", type=int, default=20_000)
+    args = parser.parse_args()
+
+    data = bytes(args.image_bytes)
+    for peers in args.peers:
+        print(f"\npeers={peers}")
+        scan_rounds = max(1, min(args.rounds, 2_000_000 // (peers * peers) or 1))
+        scan = run(ScanStore(), peers, scan_rounds, data)
+        print(f"  {'full scan per request':<26} {scan:>10.1f} µs per upload+get")
+        cache = PreviewCache(max_bytes=peers * args.image_bytes, ttl_seconds=TTL_SECONDS)
+        lru = run(cache, peers, args.rounds, data)
+        print(f"  {'PreviewCache':<26} {lru:>10.1f} µs per upload+get  x{scan / lru:.0f}")
+        budget = PreviewCache(max_bytes=peers * args.image_bytes // 2, ttl_seconds=TTL_SECONDS)
+        run(budget, peers, args.rounds, data)
+        stats = budget.stats()
+        print(f"  half budget: {stats['entries']} entries, {stats['bytes']} bytes, "
+              f"{stats['evictions']} evictions, hit ratio {stats['hit_ratio']}")
+
+
+if __name__ == "__main__":
+    main()
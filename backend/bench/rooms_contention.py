@@ -0,0 +1,87 @@
+"""p99 latency of RoomStore.get_room while cleanup() sweeps the store.
+
+Run from the backend directory:
+
+    python -m bench.rooms_contention --rooms 50000 --shards 64
+    python -m bench.rooms_contention --rooms 50000 --shards 1   # single-lock baseline
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from app.rooms import RoomStore
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(rooms: int, shards: int, expired_ratio: float, lookups: int) -> dict:
+    store = RoomStore(shards=shards)
+    tokens = []
+    for i in range(rooms):
+        room = await store.create_room(ttl_seconds=0 if i < rooms * expired_ratio else None)
+        tokens.append(room.token)
+
+    latencies = []
+    cleanup_done = asyncio.Event()
+
+    async def sweeper():
+        started = time.perf_counter()
+        await store.cleanup()
+        cleanup_done.set()
+        return time.perf_counter() - started
+
+    async def reader():
+        count = 0
+        while count < lookups or not cleanup_done.is_set():
+            token = random.choice(tokens)
+            started = time.perf_counter()
+            # Yield first, as a request handler would: the measured latency then
+            # includes any time the event loop spends inside a cleanup sweep.
+            await asyncio.sleep(0)
+            await store.get_room(token)
+            latencies.append(time.perf_counter() - started)
+            count += 1
+
+    readers = [asyncio.create_task(reader()) for _ in range(8)]
+    await asyncio.sleep(0)
+    cleanup_seconds = await sweeper()
+    await asyncio.gather(*readers)
+
+    return {
+        "rooms": rooms,
+        "shards": shards,
+        "remaining": len(store),
+        "cleanup_ms": cleanup_seconds * 1000,
+        "lookups": len(latencies),
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "max_us": max(latencies) * 1e6,
+        "mean_us": statistics.fmean(latencies) * 1e6,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=50_000)
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--expired-ratio", type=float, default=0.5)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.rooms, args.shards, args.expired_ratio, args.lookups))
+    for key, value in result.items():
+        print(f"{key:>10}: {value:.1f}" if isinstance(value, float) else f"{key:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Bytes per room held by RoomStore, idle and after a join.
+
+Run from the backend directory:
+
+    python -m bench.rooms_memory                  # 100k and 1M rooms
+    python -m bench.rooms_memory --rooms 250000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from app.rooms import RoomStore
+
+
+@dataclass
+class _LegacyPeer:
+    peer_id: str
+    connected_at: float = 0.0
+
+
+@dataclass
+class _LegacyRoom:
+    # Layout of Room before the compact representation, kept for comparison
+    token: str
+    created_at: float
+    expires_at: float
+    max_participants: int = 2
+    peers: Dict[str, _LegacyPeer] = field(default_factory=dict)
+    last_empty_since: Optional[float] = None
+
+
+def _measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def store_bytes(rooms: int, joined_ratio: float) -> int:
+    async def build():
+        store = RoomStore()
+        joined = int(rooms * joined_ratio)
+        for i in range(rooms):
+            room = await store.create_room()
+            if i < joined:
+                room.join("peer-a")
+        return store
+
+    return _measure(lambda: asyncio.run(build()))
+
+
+def legacy_bytes(rooms: int) -> int:
+    def build():
+        store = RoomStore()
+        for shard_index in range(rooms):
+            token = RoomStore._generate_token()
+            store._shard(token).rooms[token] = _LegacyRoom(token, 0.0, float(shard_index))
+        return store
+
+    return _measure(build)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, nargs="*", default=[100_000, 1_000_000])
+    parser.add_argument("--joined-ratio", type=float, default=0.01,
+                        help="share of rooms with one connected peer")
+    args = parser.parse_args()
+
+    print(f"{'rooms':>10} {'legacy B/room':>14} {'idle B/room':>12} {'mixed B/room':>13}")
+    for rooms in args.rooms:
+        legacy = legacy_bytes(rooms) / rooms
+        idle = store_bytes(rooms, 0.0) / rooms
+        mixed = store_bytes(rooms, args.joined_ratio) / rooms
+        print(f"{rooms:>10} {legacy:>14.1f} {idle:>12.1f} {mixed:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
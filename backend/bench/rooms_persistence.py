@@ -0,0 +1,99 @@
+"""SQLiteRoomStore: create throughput, warm-restart time and cold lookups.
+
+Run from the backend directory:
+
+    python -m bench.rooms_persistence --rooms 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from app.persistence import SQLiteRoomStore
+from app.rooms import RoomStore
+
+
+async def create_throughput(store: RoomStore, count: int) -> tuple:
+    """Rooms/s as seen by request handlers, and rooms/s until everything is on disk."""
+    started = time.perf_counter()
+    for i in range(count):
+        await store.create_room()
+        if i % 100 == 0:
+            # Let background flushes interleave, as they would between requests
+            await asyncio.sleep(0)
+    created = time.perf_counter()
+    if isinstance(store, SQLiteRoomStore):
+        await store.flush()
+    durable = time.perf_counter()
+    return count / (created - started), count / (durable - started)
+
+
+def seed(path: str, rooms: int) -> list:
+    # Bulk-load directly; going through the store would only measure create_room again
+    now = time.time()
+    tokens = [RoomStore._generate_token() for _ in range(rooms)]
+    store = SQLiteRoomStore(path)
+    store._writer.executemany("INSERT INTO rooms VALUES (?, ?, ?, ?)",
+                              ((token, now, now + 86400, 2) for token in tokens))
+    store._reader.close()
+    store._writer.close()
+    return tokens
+
+
+async def restart(path: str, tokens: list, lookups: int) -> dict:
+    started = time.perf_counter()
+    store = SQLiteRoomStore(path)
+    assert await store.get_room(tokens[0]) is not None
+    startup = time.perf_counter() - started
+
+    latencies = []
+    for token in random.sample(tokens, min(lookups, len(tokens))):
+        t0 = time.perf_counter()
+        await store.get_room(token)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    await store.close()
+    return {
+        "startup_ms": startup * 1000,
+        "cold_get_p50_us": latencies[len(latencies) // 2] * 1e6,
+        "cold_get_p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+async def run(rooms: int, creates: int, lookups: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rooms.db")
+
+        memory_rate, _ = await create_throughput(RoomStore(), creates)
+        sqlite_store = SQLiteRoomStore(os.path.join(tmp, "throughput.db"))
+        sqlite_store.start_cleanup()
+        sqlite_rate, durable_rate = await create_throughput(sqlite_store, creates)
+        await sqlite_store.close()
+        print(f"create_room, in-memory : {memory_rate:>10.0f} rooms/s")
+        print(f"create_room, sqlite    : {sqlite_rate:>10.0f} rooms/s")
+        print(f"  committed to disk    : {durable_rate:>10.0f} rooms/s")
+
+        tokens = seed(path, rooms)
+        size = sqlite3.connect(path).execute("SELECT count(*) FROM rooms").fetchone()[0]
+        result = await restart(path, tokens, lookups)
+        print(f"warm restart with {size} rooms:")
+        for key, value in result.items():
+            print(f"  {key:>16}: {value:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=1_000_000)
+    parser.add_argument("--creates", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.rooms, args.creates, args.lookups))
+
+
+if __name__ == "__main__":
+    main()
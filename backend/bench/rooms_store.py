@@ -0,0 +1,190 @@
+"""RoomStore microbenchmarks at increasing room counts.
+
+Every number is microseconds per operation (lower is better), measured on a
+store already holding N rooms:
+
+* create          - create_room() (includes token generation)
+* create_token    - create_room_with_token() with a new token
+* recreate_token  - create_room_with_token() over an existing room
+* get_hit/get_miss - get_room() for an existing / unknown token
+* join_leave      - room.lock + Room.join() of two peers, then leave() of both
+* cleanup@R       - cleanup() with a share R of the rooms expired, per
+                    expired room (cleanup@0 is the whole sweep with nothing
+                    due, in µs)
+* contention      - per operation, C coroutines joining and leaving a small
+                    set of hot rooms under room.lock, awaiting inside the
+                    lock as handle_join_message does, while create/get
+                    traffic and a cleanup() sweep run alongside
+
+Run from the backend directory:
+
+    python -m bench.rooms_store                               # 10k, 100k, 1M rooms
+    python -m bench.rooms_store --rooms 100000 --save
+    python -m bench.rooms_store --rooms 100000 --baseline bench/results/rooms_store-<commit>-<time>.json
+
+--baseline compares with a saved run and exits with status 1 if any metric
+got more than --tolerance slower.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from app.rooms import ROOM_STORE_SHARDS_DEFAULT, RoomStore
+from bench.history import load_result, save_result
+from bench.rooms_contention import percentile
+
+
+async def _filled(rooms: int, shards: int, expired_ratio: float = 0.0) -> RoomStore:
+    store = RoomStore(shards=shards)
+    expired = int(rooms * expired_ratio)
+    for i in range(rooms):
+        await store.create_room_with_token(f"room-{i}", ttl_seconds=0 if i < expired else None)
+    return store
+
+
+async def _per_op(ops: int, fn: Callable[[int], Any]) -> float:
+    """µs per awaited fn(i), i in range(ops)."""
+    gc.collect()
+    started = time.perf_counter()
+    for i in range(ops):
+        await fn(i)
+    return (time.perf_counter() - started) / ops * 1e6
+
+
+async def bench_operations(rooms: int, shards: int, ops: int) -> Dict[str, float]:
+    store = await _filled(rooms, shards)
+    rng = random.Random(rooms)
+    existing = [f"room-{rng.randrange(rooms)}" for _ in range(ops)]
+    results: Dict[str, float] = {}
+
+    results["create"] = await _per_op(ops, lambda i: store.create_room())
+    results["create_token"] = await _per_op(ops, lambda i: store.create_room_with_token(f"new-{i}"))
+    results["recreate_token"] = await _per_op(ops, lambda i: store.create_room_with_token(existing[i]))
+    results["get_hit"] = await _per_op(ops, lambda i: store.get_room(existing[i]))
+    results["get_miss"] = await _per_op(ops, lambda i: store.get_room(f"missing-{i}"))
+
+    targets = [store._shard(token).rooms[token] for token in existing]
+
+    async def join_leave(i: int) -> None:
+        room = targets[i]
+        async with room.lock:
+            room.join("peer-a")
+            room.join("peer-b")
+        async with room.lock:
+            room.leave("peer-a")
+            room.leave("peer-b")
+
+    results["join_leave"] = await _per_op(ops, join_leave)
+    return results
+
+
+async def bench_cleanup(rooms: int, shards: int, ratio: float) -> float:
+    store = await _filled(rooms, shards, ratio)
+    gc.collect()
+    started = time.perf_counter()
+    removed = await store.cleanup()
+    elapsed = (time.perf_counter() - started) * 1e6
+    return elapsed / removed if removed else elapsed
+
+
+async def bench_contention(rooms: int, shards: int, coroutines: int, ops: int, hot_rooms: int) -> Dict[str, float]:
+    store = await _filled(rooms, shards, expired_ratio=0.1)
+    # The tail of the range: _filled() expires rooms from the start
+    hot = [store._shard(f"room-{i}").rooms[f"room-{i}"] for i in range(rooms - hot_rooms, rooms)]
+    latencies: List[float] = []
+    per_coroutine = max(1, ops // coroutines)
+
+    async def caller(index: int) -> None:
+        rng = random.Random(index)
+        for n in range(per_coroutine):
+            started = time.perf_counter()
+            if n % 4 == 0:
+                await store.create_room_with_token(f"c{index}-{n}")
+            elif n % 4 == 1:
+                await store.get_room(f"room-{rng.randrange(rooms)}")
+            else:
+                room = hot[rng.randrange(len(hot))]
+                async with room.lock:
+                    room.join(f"p{index}")
+                    # handle_join_message awaits backplane.claim() while holding the lock
+                    await asyncio.sleep(0)
+                async with room.lock:
+                    room.leave(f"p{index}")
+            latencies.append(time.perf_counter() - started)
+
+    gc.collect()
+    started = time.perf_counter()
+    await asyncio.gather(store.cleanup(), *(caller(i) for i in range(coroutines)))
+    elapsed = time.perf_counter() - started
+    return {
+        "contention": elapsed / len(latencies) * 1e6,
+        "contention_p99": percentile(latencies, 99) * 1e6,
+    }
+
+
+async def run(args) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for rooms in args.rooms:
+        ops = min(args.ops, rooms)
+        measured = await bench_operations(rooms, args.shards, ops)
+        for ratio in args.expired_ratios:
+            measured[f"cleanup@{ratio:g}"] = await bench_cleanup(rooms, args.shards, ratio)
+        measured.update(await bench_contention(rooms, args.shards, args.coroutines, ops, args.hot_rooms))
+        _print_row(rooms, measured)
+        results.update({f"{name}/{rooms}": round(value, 3) for name, value in measured.items()})
+    return results
+
+
+_header_printed = False
+
+
+def _print_row(rooms: int, measured: Dict[str, float]) -> None:
+    global _header_printed
+    if not _header_printed:
+        print(f"{'rooms':>9} " + " ".join(f"{name:>14}" for name in measured) + "   (µs/op)")
+        _header_printed = True
+    print(f"{rooms:>9} " + " ".join(f"{value:>14.2f}" for value in measured.values()))
+
+
+def check_baseline(path: str, results: Dict[str, float], tolerance: float) -> bool:
+    baseline = load_result(path)["results"]
+    regressions = []
+    for key, value in results.items():
+        before = baseline.get(key)
+        if before and value > before * (1 + tolerance):
+            regressions.append((key, before, value))
+    print(f"\nvs {path}: {len(regressions)} regression(s) beyond {tolerance:.0%}")
+    for key, before, value in regressions:
+        print(f"  {key:<28} {before:>10.2f} -> {value:>10.2f} µs ({(value - before) / before:+.0%})")
+    return not regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--shards", type=int, default=ROOM_STORE_SHARDS_DEFAULT)
+    parser.add_argument("--ops", type=int, default=20_000, help="operations per measurement")
+    parser.add_argument("--expired-ratios", type=float, nargs="*", default=[0.0, 0.1, 0.5, 1.0])
+    parser.add_argument("--coroutines", type=int, default=1000, help="concurrent callers in the contention run")
+    parser.add_argument("--hot-rooms", type=int, default=16, help="rooms the contention run joins and leaves")
+    parser.add_argument("--save", action="store_true", help="save results under bench/results/")
+    parser.add_argument("--baseline", help="saved run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs --baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.save:
+        params = {key: value for key, value in vars(args).items() if key not in ("save", "baseline")}
+        print(f"\nsaved to {save_result('rooms_store', params, results)}")
+    if args.baseline and not check_baseline(args.baseline, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
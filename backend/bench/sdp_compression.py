@@ -0,0 +1,129 @@
+"""Bytes on the wire and CPU per message for signaling compression variants.
+
+Replays what one receiver gets during call setup (room-info, peer-joined, an
+offer, a burst of trickle-ICE candidates) through:
+
+* none       - the frame as is
+* pmd        - permessage-deflate as browsers negotiate it by default
+               (raw deflate, context takeover, no dictionary)
+* pmd-nct    - permessage-deflate with no_context_takeover (fresh per message)
+* zdict      - DeflateContext: context takeover + preset SDP dictionary
+
+Run from the backend directory:
+
+    python -m bench.sdp_compression --format json msgpack
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import zlib
+from typing import Callable, List
+
+from app.codec import JsonCodec, MsgpackCodec, msgpack
+from app.compression import DEFLATE_LEVEL_DEFAULT, DeflateContext
+from bench.payloads import candidate_message, sdp_message
+
+_SYNC_TAIL = b"\x00\x00\xff\xff"
+
+
+def call_setup(kind: str, seed: int) -> List[dict]:
+    messages = [
+        {"type": "room-info", "peers": ["peer-a"], "max": 2, "timestamp": "2026-01-01T00:00:00.000000"},
+        {"type": "peer-joined", "peerId": "peer-a", "timestamp": "2026-01-01T00:00:00.000000"},
+        sdp_message(kind, "peer-a", seed),
+    ]
+    messages += [candidate_message("peer-a", index) for index in range(12)]
+    return messages
+
+
+def make_pmd(level: int, takeover: bool) -> Callable[[], Callable[[bytes], bytes]]:
+    def session():
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+
+        def compress(data: bytes) -> bytes:
+            nonlocal compressor
+            if not takeover:
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            return out[:-4] if out.endswith(_SYNC_TAIL) else out
+        return compress
+    return session
+
+
+def make_zdict(level: int) -> Callable[[], Callable[[bytes], bytes]]:
+    def session():
+        return DeflateContext(level).compress
+    return session
+
+
+def make_none() -> Callable[[], Callable[[bytes], bytes]]:
+    def session():
+        return lambda data: data
+    return session
+
+
+def measure(session_factory, frames: List[bytes], sessions: int):
+    """(bytes per frame position, compress µs per frame, decompress µs per frame)."""
+    wire = [0] * len(frames)
+    started = time.perf_counter()
+    for _ in range(sessions):
+        compress = session_factory()
+        for index, frame in enumerate(frames):
+            wire[index] += len(compress(frame))
+    compress_us = (time.perf_counter() - started) / (sessions * len(frames)) * 1e6
+    return [size // sessions for size in wire], compress_us
+
+
+def measure_decompress(session_factory, frames: List[bytes], sessions: int, zdict: bool) -> float:
+    compress = session_factory()
+    wire = [compress(frame) for frame in frames]
+    started = time.perf_counter()
+    for _ in range(sessions):
+        if zdict:
+            decompress = DeflateContext().decompress
+        else:
+            decompressor = zlib.decompressobj(-15)
+
+            def decompress(data: bytes) -> bytes:
+                return decompressor.decompress(data + _SYNC_TAIL)
+        for frame in wire:
+            decompress(frame)
+    return (time.perf_counter() - started) / (sessions * len(frames)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", nargs="*", default=["json", "msgpack"], choices=["json", "msgpack"])
+    parser.add_argument("--level", type=int, default=DEFLATE_LEVEL_DEFAULT)
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    for fmt in args.format:
+        if fmt == "msgpack" and msgpack is None:
+            print("\nmsgpack is not installed, skipping")
+            continue
+        encode = MsgpackCodec.dumps if fmt == "msgpack" else (lambda m: JsonCodec.dumps(m).encode("utf-8"))
+        for kind in ("offer", "answer"):
+            frames = [encode(message) for message in call_setup(kind, seed=7)]
+            sdp_index = 2
+            print(f"\n{fmt} / {kind}: {sum(map(len, frames))} bytes in {len(frames)} frames "
+                  f"({len(frames[sdp_index])} byte SDP)")
+            print(f"  {'variant':<9} {'sdp B':>7} {'setup B':>8} {'ratio':>6} {'comp µs':>8} {'decomp µs':>9}")
+            variants = [
+                ("none", make_none(), None),
+                ("pmd", make_pmd(args.level, True), False),
+                ("pmd-nct", make_pmd(args.level, False), False),
+                ("zdict", make_zdict(args.level), True),
+            ]
+            total_raw = sum(map(len, frames))
+            for label, factory, zdict in variants:
+                wire, compress_us = measure(factory, frames, args.sessions)
+                decompress_us = (measure_decompress(factory, frames, args.sessions, zdict)
+                                 if zdict is not None else 0.0)
+                print(f"  {label:<9} {wire[sdp_index]:>7} {sum(wire):>8} {sum(wire) / total_raw:>6.3f} "
+                      f"{compress_us:>8.1f} {decompress_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Relay throughput for large SDP messages: per-recipient json.dumps vs encode-once codec vs raw relay.
+
+Run from the backend directory:
+
+    python -m bench.signaling_codec --recipients 1 4
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from app.codec import JsonCodec, OrjsonCodec, orjson
+from app.models import SDPMessage, signal_message_adapter
+from bench.payloads import sdp_message
+
+
+def relay_before(raw: str, recipients: int) -> None:
+    data = json.loads(raw)
+    payload = SDPMessage(**data).model_dump()
+    for _ in range(recipients):
+        json.dumps(payload)
+
+
+def make_relay_after(codec):
+    def relay(raw: str, recipients: int) -> None:
+        data = codec.loads(raw)
+        payload = SDPMessage(**data).model_dump()
+        text = codec.dumps(payload)
+        for _ in range(recipients):
+            # enqueueing the same str object is all that is left per recipient
+            assert text
+    return relay
+
+
+def make_relay_raw(codec):
+    def relay(raw: str, recipients: int) -> None:
+        # SIGNAL_VALIDATION=relay: validate once, forward the inbound frame as is
+        data = codec.loads(raw)
+        signal_message_adapter.validate_python(data)
+        for _ in range(recipients):
+            assert raw
+    return relay
+
+
+def measure(relay, frames, recipients: int, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for raw in frames:
+            relay(raw, recipients)
+        count += len(frames)
+    return count / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, nargs="*", default=[1, 4])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    frames = [json.dumps(sdp_message("offer" if i % 2 == 0 else "answer", seed=i)) for i in range(32)]
+    print(f"payload ~{sum(map(len, frames)) // len(frames)} bytes")
+    variants = [("before: json per recipient", relay_before),
+                ("after:  json encode-once", make_relay_after(JsonCodec))]
+    if orjson is not None:
+        variants.append(("after:  orjson encode-once", make_relay_after(OrjsonCodec)))
+    variants.append(("relay:  json, raw frame", make_relay_raw(JsonCodec)))
+    if orjson is not None:
+        variants.append(("relay:  orjson, raw frame", make_relay_raw(OrjsonCodec)))
+
+    for recipients in args.recipients:
+        baseline = None
+        print(f"\nrecipients={recipients}")
+        for label, relay in variants:
+            rate = measure(relay, frames, recipients, args.seconds)
+            baseline = baseline or rate
+            print(f"  {label:<28} {rate:>10.0f} msg/s  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
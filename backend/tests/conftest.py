@@ -0,0 +1,96 @@
+"""Fixtures that run the server as real processes: a backplane broker and uvicorn workers.
+
+Run from the backend directory:
+
+    python -m pytest -q tests
+"""
+from __future__ import annotations
+
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_TIMEOUT_SECONDS = 15.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until(ready: Callable[[], bool], process: subprocess.Popen, what: str) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{what} exited with {process.returncode}")
+        if ready():
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"{what} did not start in {STARTUP_TIMEOUT_SECONDS}s")
+
+
+def _healthy(port: int) -> bool:
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+class Processes:
+    def __init__(self, tmp_path) -> None:
+        self.tmp_path = tmp_path
+        self._running: List[subprocess.Popen] = []
+
+    def _spawn(self, args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+        process = subprocess.Popen(
+            [sys.executable, *args], cwd=BACKEND_DIR,
+            env={**os.environ, "LOG_FORMAT": "text", **env},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self._running.append(process)
+        return process
+
+    def broker(self) -> str:
+        path = str(self.tmp_path / "backplane.sock")
+        process = self._spawn(["-m", "app.backplane", "--socket", path], {})
+        _wait_until(lambda: os.path.exists(path), process, "backplane broker")
+        return path
+
+    def worker(self, env: Optional[Dict[str, str]] = None) -> "Worker":
+        port = free_port()
+        process = self._spawn(["-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+                              env or {})
+        _wait_until(lambda: _healthy(port), process, f"uvicorn on port {port}")
+        return Worker(port, process)
+
+    def stop(self) -> None:
+        for process in self._running:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+class Worker:
+    def __init__(self, port: int, process: subprocess.Popen) -> None:
+        self.port = port
+        self.process = process
+        self.http = f"http://127.0.0.1:{port}"
+        self.ws = f"ws://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def processes(tmp_path):
+    running = Processes(tmp_path)
+    try:
+        yield running
+    finally:
+        running.stop()
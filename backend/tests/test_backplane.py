@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import urllib.request
+
+import websockets
+
+
+def _post(url: str) -> dict:
+    request = urllib.request.Request(url, method="POST")
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def _get(url: str) -> dict:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+async def _join(url: str, peer_id: str):
+    ws = await websockets.connect(url)
+    await ws.send(json.dumps({"type": "join", "peerId": peer_id, "role": "offerer"}))
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout=5))
+        if message["type"] in ("room-info", "error"):
+            return ws, message
+
+
+def test_room_capacity_is_shared_between_workers(processes):
+    socket_path = processes.broker()
+    env = {"BACKPLANE_URL": f"unix://{socket_path}", "MESH_ROOMS_ENABLED": "true"}
+    worker_a = processes.worker(env)
+    worker_b = processes.worker(env)
+
+    token = _post(f"{worker_a.http}/api/rooms?maxParticipants=4")["token"]
+
+    async def scenario():
+        joined = []
+        try:
+            for peer_id in ("p1", "p2", "p3"):
+                ws, message = await _join(f"{worker_b.ws}/ws/rooms/{token}", peer_id)
+                joined.append(ws)
+                assert message["type"] == "room-info", message
+                assert message["max"] == 4
+            info = _get(f"{worker_a.http}/api/rooms/{token}")
+            assert info["maxParticipants"] == 4
+            assert info["participants"] == 3
+        finally:
+            for ws in joined:
+                await ws.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import asyncio
+
+import websockets
+
+SUBPROTOCOLS = ["webcall.json+zdict1", "webcall.json"]
+
+
+def test_sdp_dictionary_is_not_stacked_on_permessage_deflate(processes):
+    worker = processes.worker()
+    url = f"{worker.ws}/ws/rooms/compression-room"
+
+    async def negotiated(compression):
+        async with websockets.connect(url, subprotocols=SUBPROTOCOLS, compression=compression) as ws:
+            return ws.subprotocol
+
+    assert asyncio.run(negotiated("deflate")) == "webcall.json"
+    assert asyncio.run(negotiated(None)) == "webcall.json+zdict1"
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.connection import PeerConnection, QueuePolicy
+
+
+class StalledSocket:
+    """A socket whose sends never complete, as with a client that stopped reading."""
+
+    client_state = WebSocketState.CONNECTED
+
+    async def send_text(self, text: str) -> None:
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000, reason=None) -> None:
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+def test_abandon_wakes_a_sender_blocked_on_a_full_queue():
+    async def scenario():
+        conn = PeerConnection(StalledSocket(), max_queue=1, policy=QueuePolicy.block)
+        await conn.send_text("in flight")
+        await asyncio.sleep(0)
+        await conn.send_text("queued")
+        blocked = asyncio.create_task(conn.send_text("waits for space"))
+        await asyncio.sleep(0)
+        assert not blocked.done()
+        conn.abandon()
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(blocked, timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_overflow_closes_the_socket():
+    async def scenario():
+        ws = StalledSocket()
+        conn = PeerConnection(ws, max_queue=1, policy=QueuePolicy.disconnect)
+        await conn.send_text("in flight")
+        await asyncio.sleep(0)
+        await conn.send_text("queued")
+        with pytest.raises(ConnectionError):
+            await conn.send_text("overflow")
+        assert conn._closing is not None
+        await conn._closing
+        assert ws.client_state is WebSocketState.DISCONNECTED
+
+    asyncio.run(scenario())
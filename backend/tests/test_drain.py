@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import signal
+
+import pytest
+import websockets
+
+
+def test_sigterm_sends_reconnect_hint_before_the_server_stops(processes):
+    worker = processes.worker({"DRAIN_RECONNECT_JITTER_MS": "100"})
+
+    async def scenario():
+        async with websockets.connect(f"{worker.ws}/ws/rooms/drain-test-room") as ws:
+            await ws.send(json.dumps({"type": "join", "peerId": "p1", "role": "offerer"}))
+            while json.loads(await asyncio.wait_for(ws.recv(), timeout=5))["type"] != "room-info":
+                pass
+            worker.process.send_signal(signal.SIGTERM)
+            while True:
+                hint = json.loads(await asyncio.wait_for(ws.recv(), timeout=5))
+                if hint["type"] == "reconnect":
+                    break
+            assert 0 <= hint["retryAfterMs"] <= 100
+            with pytest.raises(websockets.ConnectionClosed) as closed:
+                await asyncio.wait_for(ws.recv(), timeout=5)
+            assert closed.value.rcvd.code == 1012
+
+    asyncio.run(scenario())
+    assert worker.process.wait(timeout=10) is not None
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import urllib.request
+
+import websockets
+
+
+async def _receive(ws, msg_type: str) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout=5))
+        if message["type"] == msg_type:
+            return message
+
+
+def test_relay_histogram_only_labels_signaling_types(processes):
+    worker = processes.worker()
+    url = f"{worker.ws}/ws/rooms/metrics-room"
+
+    async def scenario():
+        async with websockets.connect(url) as a, websockets.connect(url) as b:
+            for ws, peer_id in ((a, "a"), (b, "b")):
+                await ws.send(json.dumps({"type": "join", "peerId": peer_id, "role": "offerer"}))
+                await _receive(ws, "room-info")
+            await b.send(json.dumps({"type": "offer", "peerId": "b", "sdp": "v=0"}))
+            await _receive(a, "offer")
+
+    asyncio.run(scenario())
+    with urllib.request.urlopen(f"{worker.http}/metrics", timeout=5) as response:
+        metrics = response.read().decode()
+    relayed = {line.split('type="')[1].split('"')[0] for line in metrics.splitlines()
+               if line.startswith("webcall_relay_enqueue_seconds_count")}
+    # peer-joined from b's join is not a relayed signaling message
+    assert relayed == {"offer"}
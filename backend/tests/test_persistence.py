@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.persistence import SQLiteRoomStore
+from app.rooms import RoomSpec
+
+
+async def _stored_rooms(path) -> list:
+    store = SQLiteRoomStore(str(path))
+    rooms = [await store.create_room_with_token(f"room-{i:04d}", 4) for i in range(3)]
+    await store.close()
+    return rooms
+
+
+def test_rooms_are_loaded_from_disk_after_a_restart(tmp_path):
+    path = tmp_path / "rooms.db"
+
+    async def scenario():
+        stored = await _stored_rooms(path)
+        store = SQLiteRoomStore(str(path))
+        try:
+            assert len(store) == 0
+            room = await store.get_room(stored[0].token)
+            assert room is not None and room.max_participants == 4
+            assert room.expires_at == stored[0].expires_at
+            assert await store.get_room("unknown-token") is None
+            # Bulk creation sees tokens known only on disk as existing
+            results = await store.create_rooms([RoomSpec(r.token, 2, None) for r in stored[1:]] +
+                                               [RoomSpec("room-new", 2, None)])
+            assert [created for _, created in results] == [False, False, True]
+            assert [room.max_participants for room, _ in results] == [4, 4, 2]
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+
+
+def test_room_created_during_a_disk_lookup_wins(tmp_path):
+    path = tmp_path / "rooms.db"
+
+    async def scenario():
+        stored = await _stored_rooms(path)
+        store = SQLiteRoomStore(str(path))
+        try:
+            lookup = asyncio.create_task(store.get_room(stored[0].token))
+            await asyncio.sleep(0)
+            fresh = await store.create_room_with_token(stored[0].token, 2)
+            assert await lookup is fresh
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
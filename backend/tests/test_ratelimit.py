@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from app.ratelimit import RateLimiter, parse_budgets
+
+
+def _limiter() -> RateLimiter:
+    return RateLimiter(parse_budgets("candidate=1/2,*=1/2"), parse_budgets("candidate=1/4,*=1/4"))
+
+
+def _passed(limiter: RateLimiter, limits, count: int) -> int:
+    return sum(limiter.check(limits, "room", "candidate") is not None for _ in range(count))
+
+
+def test_budgets_are_two_party_until_the_peer_is_admitted():
+    limiter = _limiter()
+    limits = limiter.for_connection()
+    assert _passed(limiter, limits, 10) == 2
+
+
+def test_admit_scales_budgets_with_the_room():
+    limiter = _limiter()
+    limits = limiter.for_connection()
+    # Four participants: the connection negotiates with 3 peers, burst 2 -> 6
+    limiter.admit(limits, "room", 4)
+    assert _passed(limiter, limits, 10) == 6
+
+
+def test_admit_keeps_spent_tokens():
+    limiter = _limiter()
+    limits = limiter.for_connection()
+    assert _passed(limiter, limits, 2) == 2
+    limiter.admit(limits, "room", 4)
+    assert _passed(limiter, limits, 10) == 0
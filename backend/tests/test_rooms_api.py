@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+
+def _post(url: str, body: bytes = b"") -> int:
+    request = urllib.request.Request(url, data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.mark.parametrize("mesh, expected", [("false", 422), ("true", 200)])
+def test_mesh_rooms_need_the_flag(processes, mesh, expected):
+    worker = processes.worker({"MESH_ROOMS_ENABLED": mesh})
+    assert _post(f"{worker.http}/api/rooms?maxParticipants=4") == expected
+    bulk = json.dumps({"count": 1, "maxParticipants": 4}).encode()
+    assert _post(f"{worker.http}/api/rooms/bulk", bulk) == expected
+    assert _post(f"{worker.http}/api/rooms?maxParticipants=2") == 200
@@ -1,4 +1,4 @@
-import React, { useEffect, useMemo, useState } from 'react'
+import React, { useEffect, useMemo, useRef, useState } from 'react'
 import { api } from '../config'
 import { Button, IconButton, Stack } from '@mui/material'
 import RefreshIcon from '@mui/icons-material/Refresh'
@@ -18,11 +18,107 @@ type AdminRoom = {
   peers: AdminPeer[]
 }
 
+// События /api/admin/events: snapshot, затем изменения по ключу (token, peerId)
+type AdminEvent =
+  | { type: 'snapshot', rooms: AdminRoom[] }
+  | { type: 'join', token: string, peerId: string, connectedAt: number | null, participants: number, maxParticipants: number }
+  | { type: 'leave' | 'kick', token: string, peerId: string, participants: number }
+  | { type: 'expire', tokens: string[] }
+  | { type: 'resync' }
+
+const roomStatus = (participants: number): AdminRoom['status'] => participants > 0 ? 'active' : 'waiting'
+
+function applyAdminEvent(rooms: AdminRoom[], ev: AdminEvent): AdminRoom[] {
+  switch (ev.type) {
+    case 'snapshot':
+      return ev.rooms || []
+    case 'join': {
+      const peer = { peerId: ev.peerId, connectedAt: ev.connectedAt }
+      const existing = rooms.find(r => r.token === ev.token)
+      const room: AdminRoom = existing || { token: ev.token, participants: 0, maxParticipants: null, status: 'waiting', peers: [] }
+      const updated = {
+        ...room,
+        participants: ev.participants,
+        maxParticipants: ev.maxParticipants,
+        status: roomStatus(ev.participants),
+        peers: [...room.peers.filter(p => p.peerId !== ev.peerId), peer],
+      }
+      return existing ? rooms.map(r => r === existing ? updated : r) : [...rooms, updated]
+    }
+    case 'leave':
+    case 'kick':
+      return rooms.map(r => r.token !== ev.token ? r : {
+        ...r,
+        participants: ev.participants,
+        status: r.status === 'unknown' ? r.status : roomStatus(ev.participants),
+        peers: r.peers.filter(p => p.peerId !== ev.peerId),
+      })
+    case 'expire': {
+      // Комната удалена по TTL; оставшиеся подключения показываем как в снимке — без комнаты
+      const expired = new Set(ev.tokens)
+      return rooms
+        .filter(r => !expired.has(r.token) || r.peers.length > 0)
+        .map(r => expired.has(r.token) ? { ...r, status: 'unknown' as const, maxParticipants: null } : r)
+    }
+    default:
+      return rooms
+  }
+}
+
+type PreviewPart = {
+  key: string
+  etag: string
+  blob: Blob
+}
+
+const PREVIEW_PAGE_SIZE = 100
+const PREVIEW_PREFIX = '/api/admin/preview/'
+
+const previewKey = (token: string, peerId: string) => `${token}/${peerId}`
+
+// Разбор ответа multipart/mixed от /api/admin/previews: у каждой части есть Content-Length
+function parsePreviewParts(buf: ArrayBuffer, boundary: string): PreviewPart[] {
+  const bytes = new Uint8Array(buf)
+  const decoder = new TextDecoder('ascii')
+  const delimiter = `--${boundary}\r\n`
+  const parts: PreviewPart[] = []
+  let pos = 0
+  while (decoder.decode(bytes.subarray(pos, pos + delimiter.length)) === delimiter) {
+    pos += delimiter.length
+    let end = pos
+    while (end + 3 < bytes.length && !(bytes[end] === 13 && bytes[end + 1] === 10 && bytes[end + 2] === 13 && bytes[end + 3] === 10)) end++
+    const headers: Record<string, string> = {}
+    for (const line of decoder.decode(bytes.subarray(pos, end)).split('\r\n')) {
+      const i = line.indexOf(':')
+      if (i > 0) headers[line.slice(0, i).trim().toLowerCase()] = line.slice(i + 1).trim()
+    }
+    pos = end + 4
+    const length = Number(headers['content-length'] || 0)
+    const location = headers['content-location'] || ''
+    if (location.startsWith(PREVIEW_PREFIX)) {
+      const [token, peerId] = location.slice(PREVIEW_PREFIX.length).split('/').map(decodeURIComponent)
+      parts.push({
+        key: previewKey(token, peerId),
+        etag: headers['etag'] || '',
+        blob: new Blob([bytes.slice(pos, pos + length)], { type: headers['content-type'] }),
+      })
+    }
+    pos += length + 2
+  }
+  return parts
+}
+
 export const Admin: React.FC = () => {
   const [rooms, setRooms] = useState<AdminRoom[]>([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
   const [ts, setTs] = useState(0)
+  // Превью: object URL по ключу token/peerId; грузятся одним запросом на страницу комнат,
+  // since=<версия> — только изменившиеся кадры, неизменённый ответ браузер перепроверяет по ETag (304)
+  const [previews, setPreviews] = useState<Record<string, string>>({})
+  const previewVersionRef = useRef(0)
+  const previewEtagsRef = useRef<Record<string, string>>({})
+  const previewUrlsRef = useRef<Record<string, string>>({})
 
   const base = useMemo(() => window.location.origin, [])
 
@@ -45,24 +141,72 @@ export const Admin: React.FC = () => {
     }
   }
 
+  async function loadPreviews() {
+    try {
+      const since = previewVersionRef.current
+      const updates: PreviewPart[] = []
+      let version = since
+      let total = 0
+      let offset = 0
+      do {
+        const res = await fetch(api(`/api/admin/previews?offset=${offset}&limit=${PREVIEW_PAGE_SIZE}&since=${since}`))
+        if (!res.ok) return
+        version = Math.max(version, Number(res.headers.get('X-Preview-Version') || 0))
+        total = Number(res.headers.get('X-Total-Rooms') || 0)
+        const boundary = /boundary=([^;]+)/.exec(res.headers.get('Content-Type') || '')?.[1]
+        if (boundary) updates.push(...parsePreviewParts(await res.arrayBuffer(), boundary))
+        offset += PREVIEW_PAGE_SIZE
+      } while (offset < total)
+      previewVersionRef.current = version
+      const changed = updates.filter(p => previewEtagsRef.current[p.key] !== p.etag)
+      if (changed.length === 0) return
+      const urls = { ...previewUrlsRef.current }
+      for (const p of changed) {
+        if (urls[p.key]) URL.revokeObjectURL(urls[p.key])
+        urls[p.key] = URL.createObjectURL(p.blob)
+        previewEtagsRef.current[p.key] = p.etag
+      }
+      previewUrlsRef.current = urls
+      setPreviews(urls)
+    } catch {
+      // Превью необязательны: ошибку не показываем
+    }
+  }
+
   async function disconnect(token: string, peerId: string) {
     if (!confirm(`Отключить peer ${peerId} из комнаты ${token}?`)) return
     try {
       const res = await fetch(api(`/api/admin/connections/${encodeURIComponent(token)}/${encodeURIComponent(peerId)}`), { method: 'DELETE' })
       if (!res.ok) throw new Error('Ошибка отключения')
-      await load()
     } catch (e) {
       alert('Не удалось отключить подключение')
     }
   }
 
+  // Комнаты и участники приходят потоком: снимок при подключении, дальше только изменения.
+  // EventSource сам переподключается (и получает новый снимок) после обрыва или resync
+  useEffect(() => {
+    const events = new EventSource(api('/api/admin/events'))
+    events.onopen = () => setError(null)
+    events.onmessage = (e) => {
+      try {
+        const ev = JSON.parse(e.data) as AdminEvent
+        setRooms(prev => applyAdminEvent(prev, ev))
+      } catch {}
+    }
+    events.onerror = () => setError('Поток событий прерван, переподключение…')
+    return () => events.close()
+  }, [])
+
   useEffect(() => {
-    load()
     const id = window.setInterval(() => setTs(x => x + 1), 5000)
-    return () => window.clearInterval(id)
+    return () => {
+      window.clearInterval(id)
+      Object.values(previewUrlsRef.current).forEach(url => URL.revokeObjectURL(url))
+    }
   }, [])
 
-  useEffect(() => { load() }, [ts])
+  useEffect(() => { loadPreviews() }, [ts])
 
   function fmtTime(sec: number | null) {
     if (!sec) return '-'
@@ -108,11 +252,13 @@ export const Admin: React.FC = () => {
                   <Stack key={p.peerId} direction={{ xs: 'column', sm: 'row' }} alignItems={{ xs: 'flex-start', sm: 'center' }} justifyContent="space-between" spacing={1} sx={{ py: 1, borderTop: '1px dashed #eee' }}>
                     <Stack direction="row" spacing={1} alignItems="center">
                       <div style={{ width: 128, height: 72, background: '#f6f6f6', border: '1px solid #eee', borderRadius: 6, display: 'flex', alignItems: 'center', justifyContent: 'center', overflow: 'hidden' }}>
-                        <img
-                          src={api(`/api/admin/preview/${encodeURIComponent(room.token)}/${encodeURIComponent(p.peerId)}`) + `?ts=${ts}`}
-                          alt="preview"
-                          style={{ width: '100%', height: '100%', objectFit: 'cover', display: 'block' }}
-                        />
+                        {previews[previewKey(room.token, p.peerId)] && (
+                          <img
+                            src={previews[previewKey(room.token, p.peerId)]}
+                            alt="preview"
+                            style={{ width: '100%', height: '100%', objectFit: 'cover', display: 'block' }}
+                          />
+                        )}
                       </div>
                       <div>
                         <div>Peer: <code>{p.peerId}</code></div>
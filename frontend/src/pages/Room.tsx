@@ -138,13 +138,17 @@ class NetworkDiagnostics {
 const networkDiagnostics = NetworkDiagnostics.getInstance()
 
 type WSMsg =
-  | { type: 'room-info'; peers: string[]; max: number }
-  | { type: 'peer-joined'; peerId: string }
+  | { type: 'room-info'; peers: string[]; max: number; resume?: string }
+  | { type: 'resumed'; peerId: string; received: number }
+  | { type: 'peer-joined'; peerId: string; replayed?: Record<string, number> }
   | { type: 'peer-left'; peerId: string }
   | { type: 'offer' | 'answer'; peerId: string; sdp: any }
   | { type: 'candidate'; peerId: string; candidate: any }
+  | { type: 'candidates'; peerId: string; candidates: any[] }
   | { type: 'orientation'; peerId: string; layout: 'portrait' | 'landscape' }
   | { type: 'error'; code: string; message: string; details?: string; timestamp?: string }
+  | { type: 'ping' }
+  | { type: 'reconnect'; reason: string; retryAfterMs: number }
 
 function rid() {
   const b = new Uint8Array(8)
@@ -219,6 +223,11 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
   const wsReconnectTimerRef = useRef<number | null>(null)
   const wsConnectionStateRef = useRef<'connecting' | 'connected' | 'disconnected' | 'failed'>('disconnected')
   const wsLastErrorRef = useRef<string | null>(null)
+  // Signaling session resumption: token from room-info and count of frames received since join
+  const resumeTokenRef = useRef<string | null>(null)
+  const wsSeqRef = useRef(0)
+  // Server is draining: reconnect after this delay (to a sibling instance) instead of backing off
+  const drainRetryRef = useRef<number | null>(null)
   
   // Perfect negotiation helpers
   const isMakingOfferRef = useRef(false)
@@ -426,6 +435,17 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
           
           networkDiagnostics.logConnection('websocket', true)
           
+          if (resumeTokenRef.current) {
+            // Reconnect: continue the signaling session; the server replays what we missed
+            send({ type: 'resume', peerId: peerIdRef.current, resume: resumeTokenRef.current, lastSeq: wsSeqRef.current })
+            setStatus('восстановление сигнализации…')
+          } else {
+            joinRoom()
+          }
+        }
+
+        function joinRoom() {
+          wsSeqRef.current = 0
           // join immediately; role corrected after room-info
           send({ type: 'join', peerId: peerIdRef.current, role: 'offerer' })
           // Send current layout info (will be ignored if no peer yet)
@@ -438,8 +458,26 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
         }
 
         ws.onmessage = async ev => {
+          wsSeqRef.current += 1
           const msg: WSMsg = JSON.parse(ev.data)
+          if (msg.type === 'ping') {
+            // Server heartbeat: without a reply the connection is considered dead and closed
+            send({ type: 'pong' })
+            return
+          }
+          if (msg.type === 'reconnect') {
+            // The session does not survive the instance: join again after reconnecting
+            resumeTokenRef.current = null
+            drainRetryRef.current = msg.retryAfterMs
+            return
+          }
           if (msg.type === 'error') {
+            if (msg.code === 'resume_failed') {
+              // Session expired on the server: fall back to a regular join
+              resumeTokenRef.current = null
+              joinRoom()
+              return
+            }
             // Улучшенная обработка ошибок с деталями
             const errorMessage = msg.details ? `${msg.message}: ${msg.details}` : msg.message
             setStatus(`Ошибка: ${msg.code}`)
@@ -459,7 +497,10 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
             }
             return
           }
-          if (msg.type === 'room-info') {
+          if (msg.type === 'resumed') {
+            setStatus(pcRef.current?.connectionState === 'connected' ? 'в сети' : 'ожидание собеседника…')
+          } else if (msg.type === 'room-info') {
+            resumeTokenRef.current = msg.resume ?? null
             // decide role
             const others = Array.isArray(msg.peers) ? msg.peers : []
             if (others.length > 0) {
@@ -471,7 +512,9 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
             }
           } else if (msg.type === 'peer-joined') {
             ensurePoliteFor((msg as any).peerId)
-            if (roleRef.current === 'offerer') {
+            // The server already delivered our pending offer from its mailbox: wait for the answer
+            const offerReplayed = !!msg.replayed?.offer && pcRef.current?.signalingState === 'have-local-offer'
+            if (roleRef.current === 'offerer' && !offerReplayed) {
               // Send (or resend) offer once a peer is present
               await makeOffer()
             }
@@ -529,24 +572,11 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
               console.warn('Failed to handle remote answer', e)
             }
           } else if (msg.type === 'candidate') {
-            const pc = pcRef.current
-            if (!pc) return
-            const c = msg.candidate
-            if (isEmptyCandidate(c)) {
-              return
-            }
-            try {
-              if (!pc.remoteDescription) {
-                // During glare handling (impolite side ignoring), drop candidates instead of queueing
-                if (ignoreOfferRef.current) {
-                  return
-                }
-                pendingCandidatesRef.current.push(c)
-                return
-              }
-              await pc.addIceCandidate(c)
-            } catch (e) {
-              console.warn('Failed to add ICE', e)
+            await addRemoteCandidate(msg.candidate)
+          } else if (msg.type === 'candidates') {
+            // Server-side coalesced trickle ICE: several candidates in one frame
+            for (const c of Array.isArray(msg.candidates) ? msg.candidates : []) {
+              await addRemoteCandidate(c)
             }
           } else if (msg.type === 'peer-left') {
             setStatus('собеседник отключился — ожидание переподключения…')
@@ -566,12 +596,14 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
           
           if (closeCode === 4403) {
             setStatus('комната заполнена')
-            setRecover({ title: 'Комната заполнена', details: 'В эту комнату уже подключены 2 участника. Создайте новую ссылку.' })
+            setRecover({ title: 'Комната заполнена', details: 'В эту комнату уже подключено максимальное количество участников. Создайте новую ссылку.' })
             return
           }
           
           // Улучшенная логика переподключения с диагностикой
-          const attempt = wsReconnectAttemptsRef.current + 1
+          const drainDelay = drainRetryRef.current
+          drainRetryRef.current = null
+          const attempt = drainDelay === null ? wsReconnectAttemptsRef.current + 1 : wsReconnectAttemptsRef.current
           wsReconnectAttemptsRef.current = attempt
           
           if (attempt > WS_RETRY_CONFIG.maxAttempts) {
@@ -584,7 +616,7 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
             return
           }
           
-          const delay = calculateRetryDelay(attempt, WS_RETRY_CONFIG)
+          const delay = drainDelay ?? calculateRetryDelay(attempt, WS_RETRY_CONFIG)
           setStatus(`сигнализация отключена — переподключение через ${Math.round(delay/1000)}с (${attempt}/${WS_RETRY_CONFIG.maxAttempts})…`)
           
           if (wsReconnectTimerRef.current) {
@@ -635,7 +667,7 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
       try {
         send({ type: 'bye', peerId: peerIdRef.current })
       } catch {}
-      try { wsRef.current?.close() } catch {}
+      try { wsRef.current?.close(1000) } catch {}
       if (disconnectedTimerRef.current) {
         window.clearTimeout(disconnectedTimerRef.current)
         disconnectedTimerRef.current = null
@@ -1025,6 +1057,9 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
         const type = c.candidate.split(' ')[7] || 'unknown'
         console.log(`[ICE] Local candidate: type=${type}, protocol=${c.protocol}, address=${c.address}:${c.port}`)
         send({ type: 'candidate', peerId: peerIdRef.current, candidate: ev.candidate })
+      } else {
+        // End of candidates: lets the server flush any coalesced batch right away
+        send({ type: 'candidate', peerId: peerIdRef.current, candidate: { candidate: '' } })
       }
     }
   }
@@ -1087,6 +1122,27 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
     return !c || !c.candidate || c.candidate === ''
   }
 
+  async function addRemoteCandidate(c: any) {
+    const pc = pcRef.current
+    if (!pc) return
+    if (isEmptyCandidate(c)) {
+      return
+    }
+    try {
+      if (!pc.remoteDescription) {
+        // During glare handling (impolite side ignoring), drop candidates instead of queueing
+        if (ignoreOfferRef.current) {
+          return
+        }
+        pendingCandidatesRef.current.push(c)
+        return
+      }
+      await pc.addIceCandidate(c)
+    } catch (e) {
+      console.warn('Failed to add ICE', e)
+    }
+  }
+
   async function makeOffer(iceRestart: boolean = false) {
     const pc = pcRef.current
     if (!pc) return
@@ -1309,7 +1365,7 @@ export const Room: React.FC<{ token: string }> = ({ token }) => {
   }
 
   function hangup() {
-    try { wsRef.current?.close() } catch {}
+    try { wsRef.current?.close(1000) } catch {}
     try { pcRef.current?.close() } catch {}
     window.location.href = '/'
   }